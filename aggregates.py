@@ -0,0 +1,77 @@
+"""إجماليات مصاريف المستخدم محدثة مع كل عملية بدلاً من إعادة الجمع في كل مرة"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class Aggregates:
+    """الإجمالي والعدد والأعلى والأقل والتوزيع حسب النوع ووسيلة الدفع
+
+    الإضافة والتعديل والحذف تكلف O(log n) للبحث في قائمة المبالغ المرتبة (للأعلى
+    والأقل)، وO(1) لباقي القيم. النتائج بنفس شكل queries.statistics.
+    """
+
+    def __init__(self, expenses: Iterable[Dict] = ()):
+        self.total = 0.0
+        self.count = 0
+        self.amounts: List[float] = []
+        # النوع/وسيلة الدفع -> [المجموع, العدد] (العدد لحذف المفتاح عند آخر مصروف)
+        self.by_type: Dict[str, List] = {}
+        self.by_payment: Dict[str, List] = {}
+        for expense in expenses:
+            self.add(expense, bulk=True)
+        self.amounts.sort()
+
+    @staticmethod
+    def bump(table: Dict, key, amount: float, step: int):
+        entry = table.setdefault(key, [0.0, 0])
+        entry[0] += amount * step
+        entry[1] += step
+        if not entry[1]:
+            del table[key]
+
+    def add(self, expense: Dict, bulk: bool = False):
+        amount = expense.get('amount', 0)
+        self.total += amount
+        self.count += 1
+        if bulk:
+            self.amounts.append(amount)
+        else:
+            insort(self.amounts, amount)
+        self.bump(self.by_type, expense.get('type', 'أخرى'), amount, 1)
+        self.bump(self.by_payment, expense.get('payment_method', 'نقدي'), amount, 1)
+
+    def remove(self, expense: Dict):
+        amount = expense.get('amount', 0)
+        self.total -= amount
+        self.count -= 1
+        del self.amounts[bisect_left(self.amounts, amount)]
+        self.bump(self.by_type, expense.get('type', 'أخرى'), amount, -1)
+        self.bump(self.by_payment, expense.get('payment_method', 'نقدي'), amount, -1)
+        if not self.count:
+            # بدون مصاريف: نبدأ من صفر بدلاً من بقايا تقريب الكسور
+            self.total = 0.0
+
+    def apply(self, record: Dict, old: Optional[Dict] = None):
+        """تحديث الإجماليات بعملية تخزين قبل تطبيقها (old: المصروف الحالي في التعديل والحذف)"""
+        op = record['op']
+        if op == 'add':
+            self.add(record['expense'])
+        elif op == 'update':
+            self.remove(old)
+            self.add(record['expense'])
+        elif op == 'delete':
+            self.remove(old)
+
+    def totals(self) -> Tuple[float, int]:
+        return self.total, self.count
+
+    def statistics(self) -> Dict:
+        return {
+            'total': self.total,
+            'count': self.count,
+            'average': self.total / self.count if self.count > 0 else 0,
+            'max': self.amounts[-1] if self.amounts else 0,
+            'min': self.amounts[0] if self.amounts else 0,
+            'by_type': {key: entry[0] for key, entry in self.by_type.items()},
+            'by_payment': {key: entry[0] for key, entry in self.by_payment.items()},
+        }
@@ -0,0 +1,197 @@
+"""تحليلات المصاريف بـ pandas: إطار أعمدة واحد لكل نسخة من البيانات، وكل الإحصائيات عمليات متجهة
+
+يستخدم من نافذة الإحصائيات في تطبيق سطح المكتب ومن لوحة Streamlit.
+يقبل شكل مصاريف سطح المكتب (type/from/to) وشكل Streamlit (category/description).
+"""
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+import queries
+
+# ترتيب pandas: الإثنين = 0
+WEEKDAYS = ['الإثنين', 'الثلاثاء', 'الأربعاء', 'الخميس', 'الجمعة', 'السبت', 'الأحد']
+PERCENTILES = [0.25, 0.5, 0.75, 0.9]
+# رقم يوم 1970-01-01 (date.toordinal) لتحويل أرقام الأيام إلى datetime64
+EPOCH_ORDINAL = 719163
+# أعمدة الترتيب في جدول المصاريف -> عمود الإطار
+TABLE_SORTS = {'date': 'date', 'amount': 'amount', 'category': 'type'}
+
+
+def expense_frame(expenses: List[Dict]) -> pd.DataFrame:
+    """إطار أعمدة بأنواع ثابتة: date (datetime64)، amount (float64)، type/payment_method/route (category)"""
+    ordinals = [queries.date_ordinal(exp.get('date', '')) for exp in expenses]
+    days = np.array([np.nan if o is None else o - EPOCH_ORDINAL for o in ordinals], dtype='float64')
+    routes = [f"{exp.get('from', '')} ← {exp.get('to', '')}" if exp.get('from') or exp.get('to') else ''
+              for exp in expenses]
+    return pd.DataFrame({
+        'date': pd.to_datetime(days, unit='D'),
+        'amount': pd.to_numeric(pd.Series([exp.get('amount', 0) for exp in expenses], dtype='object'),
+                                errors='coerce').fillna(0.0).astype('float64'),
+        'type': pd.Categorical([exp.get('type', exp.get('category', 'أخرى')) for exp in expenses]),
+        'payment_method': pd.Categorical([exp.get('payment_method', 'نقدي') for exp in expenses]),
+        'route': pd.Categorical(routes),
+    })
+
+
+class Analytics:
+    """إحصائيات مصاريف مستخدم واحد من إطار الأعمدة"""
+
+    def __init__(self, expenses: List[Dict]):
+        self.expenses = expenses
+        # نسخة بيانات المخزن التي بني منها (تضبطها for_user)
+        self.version = None
+        self.frame = expense_frame(expenses)
+        self.dated = self.frame.dropna(subset=['date'])
+        # أعمدة العرض ونص البحث تبنى عند أول استعلام على الجدول
+        self.table = None
+        self.search_text = None
+
+    def summary(self) -> Dict:
+        """الإجمالي والعدد والمتوسط والوسيط والمئينات والأعلى والأقل"""
+        amounts = self.frame['amount']
+        if amounts.empty:
+            return {'total': 0.0, 'count': 0, 'average': 0.0, 'median': 0.0,
+                    'percentiles': {p: 0.0 for p in PERCENTILES}, 'max': 0.0, 'min': 0.0}
+        return {
+            'total': float(amounts.sum()),
+            'count': int(amounts.size),
+            'average': float(amounts.mean()),
+            'median': float(amounts.median()),
+            'percentiles': {p: float(v) for p, v in amounts.quantile(PERCENTILES).items()},
+            'max': float(amounts.max()),
+            'min': float(amounts.min()),
+        }
+
+    def by_column(self, column: str) -> pd.DataFrame:
+        """المجموع والعدد لكل قيمة في عمود (type أو payment_method أو route)، الأكبر أولاً"""
+        frame = self.frame[self.frame[column] != ''] if column == 'route' else self.frame
+        grouped = frame.groupby(column, observed=True)['amount'].agg(['sum', 'count'])
+        return grouped.sort_values('sum', ascending=False)
+
+    def by_weekday(self) -> pd.DataFrame:
+        """المجموع والعدد والمتوسط لكل يوم من أيام الأسبوع"""
+        grouped = (self.dated.groupby(self.dated['date'].dt.weekday)['amount']
+                   .agg(['sum', 'count', 'mean'])
+                   .reindex(range(7), fill_value=0))
+        grouped.index = WEEKDAYS
+        return grouped
+
+    def by_route(self, top: int = 10) -> pd.DataFrame:
+        """أكثر المسارات (من ← إلى) إنفاقاً"""
+        return self.by_column('route').head(top)
+
+    def daily(self, end: Optional[pd.Timestamp] = None) -> pd.Series:
+        """إنفاق كل يوم (الأيام بدون مصاريف = 0) حتى end أو آخر تاريخ"""
+        if self.dated.empty:
+            return pd.Series(dtype='float64')
+        spend = self.dated.groupby('date')['amount'].sum()
+        last = max(spend.index.max(), end) if end is not None else spend.index.max()
+        return spend.reindex(pd.date_range(spend.index.min(), last, freq='D'), fill_value=0.0)
+
+    def rolling(self, days: int, end: Optional[pd.Timestamp] = None) -> pd.Series:
+        """الإنفاق المتحرك لآخر days يوم عند كل يوم"""
+        return self.daily(end).rolling(days, min_periods=1).sum()
+
+    def recent_spend(self, days: int) -> float:
+        """إنفاق آخر days يوم حتى اليوم"""
+        series = self.rolling(days, pd.Timestamp.today().normalize())
+        return float(series.iloc[-1]) if not series.empty else 0.0
+
+    # ==================== جدول المصاريف ====================
+
+    def build_table(self):
+        """أعمدة العرض (التاريخ كما أدخل، الفئة، المبلغ، الوصف) ونص البحث بحروف صغيرة"""
+        descriptions = [exp.get('description', exp.get('notes', '')) or '' for exp in self.expenses]
+        # نص البحث أولاً: جلسات Streamlit تتشارك نفس الكائن وتعتبر الجدول جاهزاً متى وجد
+        self.search_text = pd.Series([
+            f"{queries.searchable_text(exp)} {exp.get('category', '')} {description}".lower()
+            for exp, description in zip(self.expenses, descriptions)
+        ])
+        self.table = pd.DataFrame({
+            'date': [exp.get('date', '') for exp in self.expenses],
+            'category': self.frame['type'],
+            'amount': self.frame['amount'],
+            'description': descriptions,
+        })
+
+    def query(self, start: Optional[str] = None, end: Optional[str] = None,
+              categories: Optional[List[str]] = None, text: str = '',
+              sort: str = 'date', descending: bool = True) -> np.ndarray:
+        """مواقع الصفوف المطابقة للفلاتر بالترتيب المطلوب؛ الصفحة تقطع منها بـ page
+
+        حدود التاريخ شاملة بالشكل YYYY-MM-DD، والمصاريف بتاريخ غير صحيح تأتي في
+        آخر الترتيب بالتاريخ وتستبعد عند تحديد أي حد.
+        """
+        if self.table is None:
+            self.build_table()
+        mask = np.ones(len(self.frame), dtype=bool)
+        if start:
+            mask &= (self.frame['date'] >= pd.Timestamp(start)).to_numpy()
+        if end:
+            mask &= (self.frame['date'] <= pd.Timestamp(end)).to_numpy()
+        if categories:
+            mask &= self.frame['type'].isin(categories).to_numpy()
+        if text:
+            mask &= self.search_text.str.contains(text.lower(), regex=False).to_numpy()
+        # ترتيب ثابت: المصاريف المتساوية تبقى بترتيب إضافتها
+        column = self.frame.loc[mask, TABLE_SORTS[sort]]
+        ordered = column.sort_values(ascending=not descending, kind='stable', na_position='last')
+        return ordered.index.to_numpy()
+
+    def totals(self, positions: np.ndarray) -> Dict:
+        """الإجمالي والعدد لكل نتيجة الاستعلام (وليس للصفحة فقط)"""
+        return {'total': float(self.frame['amount'].to_numpy()[positions].sum()),
+                'count': int(positions.size)}
+
+    def page(self, positions: np.ndarray, number: int, size: int) -> pd.DataFrame:
+        """صفوف الصفحة number (من 1) فقط من نتيجة الاستعلام"""
+        if self.table is None:
+            self.build_table()
+        offset = (number - 1) * size
+        return self.table.iloc[positions[offset:offset + size]]
+
+
+# أقصى عدد مستخدمين تبقى تحليلاتهم في الذاكرة لكل مخزن (أكثر من الجلسات النشطة عادة)؛
+# الأقدم استخداماً يسقط أولاً ويعاد بناؤه إذا رجع صاحبه
+MAX_CACHED_USERS = 32
+
+# مخزن -> {مستخدم: آخر Analytics له}؛ المفتاح المخزن نفسه (وليس id) فيسقط معه
+_cache: "weakref.WeakKeyDictionary[object, OrderedDict]" = weakref.WeakKeyDictionary()
+_cache_lock = threading.Lock()
+
+
+class StaleVersion(Exception):
+    """تغيرت بيانات المستخدم عن النسخة المطلوبة (كتبت جلسة أو عملية أخرى بعد قراءتها)"""
+
+
+def for_user(store, username: str, version: Optional[Tuple] = None) -> Analytics:
+    """تحليلات المستخدم، يعاد بناؤها فقط عند تغير نسخة بياناته في المخزن
+
+    version: النسخة التي بنيت عليها نتائج سابقة (مواقع صفوف مثلاً)؛ إذا تغيرت ترفع
+    StaleVersion بدلاً من إرجاع إطار لا تطابقه تلك النتائج.
+    """
+    with store.lock:
+        current = store.data_version(username)
+        if version is not None and current != version:
+            raise StaleVersion()
+        with _cache_lock:
+            cached = _cache.setdefault(store, OrderedDict()).get(username)
+        if cached is not None and cached.version == current:
+            expenses = None
+        else:
+            expenses = list(store.user_expenses(username))
+    if expenses is not None:
+        cached = Analytics(expenses)
+        cached.version = current
+    with _cache_lock:
+        users = _cache.setdefault(store, OrderedDict())
+        users[username] = cached
+        users.move_to_end(username)
+        while len(users) > MAX_CACHED_USERS:
+            users.popitem(last=False)
+    return cached
@@ -0,0 +1,142 @@
+"""تقارير Excel لكل الموظفين من سطر الأوامر بدون واجهة
+
+    python batch_reports.py --month 2026-09
+    python batch_reports.py --from 2026-09-01 --to 2026-09-15 --out reports --workers 4
+
+ينشئ ملف تقرير لكل موظف له مصاريف في الفترة (بنفس تنسيق تقرير التطبيق) وملف ملخص
+مجمع للشركة. تقارير الموظفين تكتب بالتوازي في عمليات منفصلة، فالوقت يقل مع عدد الأنوية.
+"""
+import argparse
+import calendar
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import excel_report
+import queries
+import storage
+from receipt_store import ReceiptStore
+from rollup import MonthlyRollup
+from thumbnails import ThumbnailCache
+
+USERS_FILE = 'users_data.json'
+OUTPUT_DIR = 'reports'
+
+
+def month_range(month: str) -> Tuple[str, str]:
+    """أول وآخر يوم في شهر YYYY-MM"""
+    year, number = (int(part) for part in month.split('-'))
+    last = calendar.monthrange(year, number)[1]
+    return date(year, number, 1).isoformat(), date(year, number, last).isoformat()
+
+
+def safe_name(text: str) -> str:
+    """اسم صالح كجزء من اسم ملف"""
+    return re.sub(r'[\\/:*?"<>|\s]+', '_', text).strip('_') or 'user'
+
+
+def employee_info(username: str, user: Dict) -> Dict:
+    """بيانات الموظف للتقرير (مستخدمو Streamlit ليس لهم اسم أو رقم موظف)"""
+    return {
+        'name': user.get('name', username),
+        'employee_id': user.get('employee_id', ''),
+        'company_name': user.get('company_name', 'غير محدد'),
+        'department': user.get('department', ''),
+        'payment_method': user.get('payment_method', 'نقدي'),
+    }
+
+
+def write_employee_report(filename: str, user: Dict, expenses: List[Dict]) -> Dict:
+    """تقرير موظف واحد (يعمل داخل عملية منفصلة)؛ يعيد ملخصه للتقرير المجمع"""
+    rollup = MonthlyRollup(expenses)
+    # الصور المصغرة جهزت مسبقاً في العملية الرئيسية، فلا حاجة لمجمع عمليات هنا
+    excel_report.write_report(filename, user, expenses, rollup, ThumbnailCache(parallel=False))
+    summary = rollup.summary()
+    return {
+        'name': user['name'],
+        'employee_id': user['employee_id'],
+        'department': user['department'],
+        'count': summary['count'],
+        'total': summary['total'],
+        'by_type': summary['by_type'],
+    }
+
+
+def run(users_file: str, out_dir: str, start: Optional[str], end: Optional[str],
+        period: str, workers: Optional[int] = None) -> int:
+    """كتابة كل التقارير؛ يعيد عدد التقارير التي فشلت"""
+    store = storage.open_store(users_file)
+    users = store.load()
+    jobs = []
+    for username in sorted(users):
+        expenses = store.query_expenses(username, start=start, end=end)
+        if expenses:
+            jobs.append((username, employee_info(username, users[username]), expenses))
+    store.close()
+
+    if not jobs:
+        print(f"لا توجد مصاريف في الفترة {period}")
+        return 0
+
+    os.makedirs(out_dir, exist_ok=True)
+    # تجهيز كل الصور المصغرة مرة واحدة بالتوازي قبل توزيع التقارير
+    receipts = ReceiptStore()
+    ThumbnailCache().ensure(receipts.resolve(exp['receipt'])
+                            for _, _, expenses in jobs for exp in expenses if exp.get('receipt'))
+
+    summaries: Dict[str, Dict] = {}
+    failed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for username, user, expenses in jobs:
+            filename = os.path.join(out_dir, f"تقرير_مصاريف_{safe_name(username)}_{period}.xlsx")
+            futures[pool.submit(write_employee_report, filename, user, expenses)] = (username, filename)
+        for future in as_completed(futures):
+            username, filename = futures[future]
+            try:
+                summaries[username] = future.result()
+                print(f"✓ {filename}")
+            except Exception as e:
+                failed += 1
+                print(f"✗ {username}: {e}", file=sys.stderr)
+
+    company_file = os.path.join(out_dir, f"ملخص_الشركة_{period}.xlsx")
+    excel_report.write_company_summary(company_file, period,
+                                       [summaries[username] for username, _, _ in jobs if username in summaries])
+    print(f"✓ {company_file}")
+    return failed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="تقارير مصاريف كل الموظفين وملخص الشركة")
+    parser.add_argument('--month', help="الشهر YYYY-MM")
+    parser.add_argument('--from', dest='start', help="من تاريخ YYYY-MM-DD")
+    parser.add_argument('--to', dest='end', help="إلى تاريخ YYYY-MM-DD")
+    parser.add_argument('--data', default=USERS_FILE, help="ملف البيانات")
+    parser.add_argument('--out', default=OUTPUT_DIR, help="مجلد التقارير")
+    parser.add_argument('--workers', type=int, default=None, help="عدد العمليات (افتراضياً عدد الأنوية)")
+    args = parser.parse_args(argv)
+
+    start, end = args.start, args.end
+    if args.month:
+        if start or end:
+            parser.error("استخدم --month أو --from/--to وليس الاثنين")
+        try:
+            start, end = month_range(args.month)
+        except ValueError:
+            parser.error("الشهر يجب أن يكون بصيغة YYYY-MM")
+        period = args.month
+    else:
+        for value in (start, end):
+            if value and queries.date_ordinal(value) is None:
+                parser.error(f"تاريخ غير صحيح: {value}")
+        period = f"{start or 'البداية'}_{end or 'الآن'}"
+
+    return 1 if run(args.data, args.out, start, end, period, args.workers) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+"""صيغة أعمدة مضغوطة لحفظ المصاريف بدلاً من JSON بمفاتيح مكررة
+
+شكل الملف:
+    MAGIC + طول الرأس (4 بايت) + رأس JSON + بيانات الأعمدة
+الرأس يحمل القواميس (النوع ووسيلة الدفع) وجدول النصوص، وموضع كل عمود لكل مستخدم.
+    التاريخ      int32  رقم اليوم (date.toordinal)
+    المبلغ       int64  بالقروش
+    النوع/الدفع  uint16 رقم في القاموس
+    النصوص       uint32 رقم في جدول النصوص (0 = None)
+    الأوقات      int64  ثوان منذ 0001-01-01 (0 = غير موجود)
+    المعرف       uint64 x2  المعرف (32 حرف hex) كرقم 128 بت (0 = بدون معرف)
+أي مصروف لا يمكن تمثيله بالأعمدة بدون فقد يحفظ كما هو في "overflow".
+"""
+import sys
+import json
+import struct
+from array import array
+from datetime import date
+from typing import Dict, List, Optional
+
+MAGIC = b'EXPCOL1\n'
+
+# (اسم العمود, نوع المصفوفة)
+COLUMNS = [
+    ('date', 'i'),
+    ('amount', 'q'),
+    ('type', 'H'),
+    ('payment_method', 'H'),
+    ('from', 'I'),
+    ('to', 'I'),
+    ('notes', 'I'),
+    ('receipt', 'I'),
+    ('added_at', 'q'),
+    ('updated_at', 'q'),
+    ('id_high', 'Q'),
+    ('id_low', 'Q'),
+]
+REQUIRED_KEYS = ('date', 'from', 'to', 'type', 'payment_method', 'amount', 'notes', 'receipt', 'added_at')
+DAY_SECONDS = 86400
+ID_MASK = (1 << 64) - 1
+
+
+def is_columnar(raw: bytes) -> bool:
+    return raw.startswith(MAGIC)
+
+
+def encode_id(value) -> Optional[int]:
+    """معرف المصروف (32 حرف hex صغيرة) كرقم، أو None إذا لم يكن بهذا الشكل"""
+    if not isinstance(value, str) or len(value) != 32:
+        return None
+    try:
+        number = int(value, 16)
+    except ValueError:
+        return None
+    if not number or f"{number:032x}" != value:
+        return None
+    return number
+
+
+def encode_timestamp(value) -> int:
+    """YYYY-MM-DD HH:MM:SS إلى ثوان، أو 0 إذا لم يكن بهذا الشكل"""
+    if not isinstance(value, str) or len(value) != 19:
+        return 0
+    try:
+        day = date.fromisoformat(value[:10]).toordinal()
+        hours, minutes, seconds = (int(part) for part in value[11:].split(':'))
+    except ValueError:
+        return 0
+    return day * DAY_SECONDS + hours * 3600 + minutes * 60 + seconds
+
+
+class Decoder:
+    """تحويل الأرقام إلى نصوص مع تخزين مؤقت (التواريخ والأوقات تتكرر كثيراً)"""
+
+    def __init__(self):
+        self.dates: Dict[int, str] = {}
+        self.clock: Dict[int, str] = {}
+
+    def date(self, ordinal: int) -> str:
+        text = self.dates.get(ordinal)
+        if text is None:
+            text = self.dates[ordinal] = date.fromordinal(ordinal).isoformat()
+        return text
+
+    def timestamp(self, value: int) -> str:
+        day, seconds = divmod(value, DAY_SECONDS)
+        clock = self.clock.get(seconds)
+        if clock is None:
+            clock = self.clock[seconds] = f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        return f"{self.date(day)} {clock}"
+
+
+class Encoder:
+    """بناء القواميس وجدول النصوص المشتركة بين المستخدمين"""
+
+    def __init__(self):
+        self.types: Dict = {}
+        self.payments: Dict = {}
+        self.strings: Dict = {None: 0}
+        self.decoder = Decoder()
+
+    @staticmethod
+    def code(table: Dict, value) -> int:
+        if value not in table:
+            table[value] = len(table)
+        return table[value]
+
+    def row(self, expense: Dict):
+        """أعمدة مصروف واحد، أو None إذا لم يمكن تمثيله بدون فقد"""
+        if any(key not in expense for key in REQUIRED_KEYS):
+            return None
+        if len(expense) != len(REQUIRED_KEYS) + ('updated_at' in expense) + ('id' in expense):
+            return None
+        expense_id = 0
+        if 'id' in expense:
+            expense_id = encode_id(expense['id'])
+            if expense_id is None:
+                return None
+        amount = expense['amount']
+        if type(amount) is not float or round(amount * 100) / 100 != amount:
+            return None
+        try:
+            ordinal = date.fromisoformat(expense['date']).toordinal()
+        except (TypeError, ValueError):
+            return None
+        if self.decoder.date(ordinal) != expense['date']:
+            return None
+        texts = [expense['from'], expense['to'], expense['notes'], expense['receipt']]
+        if any(text is not None and not isinstance(text, str)
+               for text in texts + [expense['type'], expense['payment_method']]):
+            return None
+        added_at = encode_timestamp(expense['added_at'])
+        if not added_at or self.decoder.timestamp(added_at) != expense['added_at']:
+            return None
+        updated_at = 0
+        if 'updated_at' in expense:
+            updated_at = encode_timestamp(expense['updated_at'])
+            if not updated_at or self.decoder.timestamp(updated_at) != expense['updated_at']:
+                return None
+        return (ordinal, round(amount * 100),
+                self.code(self.types, expense['type']),
+                self.code(self.payments, expense['payment_method']),
+                *(self.code(self.strings, text) for text in texts),
+                added_at, updated_at, expense_id >> 64, expense_id & ID_MASK)
+
+
+def encode(users_data: Dict) -> bytes:
+    """تحويل {اسم المستخدم: {..., 'expenses': [...]}} إلى صيغة الأعمدة"""
+    encoder = Encoder()
+    users = []
+    blobs: List[bytes] = []
+    offset = 0
+
+    for username, record in users_data.items():
+        expenses = record.get('expenses', [])
+        columns = [array(typecode) for _, typecode in COLUMNS]
+        overflow = {}
+        for index, expense in enumerate(expenses):
+            row = encoder.row(expense)
+            if row is None:
+                overflow[str(index)] = expense
+                row = (0,) * len(COLUMNS)
+            for column, value in zip(columns, row):
+                column.append(value)
+
+        positions = {}
+        for (name, _), column in zip(COLUMNS, columns):
+            if sys.byteorder != 'little':
+                column.byteswap()
+            blob = column.tobytes()
+            positions[name] = [offset, len(blob)]
+            blobs.append(blob)
+            offset += len(blob)
+
+        users.append({
+            'username': username,
+            'fields': {k: v for k, v in record.items() if k != 'expenses'},
+            'has_expenses': 'expenses' in record,
+            'count': len(expenses),
+            'columns': positions,
+            'overflow': overflow,
+        })
+
+    header = json.dumps({
+        'users': users,
+        'types': list(encoder.types),
+        'payments': list(encoder.payments),
+        'strings': list(encoder.strings),
+    }, ensure_ascii=False).encode('utf-8')
+    return MAGIC + struct.pack('<I', len(header)) + header + b''.join(blobs)
+
+
+def decode(raw: bytes) -> Dict:
+    """قراءة صيغة الأعمدة إلى نفس القواميس التي ينتجها ملف JSON"""
+    if not is_columnar(raw):
+        raise ValueError("ليس ملف أعمدة")
+    start = len(MAGIC) + 4
+    (header_size,) = struct.unpack('<I', raw[len(MAGIC):start])
+    header = json.loads(raw[start:start + header_size])
+    body = memoryview(raw)[start + header_size:]
+    types, payments, strings = header['types'], header['payments'], header['strings']
+    decoder = Decoder()
+
+    users_data = {}
+    for user in header['users']:
+        columns = {}
+        for name, typecode in COLUMNS:
+            column = array(typecode)
+            if name not in user['columns']:
+                # ملف أقدم من هذا العمود: كل القيم صفر
+                column.frombytes(bytes(column.itemsize * user['count']))
+                columns[name] = column
+                continue
+            offset, size = user['columns'][name]
+            column.frombytes(body[offset:offset + size])
+            if sys.byteorder != 'little':
+                column.byteswap()
+            columns[name] = column
+
+        # تحويل كل عمود مرة واحدة (القيم المتكررة تحول مرة واحدة فقط)
+        date_text = {day: decoder.date(day) for day in set(columns['date']) if day}
+        dates = list(map(date_text.get, columns['date']))
+        amounts = [amount / 100 for amount in columns['amount']]
+        # أسطر overflow تحمل 0 في كل الأعمدة وتستبدل بعد ذلك؛ إذا كانت كل الأسطر overflow
+        # فالقاموسان فارغان، فيقرأ الرقم 0 كـ None بدلاً من خطأ
+        row_types = list(map((types or [None]).__getitem__, columns['type']))
+        row_payments = list(map((payments or [None]).__getitem__, columns['payment_method']))
+        froms, tos, notes, receipts = (list(map(strings.__getitem__, columns[name]))
+                                       for name in ('from', 'to', 'notes', 'receipt'))
+        added = [decoder.timestamp(value) if value else None for value in columns['added_at']]
+
+        expenses = [
+            {'date': d, 'from': f, 'to': t, 'type': ty, 'payment_method': p,
+             'amount': a, 'notes': n, 'receipt': r, 'added_at': ad}
+            for d, f, t, ty, p, a, n, r, ad in zip(dates, froms, tos, row_types, row_payments,
+                                                    amounts, notes, receipts, added)
+        ]
+        for index, value in enumerate(columns['updated_at']):
+            if value:
+                expenses[index]['updated_at'] = decoder.timestamp(value)
+        for index, (high, low) in enumerate(zip(columns['id_high'], columns['id_low'])):
+            if high or low:
+                expenses[index]['id'] = f"{high << 64 | low:032x}"
+        for index, expense in user['overflow'].items():
+            expenses[int(index)] = expense
+
+        record = dict(user['fields'])
+        if user['has_expenses']:
+            record['expenses'] = expenses
+        users_data[user['username']] = record
+    return users_data
+
+
+def convert_file(source: str, target: str, fmt: str):
+    """تحويل ملف حفظ واحد بين JSON وصيغة الأعمدة"""
+    import storage
+    with open(source, 'rb') as f:
+        users_data = storage.decode_users(f.read())
+    storage.write_atomic(target, storage.encode_users(users_data, fmt))
+
+
+if __name__ == "__main__":
+    # python columnar.py to-columnar users_data.json users_data.col
+    # python columnar.py to-json users_data.col users_data.json
+    # python columnar.py convert-shards columnar|json   (ملفات المستخدمين في users_data/)
+    commands = {'to-columnar': 'columnar', 'to-json': 'json'}
+    if len(sys.argv) == 4 and sys.argv[1] in commands:
+        convert_file(sys.argv[2], sys.argv[3], commands[sys.argv[1]])
+    elif len(sys.argv) == 3 and sys.argv[1] == 'convert-shards' and sys.argv[2] in ('columnar', 'json'):
+        import storage
+        count = storage.ShardedStore("users_data.json").convert_snapshots(sys.argv[2])
+        print(f"تم تحويل ملفات {count} مستخدم")
+    else:
+        print("الاستخدام: python columnar.py to-columnar|to-json <من> <إلى>")
+        print("          python columnar.py convert-shards columnar|json")
+        sys.exit(1)
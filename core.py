@@ -0,0 +1,266 @@
+"""منطق التطبيق بدون واجهة: الحسابات والتحقق من المصاريف والاستعلامات والتصدير
+
+تطبيق سطح المكتب (Tk) ولوحة Streamlit يستدعيان نفس الخدمة، فشكل المصروف وتشفير
+كلمة المرور ورسائل الأخطاء واحدة في الواجهتين. الملف لا يستورد tkinter ولا يحتاج
+شاشة، فيستخدم من أدوات الدفعات وقياس الأداء مباشرة:
+
+    service = core.ExpenseService(storage.open_store('users_data.json'))
+    service.store.load()
+    service.add_expense('ahmed', {'date': '2026-01-05', 'from': 'البيت', 'to': 'العمل',
+                                  'type': 'أوبر', 'amount': 85})
+
+openpyxl (التقارير) وpandas (الاستيراد والتحليلات) اختياريان، ويستوردان عند أول
+استخدام فقط حتى لا يتأخر ظهور شاشة الدخول بسببهما.
+"""
+import hashlib
+import importlib
+import math
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import queries
+from rollup import MonthlyRollup
+
+TRANSPORT_TYPES = ['أوبر', 'كريم', 'تاكسي', 'مترو', 'أتوبيس', 'سيارة خاصة', 'أخرى']
+PAYMENT_METHODS = ['نقدي', 'فيزا', 'محفظة إلكترونية', 'إنستاباي', 'أخرى']
+DEFAULT_PAYMENT = 'نقدي'
+
+MIN_USERNAME = 3
+MIN_PASSWORD = 6
+EMAIL = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ValidationError(ValueError):
+    """بيانات مرفوضة؛ الرسالة تعرض للمستخدم كما هي"""
+
+
+class ReportCancelled(Exception):
+    """أوقف المستخدم كتابة التقرير"""
+
+
+# الوحدات الاختيارية بعد أول محاولة استيراد (None: مكتباتها غير مثبتة)
+_optional: Dict = {}
+
+
+def optional_module(name: str):
+    """استيراد excel_report (openpyxl وPIL) أو importer/analytics (pandas) عند أول استخدام"""
+    if name not in _optional:
+        try:
+            _optional[name] = importlib.import_module(name)
+        except ImportError:
+            _optional[name] = None
+    return _optional[name]
+
+
+def now() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+# ==================== التحقق ====================
+
+def hash_password(password: str) -> str:
+    """تشفير كلمة المرور"""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def validate_email(email: str) -> bool:
+    """التحقق من صحة البريد الإلكتروني"""
+    return EMAIL.match(email) is not None
+
+
+def normalize_date(text) -> str:
+    """التاريخ دائماً بالشكل الكامل (2025-01-05 وليس 2025-1-5)"""
+    try:
+        return datetime.strptime(str(text).strip(), "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise ValidationError("التاريخ يجب أن يكون بالشكل: YYYY-MM-DD") from None
+
+
+def parse_amount(value) -> float:
+    """المبلغ كرقم محدود أكبر من صفر (من نص النموذج أو رقم)
+
+    float يقبل nan وinf؛ nan لا يطرح من الإجماليات التراكمية بعد إضافته فيرفضان هنا.
+    """
+    if isinstance(value, str):
+        value = value.strip()
+        if not value:
+            raise ValidationError("الرجاء ملء الحقول المطلوبة!")
+    try:
+        amount = float(value)
+    except (TypeError, ValueError):
+        raise ValidationError("المبلغ يجب أن يكون رقماً!") from None
+    if not math.isfinite(amount):
+        raise ValidationError("المبلغ يجب أن يكون رقماً!")
+    if amount <= 0:
+        raise ValidationError("المبلغ يجب أن يكون أكبر من صفر!")
+    return amount
+
+
+def build_expense(fields: Dict, require_route: bool = True) -> Dict:
+    """مصروف كامل بالشكل المخزن من حقول نموذج الإدخال
+
+    require_route: من/إلى مطلوبان (نموذج سطح المكتب)؛ لوحة Streamlit تسجل الفئة والوصف فقط.
+    """
+    origin = str(fields.get('from', '') or '').strip()
+    destination = str(fields.get('to', '') or '').strip()
+    if require_route and (not origin or not destination):
+        raise ValidationError("الرجاء ملء الحقول المطلوبة!")
+    amount = parse_amount(fields.get('amount'))
+    return {
+        'date': normalize_date(fields.get('date', '')),
+        'from': origin,
+        'to': destination,
+        'type': fields.get('type') or 'أخرى',
+        'payment_method': fields.get('payment_method') or DEFAULT_PAYMENT,
+        'amount': amount,
+        'notes': str(fields.get('notes', '') or '').strip(),
+        'receipt': fields.get('receipt'),
+        'added_at': fields.get('added_at') or now(),
+    }
+
+
+def new_user(password: str, profile: Optional[Dict] = None) -> Dict:
+    """سجل مستخدم جديد بكلمة مرور مشفرة والقيم الافتراضية"""
+    profile = profile or {}
+    return {
+        'name': profile.get('name', ''),
+        'password': hash_password(password),
+        'employee_id': profile.get('employee_id', ''),
+        'company_name': profile.get('company_name') or 'غير محدد',
+        'department': profile.get('department', ''),
+        'email': profile.get('email', ''),
+        'payment_method': profile.get('payment_method') or DEFAULT_PAYMENT,
+        'expenses': [],
+        'created_at': now(),
+    }
+
+
+# ==================== الخدمة ====================
+
+class ExpenseService:
+    """عمليات التطبيق فوق طبقة التخزين (أي مخزن من storage.open_store)"""
+
+    def __init__(self, store):
+        self.store = store
+
+    # ---------- الحسابات ----------
+
+    def register(self, username: str, password: str, profile: Optional[Dict] = None) -> Dict:
+        if len(username) < MIN_USERNAME:
+            raise ValidationError(f"اسم المستخدم يجب أن يكون {MIN_USERNAME} أحرف على الأقل!")
+        if len(password) < MIN_PASSWORD:
+            raise ValidationError(f"كلمة المرور يجب أن تكون {MIN_PASSWORD} أحرف على الأقل!")
+        if username in self.store.users_data:
+            raise ValidationError("اسم المستخدم موجود بالفعل!")
+        email = (profile or {}).get('email', '')
+        if email and not validate_email(email):
+            raise ValidationError("البريد الإلكتروني غير صحيح!")
+        user = new_user(password, profile)
+        self.store.add_user(username, user)
+        return user
+
+    def authenticate(self, username: str, password: str) -> Dict:
+        """نسخة من بيانات المستخدم مع username؛ ValidationError إذا لم تتطابق
+
+        الحسابات القديمة من لوحة Streamlit تحمل كلمة المرور كنص صريح، فتشفر عند أول دخول صحيح.
+        """
+        user = self.store.users_data.get(username)
+        if user is None:
+            raise ValidationError("اسم المستخدم غير موجود!")
+        stored = user.get('password', '')
+        if stored != hash_password(password):
+            if SHA256_HEX.match(stored) or stored != password:
+                raise ValidationError("كلمة المرور غير صحيحة!")
+            self.store.update_user(username, {'password': hash_password(password)})
+            user = self.store.users_data[username]
+        current = dict(user)
+        current['username'] = username
+        return current
+
+    def update_profile(self, username: str, fields: Dict, password: str = ''):
+        """تحديث بيانات الحساب؛ كلمة المرور الجديدة (إن وجدت) تشفر هنا"""
+        if fields.get('email') and not validate_email(fields['email']):
+            raise ValidationError("البريد الإلكتروني غير صحيح!")
+        fields = dict(fields)
+        if password:
+            if len(password) < MIN_PASSWORD:
+                raise ValidationError(f"كلمة المرور يجب أن تكون {MIN_PASSWORD} أحرف على الأقل!")
+            fields['password'] = hash_password(password)
+        self.store.update_user(username, fields)
+
+    # ---------- المصاريف ----------
+
+    def add_expense(self, username: str, fields: Dict, require_route: bool = True) -> str:
+        return self.store.add_expense(username, build_expense(fields, require_route))
+
+    def update_expense(self, username: str, expense_id: str, fields: Dict, require_route: bool = False):
+        """استبدال مصروف موجود مع الاحتفاظ بوقت إضافته وتسجيل وقت التعديل"""
+        expense = build_expense(fields, require_route)
+        expense['updated_at'] = now()
+        self.store.update_expense(username, expense_id, expense)
+
+    def delete_expense(self, username: str, expense_id: str):
+        if self.store.get_expense(username, expense_id) is None:
+            raise ValidationError("خطأ في اختيار السطر.")
+        self.store.delete_expense(username, expense_id)
+
+    def import_file(self, username: str, path: str,
+                    default_payment: str = DEFAULT_PAYMENT) -> Tuple[int, List[Tuple[int, str]]]:
+        """(عدد المصاريف المضافة, الأسطر المرفوضة) من ملف CSV أو Excel بحفظ واحد"""
+        importer = optional_module('importer')
+        if importer is None:
+            raise ValidationError("الاستيراد يحتاج مكتبة pandas!")
+        accepted, rejected = importer.load_expenses(path, default_payment)
+        if accepted:
+            self.store.add_expenses(username, accepted)
+        return len(accepted), rejected
+
+    # ---------- الاستعلامات ----------
+
+    def expenses(self, username: str) -> List[Dict]:
+        return self.store.user_expenses(username)
+
+    def query(self, username: str, search_text: str = '', start: Optional[str] = None,
+              end: Optional[str] = None, within: Optional[List[Dict]] = None) -> List[Dict]:
+        """المصاريف المطابقة للبحث وحدود التاريخ (من فهارس المخزن)"""
+        return self.store.query_expenses(username, search_text.lower(), start, end, within=within)
+
+    def totals(self, username: str, expenses: Optional[List[Dict]] = None) -> Tuple[float, int]:
+        """الإجمالي والعدد لكل المصاريف أو لنتيجة استعلام"""
+        if expenses is not None:
+            return queries.summarize(expenses)
+        return self.store.totals(username)
+
+    def statistics(self, username: str) -> Dict:
+        return self.store.statistics(username)
+
+    def rollup(self, username: str) -> MonthlyRollup:
+        return self.store.user_rollup(username)
+
+    # ---------- التصدير ----------
+
+    def report_snapshot(self, username: str) -> Tuple[Dict, List[Dict], MonthlyRollup]:
+        """نسخة من بيانات التقرير، فالإضافة والحذف أثناء الكتابة في خيط آخر لا يؤثران عليه"""
+        with self.store.lock:
+            user = dict(self.store.users_data[username])
+            rollup = MonthlyRollup.from_json(self.store.user_rollup(username).to_json())
+            expenses = list(self.store.user_expenses(username))
+        user['username'] = username
+        return user, expenses, rollup
+
+    def export_excel(self, filename: str, username: str, **options):
+        """تقرير Excel للمستخدم (options: progress, cancel, thumbnail_cache, receipts)"""
+        export_report(filename, *self.report_snapshot(username), **options)
+
+
+def export_report(filename: str, user: Dict, expenses: List[Dict], rollup: MonthlyRollup, **options):
+    """كتابة تقرير Excel من نسخة report_snapshot"""
+    excel_report = optional_module('excel_report')
+    if excel_report is None:
+        raise ValidationError("التقارير تحتاج مكتبة openpyxl!")
+    try:
+        excel_report.write_report(filename, user, expenses, rollup, **options)
+    except excel_report.ReportCancelled:
+        raise ReportCancelled() from None
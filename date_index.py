@@ -0,0 +1,82 @@
+"""فهرس مرتب بالتاريخ لمصاريف مستخدم واحد: البحث بمدى تاريخ عبر bisect"""
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import queries
+
+
+class DateIndex:
+    """التواريخ تحول إلى أرقام أيام مرة واحدة وتحفظ مرتبة مع ترتيب المصروف في القائمة
+
+    استعلام المدى يكلف O(log n + k)، والمصاريف ذات التاريخ غير الصحيح لا تظهر
+    في أي مدى (كما كانت الفلترة القديمة تستبعدها).
+    """
+
+    def __init__(self, expenses: Iterable[Dict] = ()):
+        # (رقم اليوم, الترتيب) مرتبة تصاعدياً
+        self.entries: List[Tuple[int, int]] = []
+        self.records: Dict[int, Dict] = {}
+        self.positions: Dict[int, Tuple[Optional[int], int]] = {}
+        self.next_order = 0
+        for expense in expenses:
+            self.add(expense, bulk=True)
+        self.entries.sort()
+
+    def add(self, expense: Dict, position: Optional[int] = None, bulk: bool = False):
+        if position is None:
+            position = self.next_order
+            self.next_order += 1
+        ordinal = queries.date_ordinal(expense.get('date', ''))
+        self.records[position] = expense
+        self.positions[id(expense)] = (ordinal, position)
+        if ordinal is not None:
+            if bulk:
+                self.entries.append((ordinal, position))
+            else:
+                insort(self.entries, (ordinal, position))
+
+    def remove(self, expense: Dict) -> int:
+        """حذف مصروف وإرجاع ترتيبه (لإعادة استخدامه عند التعديل)"""
+        ordinal, position = self.positions.pop(id(expense))
+        if ordinal is not None:
+            del self.entries[bisect_left(self.entries, (ordinal, position))]
+        del self.records[position]
+        return position
+
+    def replace(self, old: Dict, new: Dict):
+        self.add(new, self.remove(old))
+
+    def apply(self, record: Dict, old: Optional[Dict] = None):
+        """تحديث الفهرس بعملية تخزين قبل تطبيقها (old: المصروف الحالي في التعديل والحذف)"""
+        op = record['op']
+        if op == 'add':
+            self.add(record['expense'])
+        elif op == 'update':
+            self.replace(old, record['expense'])
+        elif op == 'delete':
+            self.remove(old)
+
+    def bounds(self, start: Optional[str], end: Optional[str]) -> Tuple[int, int]:
+        """حدود المدى كأرقام أيام (None تعني بلا حد)"""
+        low = queries.date_ordinal(start) if start else None
+        high = queries.date_ordinal(end) if end else None
+        return (low if low is not None else -1,
+                high if high is not None else float('inf'))
+
+    def range(self, start: Optional[str], end: Optional[str]) -> List[Dict]:
+        """المصاريف بين تاريخين (شاملين) بترتيب إضافتها للفهرس (ترتيب القائمة عند بنائه)"""
+        low, high = self.bounds(start, end)
+        first = bisect_left(self.entries, (low, -1))
+        last = bisect_left(self.entries, (high + 1, -1))
+        positions = sorted(position for _, position in self.entries[first:last])
+        return [self.records[position] for position in positions]
+
+    def filter(self, expenses: Iterable[Dict], start: Optional[str], end: Optional[str]) -> List[Dict]:
+        """تطبيق حدود التاريخ على قائمة مرشحين (مثل نتائج البحث) بدون إعادة تحليل التواريخ"""
+        low, high = self.bounds(start, end)
+        result = []
+        for expense in expenses:
+            ordinal = self.positions[id(expense)][0]
+            if ordinal is not None and low <= ordinal <= high:
+                result.append(expense)
+        return result
@@ -0,0 +1,260 @@
+"""تقرير المصاريف في Excel بوضع الكتابة فقط (write-only) في openpyxl
+
+الأسطر تكتب إلى الملف مباشرة من مولد بدلاً من بناء الورقة كاملة في الذاكرة،
+وكائنات التنسيق تنشأ مرة واحدة ويعاد استخدامها لكل الخلايا. لذلك الذاكرة ثابتة
+تقريباً والوقت خطي مع عدد المصاريف. التنسيق نفسه: العنوان ومعلومات الموظف
+والأسطر المتبادلة الألوان وسطر الإجمالي والتوقيعات وورقة الملخص الشهري.
+صور الإيصالات تضمن من الصور المصغرة في thumbnails وليس من الملفات الأصلية.
+
+في وضع الكتابة فقط يجب ضبط عرض الأعمدة وارتفاع كل سطر ودمج الخلايا قبل كتابة السطر.
+"""
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+from receipt_store import ReceiptStore
+from thumbnails import ThumbnailCache
+
+# عدد الأسطر بين كل تحديثين للتقدم
+PROGRESS_EVERY = 100
+
+COLUMN_WIDTHS = [15, 25, 25, 15, 18, 12, 30, 20]
+HEADERS = ['التاريخ', 'من', 'إلى', 'نوع المواصلة', 'وسيلة الدفع', 'المبلغ (جنيه)', 'ملاحظات', 'الإيصال']
+
+# ==================== التنسيقات (مرة واحدة لكل الخلايا) ====================
+
+THIN_BORDER = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+CENTER = Alignment(horizontal='center', vertical='center')
+CENTER_WRAP = Alignment(horizontal='center', vertical='center', wrap_text=True)
+TITLE_FONT = Font(size=16, bold=True, color="FFFFFF")
+TITLE_FILL = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
+INFO_FONT = Font(size=11, bold=True)
+HEADER_FONT = Font(size=11, bold=True, color="FFFFFF")
+HEADER_FILL = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
+ZEBRA_FILL = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
+TOTAL_FONT = Font(size=12, bold=True)
+TOTAL_FILL = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
+
+
+class ReportCancelled(Exception):
+    """أوقف المستخدم كتابة التقرير"""
+
+
+def styled(ws, value, font=None, fill=None, alignment=None, border=None) -> WriteOnlyCell:
+    """خلية كتابة فقط بتنسيقات مشتركة"""
+    cell = WriteOnlyCell(ws, value=value)
+    if font is not None:
+        cell.font = font
+    if fill is not None:
+        cell.fill = fill
+    if alignment is not None:
+        cell.alignment = alignment
+    if border is not None:
+        cell.border = border
+    return cell
+
+
+def expense_rows(ws, expenses: Iterable[Dict], first_row: int, receipts: ReceiptStore,
+                 thumbnails: Dict[str, Optional[str]]) -> Iterator[Tuple[List, bool]]:
+    """(خلايا السطر, هل ضمنت صورة) لكل مصروف؛ ارتفاع السطر وصورة الإيصال يضبطان قبل كتابته
+
+    thumbnails: مسار الإيصال -> صورته المصغرة (تضمن في الملف بدلاً من الأصلية)
+    """
+    for offset, expense in enumerate(expenses):
+        row = first_row + offset
+        fill = ZEBRA_FILL if offset % 2 == 0 else None
+        values = [
+            expense.get('date', ''),
+            expense.get('from', ''),
+            expense.get('to', ''),
+            expense.get('type', ''),
+            expense.get('payment_method', ''),
+            expense.get('amount', 0),
+            expense.get('notes', ''),
+        ]
+        cells = [styled(ws, value, fill=fill, alignment=CENTER_WRAP, border=THIN_BORDER) for value in values]
+
+        # إضافة الإيصال
+        receipt_path = receipts.resolve(expense.get('receipt'))
+        if receipt_path and os.path.exists(receipt_path):
+            thumbnail = thumbnails.get(receipt_path)
+            if thumbnail is not None:
+                img = Image(thumbnail)
+                ws.add_image(img, f'H{row}')
+                ws.row_dimensions[row].height = max(115, int(img.height * 0.75) + 10)
+                receipt = "مرفق"
+            else:
+                receipt = "خطأ في الصورة"
+        else:
+            receipt = "لا يوجد"
+        cells.append(styled(ws, receipt, alignment=CENTER, border=THIN_BORDER))
+        yield cells, receipt == "مرفق"
+
+
+def write_report(filename: str, user: Dict, expenses: List[Dict], rollup,
+                 thumbnail_cache: Optional[ThumbnailCache] = None,
+                 progress: Optional[Callable[[int, int], None]] = None, cancel=None,
+                 receipts: Optional[ReceiptStore] = None):
+    """كتابة تقرير مصاريف مستخدم (rollup: التجميع الشهري للإجمالي والملخص الشهري)
+
+    progress(الأسطر المكتوبة, الصور المضمنة) يستدعى كل PROGRESS_EVERY سطر.
+    cancel: threading.Event؛ عند ضبطه يتوقف الكاتب برفع ReportCancelled ولا يبقى ملف ناقص.
+    الكتابة تتم في ملف مؤقت يستبدل به الملف المطلوب في النهاية.
+    """
+    temp = filename + '.tmp'
+    try:
+        write_workbook(temp, user, expenses, rollup, thumbnail_cache or ThumbnailCache(),
+                       progress, cancel, receipts or ReceiptStore())
+        if cancel is not None and cancel.is_set():
+            raise ReportCancelled()
+        os.replace(temp, filename)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+
+def write_workbook(filename, user, expenses, rollup, thumbnail_cache, progress, cancel, receipts):
+    """كتابة ورقة التقرير وورقة الملخص الشهري إلى filename"""
+    thumbnails = thumbnail_cache.ensure((receipts.resolve(expense['receipt'])
+                                         for expense in expenses if expense.get('receipt')),
+                                        cancel=cancel)
+    if cancel is not None and cancel.is_set():
+        raise ReportCancelled()
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("تقرير المصاريف")
+    for col, width in enumerate(COLUMN_WIDTHS, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+    # العنوان
+    ws.merged_cells.add('A1:H1')
+    ws.row_dimensions[1].height = 30
+    ws.append([styled(ws, "تقرير مصاريف المواصلات والانتقالات",
+                      font=TITLE_FONT, fill=TITLE_FILL, alignment=CENTER)])
+    ws.append([])
+
+    # معلومات المستخدم
+    info_data = [
+        ("اسم الموظف:", user['name']),
+        ("رقم الموظف:", user['employee_id']),
+        ("اسم الشركة:", user.get('company_name', 'غير محدد')),
+        ("القسم:", user.get('department', '')),
+        ("وسيلة الدفع الافتراضية:", user.get('payment_method', 'نقدي')),
+        ("تاريخ التقرير:", datetime.now().strftime("%Y-%m-%d %H:%M"))
+    ]
+    for label, value in info_data:
+        ws.append([styled(ws, label, font=INFO_FONT), value])
+    ws.append([])
+
+    # رأس الجدول
+    row = 3 + len(info_data) + 1
+    ws.row_dimensions[row].height = 25
+    ws.append([styled(ws, header, font=HEADER_FONT, fill=HEADER_FILL, alignment=CENTER, border=THIN_BORDER)
+               for header in HEADERS])
+
+    # بيانات المصاريف
+    row += 1
+    written = images = 0
+    for cells, embedded in expense_rows(ws, expenses, row, receipts, thumbnails):
+        if cancel is not None and cancel.is_set():
+            raise ReportCancelled()
+        ws.append(cells)
+        row += 1
+        written += 1
+        images += embedded
+        if progress is not None and written % PROGRESS_EVERY == 0:
+            progress(written, images)
+    if progress is not None:
+        progress(written, images)
+
+    # الإجمالي
+    ws.append([])
+    total_row = row + 1
+    ws.merged_cells.add(f'A{total_row}:E{total_row}')
+    total_label = styled(ws, "الإجمالي الكلي", font=TOTAL_FONT, fill=TOTAL_FILL, alignment=CENTER, border=THIN_BORDER)
+    total_cell = styled(ws, rollup.summary()['total'], font=TOTAL_FONT, fill=TOTAL_FILL,
+                        alignment=CENTER, border=THIN_BORDER)
+    ws.append([total_label, None, None, None, None, total_cell])
+
+    # التوقيعات
+    ws.append([])
+    ws.append([])
+    ws.append(["توقيع الموظف: _____________", None, None, None, "توقيع المدير: _____________"])
+
+    add_monthly_summary_sheet(wb, rollup)
+
+    wb.save(filename)
+
+
+def add_monthly_summary_sheet(wb, rollup):
+    """ورقة الملخص الشهري (حسب النوع ووسيلة الدفع) من التجميع الشهري"""
+    ws = wb.create_sheet("ملخص شهري")
+    overall = rollup.summary()
+    types = sorted(overall['by_type'], key=str)
+    payments = sorted(overall['by_payment'], key=str)
+    headers = ['الشهر', 'عدد المصاريف', 'الإجمالي (جنيه)'] + [str(t) for t in types] + [str(p) for p in payments]
+
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 16
+    ws.append([styled(ws, header, font=HEADER_FONT, fill=HEADER_FILL, alignment=CENTER, border=THIN_BORDER)
+               for header in headers])
+
+    for month, amount, count in rollup.trend():
+        summary = rollup.summary(month)
+        values = ([month, count, amount]
+                  + [summary['by_type'].get(t, 0) for t in types]
+                  + [summary['by_payment'].get(p, 0) for p in payments])
+        ws.append([styled(ws, value, alignment=CENTER, border=THIN_BORDER) for value in values])
+
+
+def write_company_summary(filename: str, period: str, employees: List[Dict]):
+    """التقرير المجمع للشركة: سطر لكل موظف بعدد مصاريفه وإجماليها وتوزيعها حسب النوع
+
+    employees: {'name', 'employee_id', 'department', 'count', 'total', 'by_type'} لكل موظف
+    """
+    types = sorted({t for employee in employees for t in employee['by_type']}, key=str)
+    headers = ['اسم الموظف', 'رقم الموظف', 'القسم', 'عدد المصاريف', 'الإجمالي (جنيه)'] + [str(t) for t in types]
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("ملخص الشركة")
+    for col in range(1, len(headers) + 1):
+        ws.column_dimensions[get_column_letter(col)].width = 20
+
+    ws.merged_cells.add(f'A1:{get_column_letter(len(headers))}1')
+    ws.row_dimensions[1].height = 30
+    ws.append([styled(ws, f"ملخص مصاريف المواصلات للشركة - {period}",
+                      font=TITLE_FONT, fill=TITLE_FILL, alignment=CENTER)])
+    ws.append([])
+    ws.append([styled(ws, header, font=HEADER_FONT, fill=HEADER_FILL, alignment=CENTER, border=THIN_BORDER)
+               for header in headers])
+
+    total = count = 0
+    for offset, employee in enumerate(employees):
+        fill = ZEBRA_FILL if offset % 2 == 0 else None
+        values = ([employee['name'], employee['employee_id'], employee['department'],
+                   employee['count'], employee['total']]
+                  + [employee['by_type'].get(t, 0) for t in types])
+        ws.append([styled(ws, value, fill=fill, alignment=CENTER, border=THIN_BORDER) for value in values])
+        total += employee['total']
+        count += employee['count']
+
+    ws.append([])
+    row = 3 + len(employees) + 2
+    ws.merged_cells.add(f'A{row}:C{row}')
+    ws.append([styled(ws, "الإجمالي الكلي", font=TOTAL_FONT, fill=TOTAL_FILL, alignment=CENTER, border=THIN_BORDER),
+               None, None,
+               styled(ws, count, font=TOTAL_FONT, fill=TOTAL_FILL, alignment=CENTER, border=THIN_BORDER),
+               styled(ws, total, font=TOTAL_FONT, fill=TOTAL_FILL, alignment=CENTER, border=THIN_BORDER)])
+
+    wb.save(filename)
@@ -0,0 +1,58 @@
+"""قفل ملف استشاري بين العمليات (fcntl على Linux/macOS وmsvcrt على Windows)
+
+كل استخدام يفتح الملف من جديد، فالقفل يعمل بين الخيوط في نفس العملية أيضاً. لا
+يجوز أخذ نفس القفل مرتين متداخلتين في نفس الخيط.
+"""
+import os
+
+if os.name == 'nt':
+    import msvcrt
+
+    def lock_handle(handle):
+        handle.seek(0)
+        while True:
+            try:
+                # LK_LOCK يعيد المحاولة لمدة 10 ثوانٍ ثم يفشل، فنعيد المحاولة حتى ينجح
+                msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                return
+            except OSError:
+                continue
+
+    def unlock_handle(handle):
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def lock_handle(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+
+    def unlock_handle(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+
+
+class FileLock:
+    """with FileLock(path): ... ينتظر حتى تترك العمليات الأخرى القفل"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.handle = open(self.path, 'a+b')
+        try:
+            lock_handle(self.handle)
+        except BaseException:
+            self.handle.close()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            unlock_handle(self.handle)
+        finally:
+            self.handle.close()
+            self.handle = None
@@ -0,0 +1,57 @@
+"""فهرس معرفات المصاريف: المعرف -> المصروف وموضعه في قائمة المستخدم"""
+import uuid
+from typing import Dict, List, Optional
+
+
+def new_expense_id() -> str:
+    """معرف ثابت فريد للمصروف"""
+    return uuid.uuid4().hex
+
+
+def assign_ids(expenses: List[Dict]) -> int:
+    """إعطاء معرف لكل مصروف بدون معرف (أو بمعرف مكرر)، وإرجاع عدد المعرفات الجديدة"""
+    seen = set()
+    assigned = 0
+    for expense in expenses:
+        expense_id = expense.get('id')
+        if not expense_id or expense_id in seen:
+            expense_id = expense['id'] = new_expense_id()
+            assigned += 1
+        seen.add(expense_id)
+    return assigned
+
+
+class IdIndex:
+    """بحث بالمعرف وبموضعه في القائمة في O(1)
+
+    الحذف ينقل آخر مصروف إلى مكان المحذوف (apply_operation في storage) بدلاً من إزاحة
+    كل ما بعده، فيتغير موضع مصروف واحد فقط ويحدث هنا مباشرة.
+    """
+
+    def __init__(self, expenses: List[Dict]):
+        self.expenses = expenses
+        self.records: Dict[str, Dict] = {expense.get('id'): expense for expense in expenses}
+        self.positions: Dict[str, int] = {expense.get('id'): i for i, expense in enumerate(expenses)}
+
+    def get(self, expense_id: str) -> Optional[Dict]:
+        return self.records.get(expense_id)
+
+    def position(self, expense_id: str) -> int:
+        """موضع المصروف في القائمة (KeyError إذا لم يكن موجوداً)"""
+        return self.positions[expense_id]
+
+    def apply(self, record: Dict):
+        """تحديث الفهرس بعملية تخزين قبل تطبيقها على القائمة"""
+        op = record['op']
+        if op == 'add':
+            expense = record['expense']
+            self.records[expense['id']] = expense
+            self.positions[expense['id']] = len(self.expenses)
+        elif op == 'update':
+            self.records[record['id']] = record['expense']
+        elif op == 'delete':
+            position = self.positions.pop(record['id'])
+            del self.records[record['id']]
+            last = len(self.expenses) - 1
+            if position != last:
+                self.positions[self.expenses[last].get('id')] = position
@@ -0,0 +1,111 @@
+"""استيراد مصاريف من ملف CSV أو Excel
+
+التاريخ والمبلغ يتحقق منهما بنفس دوال core المستخدمة في نموذج الإضافة (مرة واحدة
+لكل قيمة مختلفة في العمود)، والنوع ووسيلة الدفع بعمليات pandas متجهة، ثم تبنى
+المصاريف المقبولة وتضاف كلها بحفظ واحد. الأعمدة بالأسماء الإنجليزية للتخزين أو
+بعناوين تقرير Excel العربية.
+"""
+import os
+from typing import Callable, Dict, List, Tuple
+
+import pandas as pd
+
+import core
+from core import DEFAULT_PAYMENT, PAYMENT_METHODS, TRANSPORT_TYPES
+
+REQUIRED_COLUMNS = ['date', 'from', 'to', 'type', 'amount']
+OPTIONAL_COLUMNS = ['payment_method', 'notes']
+# عناوين أعمدة تقرير Excel -> أسماء الحقول
+HEADER_ALIASES = {
+    'التاريخ': 'date',
+    'من': 'from',
+    'إلى': 'to',
+    'نوع المواصلة': 'type',
+    'وسيلة الدفع': 'payment_method',
+    'المبلغ': 'amount',
+    'المبلغ (جنيه)': 'amount',
+    'ملاحظات': 'notes',
+}
+
+
+def read_table(path: str) -> pd.DataFrame:
+    """قراءة الملف كنصوص (الخلايا الفارغة = '')"""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm', '.xls'):
+        frame = pd.read_excel(path, dtype=str).fillna('')
+    else:
+        frame = pd.read_csv(path, dtype=str, keep_default_na=False, encoding='utf-8-sig')
+    frame.columns = [HEADER_ALIASES.get(str(c).strip(), str(c).strip()) for c in frame.columns]
+    return frame
+
+
+def parse_column(values: pd.Series, parse: Callable) -> Tuple[pd.Series, pd.Series]:
+    """(القيم بعد parse, رسالة الرفض أو '') مع استدعاء parse مرة لكل قيمة مختلفة"""
+    parsed: Dict = {}
+    errors: Dict = {}
+    for value in values.unique():
+        try:
+            parsed[value], errors[value] = parse(value), ''
+        except core.ValidationError as e:
+            parsed[value], errors[value] = None, str(e)
+    return values.map(parsed), values.map(errors)
+
+
+def flag(condition: pd.Series, reason: str) -> pd.Series:
+    return condition.map({True: reason, False: ''})
+
+
+def validate(frame: pd.DataFrame,
+             default_payment: str = DEFAULT_PAYMENT) -> Tuple[List[Dict], List[Tuple[int, str]]]:
+    """(المصاريف المقبولة, [(رقم السطر في الملف, أسباب الرفض)])"""
+    missing = [c for c in REQUIRED_COLUMNS if c not in frame.columns]
+    if missing:
+        raise ValueError(f"أعمدة ناقصة في الملف: {', '.join(missing)}")
+    for column in OPTIONAL_COLUMNS:
+        if column not in frame.columns:
+            frame[column] = ''
+
+    text = {c: frame[c].astype(str).str.strip() for c in REQUIRED_COLUMNS + OPTIONAL_COLUMNS}
+    # Excel يحول التواريخ إلى "2025-01-05 00:00:00"
+    dates, date_errors = parse_column(text['date'].str.split(' ').str[0], core.normalize_date)
+    amounts, amount_errors = parse_column(text['amount'], core.parse_amount)
+    payments = text['payment_method'].mask(text['payment_method'] == '', default_payment)
+
+    errors = pd.DataFrame({
+        'date': date_errors,
+        'route': flag((text['from'] == '') | (text['to'] == ''), "من/إلى مطلوبان"),
+        'amount': amount_errors,
+        'type': flag(~text['type'].isin(TRANSPORT_TYPES), "نوع مواصلة غير معروف"),
+        'payment_method': flag(~payments.isin(PAYMENT_METHODS), "وسيلة دفع غير معروفة"),
+    })
+    bad = (errors != '').any(axis=1)
+
+    rejected = []
+    for position, messages in zip(bad[bad].index, errors[bad].itertuples(index=False)):
+        reasons = [message for message in messages if message]
+        # +2: سطر العناوين والترقيم من 1
+        rejected.append((frame.index.get_loc(position) + 2, '، '.join(reasons)))
+
+    good = ~bad
+    added_at = core.now()
+    accepted = [
+        {
+            'date': date,
+            'from': origin,
+            'to': destination,
+            'type': expense_type,
+            'payment_method': payment,
+            'amount': float(amount),
+            'notes': notes,
+            'receipt': None,
+            'added_at': added_at,
+        }
+        for date, origin, destination, expense_type, payment, amount, notes in zip(
+            dates[good], text['from'][good], text['to'][good],
+            text['type'][good], payments[good], amounts[good], text['notes'][good])
+    ]
+    return accepted, rejected
+
+
+def load_expenses(path: str, default_payment: str = DEFAULT_PAYMENT) -> Tuple[List[Dict], List[Tuple[int, str]]]:
+    """قراءة ملف المصاريف والتحقق منه"""
+    return validate(read_table(path), default_payment)
@@ -1,18 +1,36 @@
+import time
+# بداية استيراد وحدات التطبيق (لقياس زمن التشغيل بـ --startup-time)
+IMPORT_STARTED = time.perf_counter()
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.drawing.image import Image
-from datetime import datetime, timedelta
+from datetime import datetime
+import argparse
 import os
 import json
-import hashlib
+import sys
 import webbrowser
-import re
+import threading
+import storage
+import queries
+import core
+from virtual_list import VirtualList
+from receipt_store import ReceiptStore
 from typing import Dict, List, Optional
+# openpyxl وPIL (التقارير) وpandas (التحليلات والاستيراد) تستورد عند أول استخدام
+IMPORT_TIME = time.perf_counter() - IMPORT_STARTED
+
+# مهلة انتظار توقف الكتابة قبل تنفيذ البحث (مللي ثانية)
+SEARCH_DELAY_MS = 150
+# فترة تحديث نافذة تقدم التقرير (مللي ثانية)
+REPORT_POLL_MS = 100
+# حدود زمن التشغيل (مللي ثانية) التي يقارن بها --startup-time؛ تعدل مع كل إصدار عند الحاجة
+STARTUP_BUDGET_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
 
 class ExpenseTrackerApp:
     def __init__(self):
+        started = time.perf_counter()
+        # أزمنة التشغيل بالثواني: import, first_paint, load
+        self.timings = {'import': IMPORT_TIME}
         self.root = tk.Tk()
         self.root.title("نظام إدارة مصاريف المواصلات")
         self.root.geometry("1100x800")
@@ -21,80 +39,124 @@ class ExpenseTrackerApp:
         # إعدادات الملفات
         self.users_file = "users_data.json"
         self.backup_file = "users_data_backup.json"
+        self.storage_mode = storage.default_mode()
+        self.store = storage.open_store(self.users_file, self.backup_file, self.storage_mode)
+        # التحقق والحسابات والاستعلامات والتصدير (نفس الخدمة في لوحة Streamlit)
+        self.service = core.ExpenseService(self.store)
         
-        # تحميل البيانات
-        self.load_users()
+        # الحفظ في خيط خلفي حتى لا تتجمد الواجهة، والأخطاء تعرض من خيط الواجهة
+        self.store.start_write_behind(lambda e: self.root.after(0, self.show_save_error, e))
+        # دمج تغييرات عملية أخرى (Streamlit أو نسخة ثانية من التطبيق) عند الحفظ
+        self.store.on_change = lambda: self.root.after(0, self.on_store_changed)
         
         # متغيرات العمل
         self.current_user = None
-        self.expenses = []
         self.current_receipt = None
         self.filter_active = False
-        
-        # عرض شاشة الدخول
+        self.filter_criteria = ('', None, None)
+        # آخر استعلام ونتيجته (لتضييق البحث أثناء الكتابة) وموعد البحث المؤجل
+        self.last_query = None
+        self.search_job = None
+        # خيط إنشاء التقرير الجاري (تقرير واحد في كل مرة)
+        self.report_worker = None
+        # الإيصالات تنسخ إلى مخزن التطبيق؛ receipt_job الملف الجاري نسخه
+        self.receipts = ReceiptStore()
+        self.receipt_job = None
+        
+        # عرض شاشة الدخول ورسمها قبل قراءة البيانات، فالنافذة تظهر فوراً مهما كان حجم الملف
         self.show_login_screen()
+        self.root.update_idletasks()
+        self.timings['first_paint'] = time.perf_counter() - started
+        
+        # تحميل البيانات
+        started = time.perf_counter()
+        self.load_users()
+        self.timings['load'] = time.perf_counter() - started
         
         # ربط حدث الإغلاق للحفظ التلقائي
         self.root.protocol("WM_DELETE_WINDOW", self.on_closing)
     
+    @property
+    def users_data(self) -> Dict:
+        """بيانات المستخدمين من طبقة التخزين (تستبدل بعد دمج تغييرات عملية أخرى)"""
+        return self.store.users_data
+    
+    @property
+    def expenses(self) -> List[Dict]:
+        """مصاريف المستخدم الحالي من طبقة التخزين"""
+        if not self.current_user:
+            return []
+        return self.store.user_expenses(self.current_user['username'])
+    
+    def on_store_changed(self):
+        """إعادة العرض بعد دمج تغييرات كتبتها عملية أخرى"""
+        self.last_query = None
+        if self.current_user and self.current_user['username'] in self.users_data:
+            self.store.build_indexes(self.current_user['username'])
+            if hasattr(self, 'expense_list') and self.tree.winfo_exists():
+                self.refresh_view()
+    
     def load_users(self):
         """تحميل بيانات المستخدمين مع معالجة الأخطاء"""
-        if os.path.exists(self.users_file):
-            try:
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    self.users_data = json.load(f)
-                # ترقية البيانات القديمة
-                self.upgrade_user_data()
-            except Exception as e:
-                # محاولة استرجاع النسخة الاحتياطية
-                if os.path.exists(self.backup_file):
-                    try:
-                        with open(self.backup_file, 'r', encoding='utf-8') as f:
-                            self.users_data = json.load(f)
-                        messagebox.showwarning("تحذير", "تم استرجاع النسخة الاحتياطية")
-                    except:
-                        self.users_data = {}
-                else:
-                    self.users_data = {}
-        else:
-            self.users_data = {}
+        try:
+            self.store.load()
+        except Exception as e:
+            # الاستمرار ببيانات فارغة يكتب فوق الملف عند أول حفظ
+            messagebox.showerror("خطأ", f"تعذرت قراءة ملف البيانات، لن يتم فتح التطبيق:\n{e}")
+            self.root.destroy()
+            raise SystemExit(1)
+        if self.store.restored_from_backup:
+            messagebox.showwarning("تحذير", "تم استرجاع النسخة الاحتياطية")
+        # ترقية البيانات القديمة
+        self.upgrade_user_data()
     
     def upgrade_user_data(self):
         """ترقية بيانات المستخدمين القديمة"""
         for username in self.users_data:
             user = self.users_data[username]
-            # إضافة حقول جديدة إذا لم تكن موجودة
-            if 'expenses' not in user:
-                user['expenses'] = []
+            # إضافة حقول جديدة إذا لم تكن موجودة (المصاريف تحمل من طبقة التخزين عند الدخول)
             if 'payment_method' not in user:
                 user['payment_method'] = 'نقدي'
             if 'company_name' not in user:
                 user['company_name'] = 'غير محدد'
     
-    def save_users(self):
-        """حفظ بيانات المستخدمين مع نسخة احتياطية"""
+    def save_users(self) -> bool:
+        """ضغط السجل في نقطة حفظ كاملة مع نسخة احتياطية وإغلاق ملفات التخزين
+
+        يعيد False إذا بقيت تغييرات لم تحفظ واختار المستخدم عدم الخروج.
+        """
         try:
-            # إنشاء نسخة احتياطية
-            if os.path.exists(self.users_file):
-                with open(self.users_file, 'r', encoding='utf-8') as f:
-                    backup_data = f.read()
-                with open(self.backup_file, 'w', encoding='utf-8') as f:
-                    f.write(backup_data)
-            
-            # حفظ البيانات الجديدة
-            with open(self.users_file, 'w', encoding='utf-8') as f:
-                json.dump(self.users_data, f, ensure_ascii=False, indent=4)
+            self.store.close()
+        except storage.UnsavedChanges as e:
+            # خيط الحفظ يستمر في إعادة المحاولة ما دام التطبيق مفتوحاً
+            return messagebox.askyesno("تحذير", f"{e}\n\nهل تريد الخروج بدون حفظ هذه التغييرات؟")
         except Exception as e:
             messagebox.showerror("خطأ", f"فشل حفظ البيانات: {e}")
+        return True
     
-    def hash_password(self, password: str) -> str:
-        """تشفير كلمة المرور"""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def show_save_error(self, error):
+        """عرض خطأ الحفظ القادم من خيط الحفظ الخلفي"""
+        messagebox.showerror("خطأ", f"فشل حفظ البيانات: {error}")
     
-    def validate_email(self, email: str) -> bool:
-        """التحقق من صحة البريد الإلكتروني"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return re.match(pattern, email) is not None
+    def flush_saves(self):
+        """انتظار كتابة كل التغييرات المعلقة على القرص"""
+        try:
+            self.store.flush()
+        except Exception as e:
+            self.show_save_error(e)
+    
+    def persist(self, operation, *args) -> bool:
+        """تنفيذ عملية تخزين واحدة مع عرض الخطأ إن فشلت (رسائل التحقق تعرض كما هي)"""
+        try:
+            operation(*args)
+            self.last_query = None
+            return True
+        except core.ValidationError as e:
+            messagebox.showerror("خطأ", str(e))
+            return False
+        except Exception as e:
+            messagebox.showerror("خطأ", f"فشل حفظ البيانات: {e}")
+            return False
     
     def clear_window(self):
         """مسح كل العناصر من النافذة"""
@@ -231,40 +293,14 @@ class ExpenseTrackerApp:
             messagebox.showerror("خطأ", "الرجاء ملء جميع الحقول المطلوبة!")
             return
         
-        if len(data['username']) < 3:
-            messagebox.showerror("خطأ", "اسم المستخدم يجب أن يكون 3 أحرف على الأقل!")
-            return
-        
-        if len(data['password']) < 6:
-            messagebox.showerror("خطأ", "كلمة المرور يجب أن تكون 6 أحرف على الأقل!")
-            return
-        
         if data['password'] != data['confirm_password']:
             messagebox.showerror("خطأ", "كلمة المرور غير متطابقة!")
             return
         
-        if data['username'] in self.users_data:
-            messagebox.showerror("خطأ", "اسم المستخدم موجود بالفعل!")
-            return
-        
-        if data['email'] and not self.validate_email(data['email']):
-            messagebox.showerror("خطأ", "البريد الإلكتروني غير صحيح!")
+        # باقي التحقق (الطول والتكرار والبريد) وحفظ المستخدم في الخدمة
+        profile = {key: data[key] for key in ('name', 'employee_id', 'company_name', 'department', 'email')}
+        if not self.persist(self.service.register, data['username'], data['password'], profile):
             return
-        
-        # حفظ المستخدم
-        self.users_data[data['username']] = {
-            'name': data['name'],
-            'password': self.hash_password(data['password']),
-            'employee_id': data['employee_id'],
-            'company_name': data['company_name'],
-            'department': data['department'],
-            'email': data['email'],
-            'payment_method': 'نقدي',
-            'expenses': [],
-            'created_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
-        
-        self.save_users()
         messagebox.showinfo("نجح", "تم إنشاء الحساب بنجاح!\nيمكنك الآن تسجيل الدخول.")
         self.show_login_screen()
     
@@ -277,17 +313,14 @@ class ExpenseTrackerApp:
             messagebox.showerror("خطأ", "الرجاء إدخال اسم المستخدم وكلمة المرور!")
             return
         
-        if username not in self.users_data:
-            messagebox.showerror("خطأ", "اسم المستخدم غير موجود!")
-            return
-        
-        if self.users_data[username]['password'] != self.hash_password(password):
-            messagebox.showerror("خطأ", "كلمة المرور غير صحيحة!")
+        try:
+            self.current_user = self.service.authenticate(username, password)
+        except core.ValidationError as e:
+            messagebox.showerror("خطأ", str(e))
             return
         
-        self.current_user = self.users_data[username].copy()
-        self.current_user['username'] = username
-        self.expenses = self.current_user.get('expenses', []).copy()
+        self.store.build_indexes(username)
+        self.last_query = None
         
         messagebox.showinfo("مرحباً", f"أهلاً بك {self.current_user['name']}!")
         self.show_main_app()
@@ -347,7 +380,7 @@ class ExpenseTrackerApp:
         tk.Label(row2, text="نوع المواصلة:", font=('Arial', 10),
                 bg='#16213e', fg='#cbd5e1').pack(side='left', padx=5)
         self.transport_type = ttk.Combobox(row2, font=('Arial', 10), width=13,
-                                          values=['أوبر', 'كريم', 'تاكسي', 'مترو', 'أتوبيس', 'سيارة خاصة', 'أخرى'],
+                                          values=core.TRANSPORT_TYPES,
                                           state='readonly')
         self.transport_type.set('أوبر')
         self.transport_type.pack(side='left', padx=5)
@@ -355,7 +388,7 @@ class ExpenseTrackerApp:
         tk.Label(row2, text="وسيلة الدفع:", font=('Arial', 10),
                 bg='#16213e', fg='#cbd5e1').pack(side='left', padx=5)
         self.payment_method_choice = ttk.Combobox(row2, font=('Arial', 10), width=15,
-                                                 values=['نقدي', 'فيزا', 'محفظة إلكترونية', 'إنستاباي', 'أخرى'],
+                                                 values=core.PAYMENT_METHODS,
                                                  state='readonly')
         self.payment_method_choice.set(self.current_user.get('payment_method', 'نقدي'))
         self.payment_method_choice.pack(side='left', padx=5)
@@ -396,7 +429,7 @@ class ExpenseTrackerApp:
         self.search_entry = tk.Entry(filter_frame, font=('Arial', 10), width=20,
                                      bg='#0f3460', fg='#ffffff', insertbackground='#ffffff')
         self.search_entry.pack(side='left', padx=5)
-        self.search_entry.bind('<KeyRelease>', lambda e: self.filter_expenses())
+        self.search_entry.bind('<KeyRelease>', lambda e: self.schedule_search())
         
         tk.Button(filter_frame, text="مسح البحث", font=('Arial', 9),
                  bg='#64748b', fg='#ffffff', padx=10, pady=5,
@@ -406,12 +439,32 @@ class ExpenseTrackerApp:
         tk.Label(filter_frame, text="فترة:", font=('Arial', 10),
                 bg='#16213e', fg='#cbd5e1').pack(side='left', padx=(20, 5))
         self.period_filter = ttk.Combobox(filter_frame, font=('Arial', 9), width=12,
-                                         values=['الكل', 'اليوم', 'هذا الأسبوع', 'هذا الشهر', 'آخر 30 يوم'],
+                                         values=queries.PERIODS,
                                          state='readonly')
         self.period_filter.set('الكل')
         self.period_filter.pack(side='left', padx=5)
         self.period_filter.bind('<<ComboboxSelected>>', lambda e: self.filter_expenses())
         
+        # مدى تاريخ مخصص (يطبق مع الفترة المختارة)
+        tk.Label(filter_frame, text="من:", font=('Arial', 10),
+                bg='#16213e', fg='#cbd5e1').pack(side='left', padx=(20, 5))
+        self.date_from_entry = tk.Entry(filter_frame, font=('Arial', 10), width=11,
+                                        bg='#0f3460', fg='#ffffff', insertbackground='#ffffff')
+        self.date_from_entry.pack(side='left', padx=5)
+        self.date_from_entry.bind('<Return>', lambda e: self.filter_expenses())
+        
+        tk.Label(filter_frame, text="إلى:", font=('Arial', 10),
+                bg='#16213e', fg='#cbd5e1').pack(side='left', padx=5)
+        self.date_to_entry = tk.Entry(filter_frame, font=('Arial', 10), width=11,
+                                      bg='#0f3460', fg='#ffffff', insertbackground='#ffffff')
+        self.date_to_entry.pack(side='left', padx=5)
+        self.date_to_entry.bind('<Return>', lambda e: self.filter_expenses())
+        
+        tk.Button(filter_frame, text="تطبيق", font=('Arial', 9),
+                 bg='#3b82f6', fg='#ffffff', padx=10, pady=5,
+                 relief='flat', cursor='hand2',
+                 command=self.filter_expenses).pack(side='left', padx=5)
+        
         # Treeview
         style = ttk.Style()
         style.theme_use('default')
@@ -440,12 +493,15 @@ class ExpenseTrackerApp:
             else:
                 self.tree.column(col, width=90, anchor='center')
         
-        scrollbar = ttk.Scrollbar(list_frame, orient='vertical', command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
+        scrollbar = ttk.Scrollbar(list_frame, orient='vertical')
         
         self.tree.pack(side='left', fill='both', expand=True)
         scrollbar.pack(side='right', fill='y')
         
+        # الشجرة تعرض الأسطر الظاهرة فقط، وشريط التمرير يتحرك داخل القائمة
+        self.expense_list = VirtualList(self.tree, scrollbar, self.expense_row,
+                                        lambda expense: expense['id'])
+        
         self.tree.bind("<Double-1>", self.on_tree_double_click)
         
         # شريط الأزرار والإجمالي
@@ -474,6 +530,11 @@ class ExpenseTrackerApp:
                  relief='flat', cursor='hand2',
                  command=self.delete_expense).pack(side='left', padx=5)
         
+        tk.Button(bottom_frame, text="استيراد", font=('Arial', 11),
+                 bg='#f59e0b', fg='#ffffff', padx=20, pady=10,
+                 relief='flat', cursor='hand2',
+                 command=self.import_expenses).pack(side='left', padx=5)
+        
         tk.Button(bottom_frame, text="إنشاء تقرير Excel", font=('Arial', 12, 'bold'),
                  bg='#22c55e', fg='#ffffff', padx=30, pady=12,
                  relief='flat', cursor='hand2',
@@ -506,62 +567,94 @@ class ExpenseTrackerApp:
             filetypes=[("صور", "*.png *.jpg *.jpeg *.gif *.bmp"), ("كل الملفات", "*.*")]
         )
         if filename:
-            self.current_receipt = filename
-            self.receipt_label.config(text=f"{os.path.basename(filename)}", fg='#22c55e')
+            self.current_receipt = None
+            self.receipt_job = filename
+            self.receipt_label.config(text="جاري نسخ الإيصال...", fg='#f59e0b')
+            
+            def done(reference):
+                # تم اختيار إيصال آخر أو مسح الحقول أو الخروج أثناء النسخ
+                if self.receipt_job != filename or not self.receipt_label.winfo_exists():
+                    return
+                self.receipt_job = None
+                if reference:
+                    self.current_receipt = reference
+                    self.receipt_label.config(text=f"{os.path.basename(filename)}", fg='#22c55e')
+                else:
+                    self.receipt_label.config(text="لا يوجد إيصال", fg='#94a3b8')
+            
+            self.store_receipt(filename, done)
+    
+    def store_receipt(self, filename, on_done):
+        """نسخ الإيصال إلى مخزن الإيصالات في خيط منفصل؛ on_done(المرجع أو None) في خيط الواجهة"""
+        def work():
+            try:
+                reference = self.receipts.put(filename)
+            except Exception as e:
+                self.root.after(0, messagebox.showerror, "خطأ", f"فشل نسخ الإيصال: {e}")
+                reference = None
+            self.root.after(0, on_done, reference)
+        
+        threading.Thread(target=work, name="receipt-copy", daemon=True).start()
     
     def add_expense(self):
         """إضافة مصروف جديد"""
-        if not self.from_location.get().strip() or not self.to_location.get().strip() or not self.amount.get().strip():
-            messagebox.showerror("خطأ", "الرجاء ملء الحقول المطلوبة!")
-            return
-        
-        try:
-            amount = float(self.amount.get())
-            if amount <= 0:
-                messagebox.showerror("خطأ", "المبلغ يجب أن يكون أكبر من صفر!")
-                return
-        except ValueError:
-            messagebox.showerror("خطأ", "المبلغ يجب أن يكون رقماً!")
-            return
-        
-        date_str = self.date.get().strip()
-        try:
-            datetime.strptime(date_str, "%Y-%m-%d")
-        except Exception:
-            messagebox.showerror("خطأ", "التاريخ يجب أن يكون بالشكل: YYYY-MM-DD")
+        if self.receipt_job is not None:
+            messagebox.showwarning("تنبيه", "جاري نسخ الإيصال، حاول مرة أخرى بعد لحظة")
             return
         
-        expense = {
-            'date': date_str,
-            'from': self.from_location.get().strip(),
-            'to': self.to_location.get().strip(),
+        fields = {
+            'date': self.date.get(),
+            'from': self.from_location.get(),
+            'to': self.to_location.get(),
             'type': self.transport_type.get(),
             'payment_method': self.payment_method_choice.get(),
-            'amount': amount,
-            'notes': self.notes.get().strip(),
+            'amount': self.amount.get(),
+            'notes': self.notes.get(),
             'receipt': self.current_receipt,
-            'added_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
-        self.expenses.append(expense)
+        if not self.persist(self.service.add_expense, self.current_user['username'], fields):
+            return
         self.save_user_expenses()
         
-        receipt_status = "مرفق" if self.current_receipt else "لا يوجد"
-        self.tree.insert('', 'end', values=(
-            expense['date'],
-            expense['from'],
-            expense['to'],
-            expense['type'],
-            expense['payment_method'],
-            f"{expense['amount']:.2f}",
-            expense['notes'],
-            receipt_status
-        ))
-        
-        self.update_total()
+        self.refresh_view()
         self.clear_expense_fields()
         messagebox.showinfo("نجح", "تم إضافة المصروف بنجاح!")
     
+    def import_expenses(self):
+        """استيراد مصاريف من ملف CSV أو Excel بحفظ واحد"""
+        if core.optional_module('importer') is None:
+            messagebox.showerror("خطأ", "الاستيراد يحتاج مكتبة pandas!")
+            return
+        
+        filename = filedialog.askopenfilename(
+            title="اختر ملف المصاريف",
+            filetypes=[("CSV / Excel", "*.csv *.xlsx"), ("كل الملفات", "*.*")]
+        )
+        if not filename:
+            return
+        
+        try:
+            added, rejected = self.service.import_file(self.current_user['username'], filename,
+                                                       self.current_user.get('payment_method', 'نقدي'))
+        except Exception as e:
+            messagebox.showerror("خطأ", f"فشل استيراد الملف:\n{e}")
+            return
+        
+        self.last_query = None
+        if added:
+            self.refresh_view()
+        
+        message = f"تم استيراد {added} مصروف"
+        if rejected:
+            message += f"\nتم رفض {len(rejected)} سطر:\n"
+            message += "\n".join(f"سطر {line}: {reason}" for line, reason in rejected[:15])
+            if len(rejected) > 15:
+                message += f"\n... و{len(rejected) - 15} سطر آخر"
+            messagebox.showwarning("نتيجة الاستيراد", message)
+        else:
+            messagebox.showinfo("نجح", message)
+    
     def clear_expense_fields(self):
         """مسح حقول إدخال المصروف"""
         self.from_location.delete(0, tk.END)
@@ -569,6 +662,7 @@ class ExpenseTrackerApp:
         self.amount.delete(0, tk.END)
         self.notes.delete(0, tk.END)
         self.current_receipt = None
+        self.receipt_job = None
         self.receipt_label.config(text="لا يوجد إيصال", fg='#94a3b8')
         self.transport_type.set('أوبر')
         self.payment_method_choice.set(self.current_user.get('payment_method', 'نقدي'))
@@ -576,47 +670,40 @@ class ExpenseTrackerApp:
         self.date.insert(0, datetime.now().strftime("%Y-%m-%d"))
     
     def save_user_expenses(self):
-        """حفظ مصاريف المستخدم الحالي"""
-        self.current_user['expenses'] = self.expenses
-        self.current_user['payment_method'] = self.payment_method_choice.get()
-        self.users_data[self.current_user['username']] = self.current_user
-        self.save_users()
+        """حفظ وسيلة الدفع المفضلة للمستخدم الحالي (المصاريف تحفظ مع كل عملية)"""
+        payment_method = self.payment_method_choice.get()
+        if payment_method != self.current_user.get('payment_method'):
+            self.current_user['payment_method'] = payment_method
+            self.persist(self.store.update_user, self.current_user['username'],
+                         {'payment_method': payment_method})
     
     def delete_expense(self):
         """حذف مصروف محدد"""
-        selected = self.tree.selection()
-        if not selected:
+        expense_id = self.expense_list.selected_key()
+        if expense_id is None:
             messagebox.showwarning("تحذير", "الرجاء اختيار مصروف لحذفه!")
             return
         
         if not messagebox.askyesno("تأكيد", "هل أنت متأكد من حذف المصروف المحدد؟"):
             return
         
-        index = self.tree.index(selected[0])
-        self.tree.delete(selected[0])
-        
-        try:
-            self.expenses.pop(index)
-        except Exception:
-            self.rebuild_expenses_from_tree()
-        
-        self.save_user_expenses()
-        self.update_total()
+        if not self.persist(self.service.delete_expense, self.current_user['username'], expense_id):
+            return
+        self.refresh_view()
         messagebox.showinfo("نجح", "تم حذف المصروف!")
     
     def edit_selected_expense(self):
         """تعديل مصروف محدد"""
-        selected = self.tree.selection()
-        if not selected:
+        expense_id = self.expense_list.selected_key()
+        if expense_id is None:
             messagebox.showwarning("تحذير", "الرجاء اختيار مصروف لتعديله!")
             return
         
-        index = self.tree.index(selected[0])
-        if index < 0 or index >= len(self.expenses):
+        exp = self.store.get_expense(self.current_user['username'], expense_id)
+        if exp is None:
             messagebox.showerror("خطأ", "خطأ في اختيار السطر.")
             return
         
-        exp = self.expenses[index]
         edit_win = tk.Toplevel(self.root)
         edit_win.title("تعديل المصروف")
         edit_win.geometry("600x420")
@@ -654,7 +741,7 @@ class ExpenseTrackerApp:
         tk.Label(form, text="نوع المواصلة:", font=('Arial', 10),
                 bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=5, pady=8)
         type_cb = ttk.Combobox(form, font=('Arial', 10), width=37,
-                              values=['أوبر', 'كريم', 'تاكسي', 'مترو', 'أتوبيس', 'سيارة خاصة', 'أخرى'],
+                              values=core.TRANSPORT_TYPES,
                               state='readonly')
         type_cb.grid(row=row, column=1, padx=5, pady=8)
         type_cb.set(exp.get('type', 'أوبر'))
@@ -664,7 +751,7 @@ class ExpenseTrackerApp:
         tk.Label(form, text="وسيلة الدفع:", font=('Arial', 10),
                 bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=5, pady=8)
         pay_cb = ttk.Combobox(form, font=('Arial', 10), width=37,
-                             values=['نقدي', 'فيزا', 'محفظة إلكترونية', 'إنستاباي', 'أخرى'],
+                             values=core.PAYMENT_METHODS,
                              state='readonly')
         pay_cb.grid(row=row, column=1, padx=5, pady=8)
         pay_cb.set(exp.get('payment_method', 'نقدي'))
@@ -672,6 +759,7 @@ class ExpenseTrackerApp:
         
         # إرفاق إيصال
         new_receipt_path = tk.StringVar(value=exp.get('receipt') or "")
+        copying = {'file': None}
         
         def choose_new_receipt():
             fn = filedialog.askopenfilename(
@@ -679,8 +767,20 @@ class ExpenseTrackerApp:
                 filetypes=[("صور", "*.png *.jpg *.jpeg *.gif *.bmp"), ("كل الملفات", "*.*")]
             )
             if fn:
-                new_receipt_path.set(fn)
-                lbl_receipt.config(text=os.path.basename(fn))
+                copying['file'] = fn
+                lbl_receipt.config(text="جاري نسخ الإيصال...")
+                
+                def done(reference):
+                    if copying['file'] != fn or not lbl_receipt.winfo_exists():
+                        return
+                    copying['file'] = None
+                    if reference:
+                        new_receipt_path.set(reference)
+                        lbl_receipt.config(text=os.path.basename(fn))
+                    else:
+                        lbl_receipt.config(text=os.path.basename(new_receipt_path.get() or "لا يوجد"))
+                
+                self.store_receipt(fn, done)
         
         tk.Button(form, text="تغيير/إرفاق إيصال", font=('Arial', 9),
                  bg='#3b82f6', fg='#ffffff', padx=10, pady=6,
@@ -694,36 +794,24 @@ class ExpenseTrackerApp:
         btn_frame.pack(pady=15)
         
         def save_edit():
-            try:
-                datetime.strptime(entries['date_e'].get().strip(), "%Y-%m-%d")
-            except:
-                messagebox.showerror("خطأ", "التاريخ غير صحيح، استخدم YYYY-MM-DD")
+            if copying['file'] is not None:
+                messagebox.showwarning("تنبيه", "جاري نسخ الإيصال، حاول مرة أخرى بعد لحظة")
                 return
-            try:
-                amt = float(entries['amount_e'].get().strip())
-                if amt <= 0:
-                    raise ValueError
-            except:
-                messagebox.showerror("خطأ", "المبلغ يجب أن يكون رقماً أكبر من صفر")
-                return
-            
             updated = {
-                'date': entries['date_e'].get().strip(),
-                'from': entries['from_e'].get().strip(),
-                'to': entries['to_e'].get().strip(),
+                'date': entries['date_e'].get(),
+                'from': entries['from_e'].get(),
+                'to': entries['to_e'].get(),
                 'type': type_cb.get(),
                 'payment_method': pay_cb.get(),
-                'amount': amt,
-                'notes': entries['notes_e'].get().strip(),
+                'amount': entries['amount_e'].get(),
+                'notes': entries['notes_e'].get(),
                 'receipt': new_receipt_path.get() if new_receipt_path.get() else None,
-                'added_at': exp.get('added_at', datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
-                'updated_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                'added_at': exp.get('added_at'),
             }
             
-            self.expenses[index] = updated
-            self.save_user_expenses()
-            self.refresh_treeview()
-            self.update_total()
+            if not self.persist(self.service.update_expense, self.current_user['username'], expense_id, updated):
+                return
+            self.refresh_view()
             messagebox.showinfo("نجح", "تم حفظ التعديلات.")
             edit_win.destroy()
         
@@ -735,86 +823,72 @@ class ExpenseTrackerApp:
                  bg='#64748b', fg='#ffffff', padx=25, pady=8,
                  relief='flat', command=edit_win.destroy).pack(side='left', padx=10)
     
-    def rebuild_expenses_from_tree(self):
-        """إعادة بناء قائمة المصاريف من Treeview"""
-        items = self.tree.get_children()
-        new_expenses = []
-        for iid in items:
-            vals = self.tree.item(iid, 'values')
-            try:
-                amount = float(str(vals[5]).replace(',', ''))
-            except:
-                amount = 0.0
-            new_expenses.append({
-                'date': vals[0],
-                'from': vals[1],
-                'to': vals[2],
-                'type': vals[3],
-                'payment_method': vals[4],
-                'amount': amount,
-                'notes': vals[6],
-                'receipt': None
-            })
-        self.expenses = new_expenses
+    def expense_row(self, expense: Dict) -> tuple:
+        """قيم أعمدة سطر المصروف في الجدول"""
+        receipt_status = "مرفق" if expense.get('receipt') else "لا يوجد"
+        return (
+            expense.get('date', ''),
+            expense.get('from', ''),
+            expense.get('to', ''),
+            expense.get('type', ''),
+            expense.get('payment_method', ''),
+            f"{expense.get('amount', 0):.2f}",
+            expense.get('notes', ''),
+            receipt_status
+        )
     
-    def refresh_treeview(self):
-        """تحديث عرض المصاريف"""
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        
+    def refresh_treeview(self, keep_offset: bool = False):
+        """تحديث عرض المصاريف (الأسطر الظاهرة فقط)"""
         expenses_to_show = self.expenses if not self.filter_active else self.filtered_expenses
-        
-        for expense in expenses_to_show:
-            receipt_status = "مرفق" if expense.get('receipt') else "لا يوجد"
-            self.tree.insert('', 'end', values=(
-                expense.get('date', ''),
-                expense.get('from', ''),
-                expense.get('to', ''),
-                expense.get('type', ''),
-                expense.get('payment_method', ''),
-                f"{expense.get('amount', 0):.2f}",
-                expense.get('notes', ''),
-                receipt_status
-            ))
+        self.expense_list.set_rows(expenses_to_show, keep_offset)
+    
+    def refresh_view(self):
+        """إعادة العرض والإجمالي بعد تعديل البيانات، مع إعادة تطبيق الفلتر الحالي"""
+        if self.filter_active:
+            self.filtered_expenses = self.service.query(self.current_user['username'], *self.filter_criteria)
+            self.last_query = (self.filter_criteria, self.filtered_expenses)
+        self.refresh_treeview(keep_offset=True)
+        self.update_total()
+    
+    def schedule_search(self):
+        """تأجيل البحث حتى يتوقف المستخدم عن الكتابة لحظة (الضغطات السابقة تلغى)"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+        self.search_job = self.root.after(SEARCH_DELAY_MS, self.filter_expenses)
     
     def filter_expenses(self):
-        """فلترة المصاريف حسب البحث والفترة"""
+        """فلترة المصاريف حسب البحث والفترة ومدى التاريخ المخصص"""
+        if self.search_job is not None:
+            self.root.after_cancel(self.search_job)
+            self.search_job = None
         search_text = self.search_entry.get().strip().lower()
         period = self.period_filter.get()
         
-        self.filtered_expenses = []
-        today = datetime.now()
+        custom = []
+        for entry in (self.date_from_entry, self.date_to_entry):
+            value = entry.get().strip()
+            if value and queries.date_ordinal(value) is None:
+                messagebox.showerror("خطأ", "التاريخ يجب أن يكون بالشكل: YYYY-MM-DD")
+                return
+            custom.append(value or None)
+        start, end = queries.merge_ranges(queries.period_range(period), custom)
+        
+        criteria = (search_text, start, end)
+        within = None
+        if self.last_query is not None:
+            last_criteria, last_result = self.last_query
+            if last_criteria == criteria:
+                # نفس الاستعلام (مثل ضغط الأسهم أو Shift): لا داعي لإعادة العرض
+                return
+            last_text = last_criteria[0]
+            if last_text and last_text in search_text and last_criteria[1:] == (start, end):
+                within = last_result
         
-        for exp in self.expenses:
-            # فلتر البحث
-            if search_text:
-                searchable = f"{exp.get('from', '')} {exp.get('to', '')} {exp.get('type', '')} {exp.get('notes', '')}".lower()
-                if search_text not in searchable:
-                    continue
-            
-            # فلتر الفترة
-            if period != 'الكل':
-                try:
-                    exp_date = datetime.strptime(exp.get('date', ''), "%Y-%m-%d")
-                    if period == 'اليوم':
-                        if exp_date.date() != today.date():
-                            continue
-                    elif period == 'هذا الأسبوع':
-                        week_start = today - timedelta(days=today.weekday())
-                        if exp_date < week_start:
-                            continue
-                    elif period == 'هذا الشهر':
-                        if exp_date.month != today.month or exp_date.year != today.year:
-                            continue
-                    elif period == 'آخر 30 يوم':
-                        if exp_date < today - timedelta(days=30):
-                            continue
-                except:
-                    continue
-            
-            self.filtered_expenses.append(exp)
+        self.filter_criteria = criteria
+        self.filtered_expenses = self.service.query(self.current_user['username'], *criteria, within=within)
+        self.last_query = (criteria, self.filtered_expenses)
         
-        self.filter_active = bool(search_text) or period != 'الكل'
+        self.filter_active = bool(search_text) or bool(start) or bool(end)
         self.refresh_treeview()
         self.update_total()
     
@@ -822,15 +896,18 @@ class ExpenseTrackerApp:
         """مسح الفلتر"""
         self.search_entry.delete(0, tk.END)
         self.period_filter.set('الكل')
+        self.date_from_entry.delete(0, tk.END)
+        self.date_to_entry.delete(0, tk.END)
         self.filter_active = False
+        self.filter_criteria = ('', None, None)
+        self.last_query = None
         self.refresh_treeview()
         self.update_total()
     
     def update_total(self):
         """تحديث الإجمالي وعدد المصاريف"""
-        expenses_to_count = self.expenses if not self.filter_active else self.filtered_expenses
-        total = sum(exp.get('amount', 0) for exp in expenses_to_count)
-        count = len(expenses_to_count)
+        total, count = self.service.totals(self.current_user['username'],
+                                           self.filtered_expenses if self.filter_active else None)
         
         self.total_label.config(text=f"الإجمالي: {total:.2f} جنيه")
         self.count_label.config(text=f"عدد المصاريف: {count}")
@@ -843,45 +920,32 @@ class ExpenseTrackerApp:
         
         stats_win = tk.Toplevel(self.root)
         stats_win.title("إحصائيات المصاريف")
-        stats_win.geometry("600x500")
+        stats_win.geometry("650x600")
         stats_win.configure(bg='#16213e')
         stats_win.grab_set()
         
         tk.Label(stats_win, text="إحصائيات المصاريف", font=('Arial', 16, 'bold'),
                 bg='#16213e', fg='#e94560').pack(pady=15)
         
-        frame = tk.Frame(stats_win, bg='#16213e')
-        frame.pack(pady=10, padx=30, fill='both', expand=True)
+        notebook = ttk.Notebook(stats_win)
+        notebook.pack(pady=5, padx=20, fill='both', expand=True)
+        
+        frame = tk.Frame(notebook, bg='#16213e', padx=10, pady=10)
+        notebook.add(frame, text="الكل")
         
         # حساب الإحصائيات
-        total = sum(exp.get('amount', 0) for exp in self.expenses)
-        count = len(self.expenses)
-        avg = total / count if count > 0 else 0
-        
-        # أعلى وأقل مصروف
-        amounts = [exp.get('amount', 0) for exp in self.expenses]
-        max_expense = max(amounts) if amounts else 0
-        min_expense = min(amounts) if amounts else 0
-        
-        # حسب نوع المواصلة
-        by_type = {}
-        for exp in self.expenses:
-            t = exp.get('type', 'أخرى')
-            by_type[t] = by_type.get(t, 0) + exp.get('amount', 0)
-        
-        # حسب وسيلة الدفع
-        by_payment = {}
-        for exp in self.expenses:
-            p = exp.get('payment_method', 'نقدي')
-            by_payment[p] = by_payment.get(p, 0) + exp.get('amount', 0)
+        summary = self.service.statistics(self.current_user['username'])
+        total = summary['total']
+        by_type = summary['by_type']
+        by_payment = summary['by_payment']
         
         # عرض الإحصائيات
         stats = [
             ("إجمالي المصاريف:", f"{total:.2f} جنيه"),
-            ("عدد المصاريف:", str(count)),
-            ("متوسط المصروف:", f"{avg:.2f} جنيه"),
-            ("أعلى مصروف:", f"{max_expense:.2f} جنيه"),
-            ("أقل مصروف:", f"{min_expense:.2f} جنيه"),
+            ("عدد المصاريف:", str(summary['count'])),
+            ("متوسط المصروف:", f"{summary['average']:.2f} جنيه"),
+            ("أعلى مصروف:", f"{summary['max']:.2f} جنيه"),
+            ("أقل مصروف:", f"{summary['min']:.2f} جنيه"),
         ]
         
         row = 0
@@ -892,38 +956,137 @@ class ExpenseTrackerApp:
                     bg='#16213e', fg='#ffffff').grid(row=row, column=1, sticky='w', padx=10, pady=8)
             row += 1
         
-        # حسب نوع المواصلة
-        tk.Label(frame, text="حسب نوع المواصلة:", font=('Arial', 12, 'bold'),
-                bg='#16213e', fg='#e94560').grid(row=row, column=0, columnspan=2, pady=(20, 10))
-        row += 1
+        row = self.add_breakdown_rows(frame, row, "حسب نوع المواصلة:", by_type, total)
+        self.add_breakdown_rows(frame, row, "حسب وسيلة الدفع:", by_payment, total)
         
-        for t_type, t_amount in sorted(by_type.items(), key=lambda x: x[1], reverse=True):
-            percentage = (t_amount / total * 100) if total > 0 else 0
-            tk.Label(frame, text=f"{t_type}:", font=('Arial', 10),
-                    bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=5)
-            tk.Label(frame, text=f"{t_amount:.2f} جنيه ({percentage:.1f}%)", font=('Arial', 10),
-                    bg='#16213e', fg='#ffffff').grid(row=row, column=1, sticky='w', padx=10, pady=5)
-            row += 1
+        # الشهور والاتجاه من التجميع الشهري (بدون المرور على المصاريف)
+        rollup = self.service.rollup(self.current_user['username'])
+        self.add_month_tab(notebook, rollup)
+        self.add_trend_tab(notebook, rollup)
+        analytics = core.optional_module('analytics')
+        if analytics is not None:
+            self.add_analytics_tab(notebook, analytics)
         
-        # حسب وسيلة الدفع
-        tk.Label(frame, text="حسب وسيلة الدفع:", font=('Arial', 12, 'bold'),
+        tk.Button(stats_win, text="إغلاق", font=('Arial', 11),
+                 bg='#64748b', fg='#ffffff', padx=30, pady=10,
+                 relief='flat', command=stats_win.destroy).pack(pady=15)
+    
+    def add_breakdown_rows(self, frame, row, title, breakdown, total) -> int:
+        """عرض توزيع المبالغ (حسب النوع أو وسيلة الدفع) مع النسب، وإرجاع الصف التالي"""
+        tk.Label(frame, text=title, font=('Arial', 12, 'bold'),
                 bg='#16213e', fg='#e94560').grid(row=row, column=0, columnspan=2, pady=(20, 10))
         row += 1
         
-        for p_method, p_amount in sorted(by_payment.items(), key=lambda x: x[1], reverse=True):
-            percentage = (p_amount / total * 100) if total > 0 else 0
-            tk.Label(frame, text=f"{p_method}:", font=('Arial', 10),
+        for name, amount in sorted(breakdown.items(), key=lambda x: x[1], reverse=True):
+            percentage = (amount / total * 100) if total > 0 else 0
+            tk.Label(frame, text=f"{name}:", font=('Arial', 10),
                     bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=5)
-            tk.Label(frame, text=f"{p_amount:.2f} جنيه ({percentage:.1f}%)", font=('Arial', 10),
+            tk.Label(frame, text=f"{amount:.2f} جنيه ({percentage:.1f}%)", font=('Arial', 10),
                     bg='#16213e', fg='#ffffff').grid(row=row, column=1, sticky='w', padx=10, pady=5)
             row += 1
+        return row
+    
+    def add_month_tab(self, notebook, rollup):
+        """تبويب إحصائيات شهر مختار"""
+        tab = tk.Frame(notebook, bg='#16213e', padx=10, pady=10)
+        notebook.add(tab, text="حسب الشهر")
+        
+        selector = tk.Frame(tab, bg='#16213e')
+        selector.pack(fill='x', pady=(0, 10))
+        tk.Label(selector, text="الشهر:", font=('Arial', 11, 'bold'),
+                bg='#16213e', fg='#cbd5e1').pack(side='left', padx=5)
+        months = rollup.months()
+        month_cb = ttk.Combobox(selector, values=months, state='readonly', width=12)
+        month_cb.pack(side='left', padx=5)
+        
+        month_frame = tk.Frame(tab, bg='#16213e')
+        month_frame.pack(fill='both', expand=True)
+        
+        def show_month(event=None):
+            for widget in month_frame.winfo_children():
+                widget.destroy()
+            summary = rollup.summary(month_cb.get())
+            stats = [
+                ("إجمالي الشهر:", f"{summary['total']:.2f} جنيه"),
+                ("عدد المصاريف:", str(summary['count'])),
+                ("متوسط المصروف:", f"{summary['average']:.2f} جنيه"),
+            ]
+            row = 0
+            for label, value in stats:
+                tk.Label(month_frame, text=label, font=('Arial', 11, 'bold'),
+                        bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=8)
+                tk.Label(month_frame, text=value, font=('Arial', 11),
+                        bg='#16213e', fg='#ffffff').grid(row=row, column=1, sticky='w', padx=10, pady=8)
+                row += 1
+            row = self.add_breakdown_rows(month_frame, row, "حسب نوع المواصلة:",
+                                          summary['by_type'], summary['total'])
+            self.add_breakdown_rows(month_frame, row, "حسب وسيلة الدفع:",
+                                    summary['by_payment'], summary['total'])
+        
+        month_cb.bind('<<ComboboxSelected>>', show_month)
+        if months:
+            month_cb.set(months[0])
+            show_month()
+    
+    def add_trend_tab(self, notebook, rollup, months_shown=12):
+        """تبويب إجمالي كل شهر (آخر 12 شهر) مع شريط نسبي"""
+        tab = tk.Frame(notebook, bg='#16213e', padx=10, pady=10)
+        notebook.add(tab, text="الاتجاه الشهري")
+        
+        trend = rollup.trend()[-months_shown:]
+        peak = max((amount for _, amount, _ in trend), default=0)
+        for row, (month, amount, count) in enumerate(trend):
+            bar = '█' * int(round(25 * amount / peak)) if peak > 0 else ''
+            tk.Label(tab, text=month, font=('Arial', 10, 'bold'),
+                    bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=4)
+            tk.Label(tab, text=bar, font=('Arial', 10),
+                    bg='#16213e', fg='#e94560').grid(row=row, column=1, sticky='w', padx=5, pady=4)
+            tk.Label(tab, text=f"{amount:.2f} جنيه ({count})", font=('Arial', 10),
+                    bg='#16213e', fg='#ffffff').grid(row=row, column=2, sticky='w', padx=10, pady=4)
+    
+    def add_analytics_tab(self, notebook, analytics):
+        """تبويب التحليلات: الوسيط والمئينات والإنفاق المتحرك وأيام الأسبوع والمسارات"""
+        tab = tk.Frame(notebook, bg='#16213e', padx=10, pady=10)
+        notebook.add(tab, text="تحليلات")
+        
+        result = analytics.for_user(self.store, self.current_user['username'])
+        summary = result.summary()
+        percentiles = summary['percentiles']
+        stats = [
+            ("الوسيط:", f"{summary['median']:.2f} جنيه"),
+            ("المئين 25 / 75 / 90:", f"{percentiles[0.25]:.2f} / {percentiles[0.75]:.2f} / {percentiles[0.9]:.2f} جنيه"),
+            ("إنفاق آخر 7 أيام:", f"{result.recent_spend(7):.2f} جنيه"),
+            ("إنفاق آخر 30 يوم:", f"{result.recent_spend(30):.2f} جنيه"),
+        ]
+        row = 0
+        for label, value in stats:
+            tk.Label(tab, text=label, font=('Arial', 11, 'bold'),
+                    bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=6)
+            tk.Label(tab, text=value, font=('Arial', 11),
+                    bg='#16213e', fg='#ffffff').grid(row=row, column=1, sticky='w', padx=10, pady=6)
+            row += 1
         
-        tk.Button(stats_win, text="إغلاق", font=('Arial', 11),
-                 bg='#64748b', fg='#ffffff', padx=30, pady=10,
-                 relief='flat', command=stats_win.destroy).pack(pady=15)
+        sections = [
+            ("حسب يوم الأسبوع:", result.by_weekday()),
+            ("أكثر المسارات إنفاقاً:", result.by_route(top=5)),
+        ]
+        for title, table in sections:
+            tk.Label(tab, text=title, font=('Arial', 12, 'bold'),
+                    bg='#16213e', fg='#e94560').grid(row=row, column=0, columnspan=2, pady=(15, 8))
+            row += 1
+            for name, values in table.iterrows():
+                tk.Label(tab, text=f"{name}:", font=('Arial', 10),
+                        bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=3)
+                tk.Label(tab, text=f"{values['sum']:.2f} جنيه ({int(values['count'])})", font=('Arial', 10),
+                        bg='#16213e', fg='#ffffff').grid(row=row, column=1, sticky='w', padx=10, pady=3)
+                row += 1
     
     def create_excel_report(self):
         """إنشاء تقرير Excel"""
+        if self.report_worker is not None:
+            messagebox.showwarning("تنبيه", "جاري إنشاء تقرير بالفعل، انتظر حتى ينتهي أو قم بإلغائه")
+            return
+        
         if not self.expenses:
             messagebox.showerror("خطأ", "لا توجد مصاريف لإنشاء التقرير!")
             return
@@ -937,145 +1100,74 @@ class ExpenseTrackerApp:
         if not filename:
             return
         
-        try:
-            self.generate_excel(filename)
-            if messagebox.askyesno("نجح", f"تم إنشاء التقرير بنجاح!\nهل تريد فتح الملف؟"):
-                webbrowser.open(f'file://{os.path.abspath(filename)}')
-        except Exception as e:
-            messagebox.showerror("خطأ", f"حدث خطأ أثناء إنشاء التقرير:\n{str(e)}")
+        self.generate_excel(filename)
     
     def generate_excel(self, filename):
-        """إنشاء ملف Excel"""
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "تقرير المصاريف"
-        
-        # تنسيق الأعمدة
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 25
-        ws.column_dimensions['C'].width = 25
-        ws.column_dimensions['D'].width = 15
-        ws.column_dimensions['E'].width = 18
-        ws.column_dimensions['F'].width = 12
-        ws.column_dimensions['G'].width = 30
-        ws.column_dimensions['H'].width = 20
-        
-        thin_border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        """إنشاء ملف Excel في خيط منفصل مع نافذة تقدم وزر إلغاء"""
+        # نسخ البيانات هنا حتى لا تؤثر الإضافة والحذف أثناء الكتابة على التقرير
+        user, expenses, rollup = self.service.report_snapshot(self.current_user['username'])
+        state = {'rows': 0, 'images': 0, 'status': 'running', 'error': None}
+        cancel = threading.Event()
         
-        # العنوان
-        ws.merge_cells('A1:H1')
-        header_cell = ws['A1']
-        header_cell.value = "تقرير مصاريف المواصلات والانتقالات"
-        header_cell.font = Font(size=16, bold=True, color="FFFFFF")
-        header_cell.fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-        header_cell.alignment = Alignment(horizontal='center', vertical='center')
-        ws.row_dimensions[1].height = 30
-        
-        # معلومات المستخدم
-        row = 3
-        info_style = Font(size=11, bold=True)
-        info_data = [
-            ("اسم الموظف:", self.current_user['name']),
-            ("رقم الموظف:", self.current_user['employee_id']),
-            ("اسم الشركة:", self.current_user.get('company_name', 'غير محدد')),
-            ("القسم:", self.current_user.get('department', '')),
-            ("وسيلة الدفع الافتراضية:", self.current_user.get('payment_method', 'نقدي')),
-            ("تاريخ التقرير:", datetime.now().strftime("%Y-%m-%d %H:%M"))
-        ]
+        def progress(rows, images):
+            state['rows'] = rows
+            state['images'] = images
         
-        for label, value in info_data:
-            ws[f'A{row}'] = label
-            ws[f'B{row}'] = value
-            ws[f'A{row}'].font = info_style
-            row += 1
+        def work():
+            try:
+                core.export_report(filename, user, expenses, rollup, progress=progress, cancel=cancel)
+                state['status'] = 'done'
+            except core.ReportCancelled:
+                state['status'] = 'cancelled'
+            except Exception as e:
+                state['error'] = e
+                state['status'] = 'error'
         
-        # رأس الجدول
-        row += 1
-        headers = ['التاريخ', 'من', 'إلى', 'نوع المواصلة', 'وسيلة الدفع', 'المبلغ (جنيه)', 'ملاحظات', 'الإيصال']
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(size=11, bold=True, color="FFFFFF")
-        
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=row, column=col)
-            cell.value = header
-            cell.font = header_font
-            cell.fill = header_fill
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
-        
-        ws.row_dimensions[row].height = 25
-        data_start_row = row + 1
-        current_row = data_start_row
-        
-        # بيانات المصاريف
-        for expense in self.expenses:
-            ws[f'A{current_row}'] = expense.get('date', '')
-            ws[f'B{current_row}'] = expense.get('from', '')
-            ws[f'C{current_row}'] = expense.get('to', '')
-            ws[f'D{current_row}'] = expense.get('type', '')
-            ws[f'E{current_row}'] = expense.get('payment_method', '')
-            ws[f'F{current_row}'] = expense.get('amount', 0)
-            ws[f'G{current_row}'] = expense.get('notes', '')
-            
-            for col in range(1, 8):
-                cell = ws.cell(row=current_row, column=col)
-                cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-                cell.border = thin_border
-                
-                if (current_row - data_start_row) % 2 == 0:
-                    cell.fill = PatternFill(start_color="E7E6E6", end_color="E7E6E6", fill_type="solid")
+        win = tk.Toplevel(self.root)
+        win.title("إنشاء التقرير")
+        win.geometry("400x180")
+        win.configure(bg='#16213e')
+        win.resizable(False, False)
+        
+        status_label = tk.Label(win, text="جاري تجهيز الإيصالات...", font=('Arial', 11),
+                               bg='#16213e', fg='#ffffff')
+        status_label.pack(pady=(20, 10))
+        bar = ttk.Progressbar(win, length=340, mode='determinate', maximum=max(1, len(expenses)))
+        bar.pack(pady=5)
+        
+        def request_cancel():
+            cancel.set()
+            cancel_btn.config(state='disabled')
+            status_label.config(text="جاري الإلغاء...")
+        
+        cancel_btn = tk.Button(win, text="إلغاء", font=('Arial', 11, 'bold'),
+                              bg='#ef4444', fg='white', width=12, cursor='hand2',
+                              relief='flat', command=request_cancel)
+        cancel_btn.pack(pady=15)
+        win.protocol("WM_DELETE_WINDOW", request_cancel)
+        
+        def poll():
+            if state['status'] == 'running':
+                bar['value'] = state['rows']
+                if state['rows'] and not cancel.is_set():
+                    status_label.config(text=f"تمت كتابة {state['rows']} من {len(expenses)} مصروف "
+                                             f"({state['images']} إيصال)")
+                self.root.after(REPORT_POLL_MS, poll)
+                return
             
-            # إضافة الإيصال
-            receipt_path = expense.get('receipt')
-            if receipt_path and os.path.exists(receipt_path):
-                try:
-                    img = Image(receipt_path)
-                    max_dim = 150
-                    if img.width > max_dim or img.height > max_dim:
-                        ratio = min(max_dim / img.width, max_dim / img.height)
-                        img.width = int(img.width * ratio)
-                        img.height = int(img.height * ratio)
-                    ws.add_image(img, f'H{current_row}')
-                    ws.row_dimensions[current_row].height = max(115, int(img.height * 0.75) + 10)
-                    ws[f'H{current_row}'] = "مرفق"
-                except:
-                    ws[f'H{current_row}'] = "خطأ في الصورة"
+            self.report_worker = None
+            win.destroy()
+            if state['status'] == 'done':
+                if messagebox.askyesno("نجح", f"تم إنشاء التقرير بنجاح!\nهل تريد فتح الملف؟"):
+                    webbrowser.open(f'file://{os.path.abspath(filename)}')
+            elif state['status'] == 'cancelled':
+                messagebox.showinfo("معلومة", "تم إلغاء إنشاء التقرير")
             else:
-                ws[f'H{current_row}'] = "لا يوجد"
-            
-            ws[f'H{current_row}'].alignment = Alignment(horizontal='center', vertical='center')
-            ws[f'H{current_row}'].border = thin_border
-            current_row += 1
-        
-        # الإجمالي
-        total_row = current_row + 1
-        ws.merge_cells(f'A{total_row}:E{total_row}')
-        total_label = ws[f'A{total_row}']
-        total_label.value = "الإجمالي الكلي"
-        total_label.font = Font(size=12, bold=True)
-        total_label.fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
-        total_label.alignment = Alignment(horizontal='center', vertical='center')
-        total_label.border = thin_border
-        
-        total_amount = sum(exp.get('amount', 0) for exp in self.expenses)
-        total_cell = ws[f'F{total_row}']
-        total_cell.value = total_amount
-        total_cell.font = Font(size=12, bold=True)
-        total_cell.fill = PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid")
-        total_cell.alignment = Alignment(horizontal='center', vertical='center')
-        total_cell.border = thin_border
-        
-        # التوقيعات
-        signature_row = total_row + 3
-        ws[f'A{signature_row}'] = "توقيع الموظف: _____________"
-        ws[f'E{signature_row}'] = "توقيع المدير: _____________"
-        
-        wb.save(filename)
+                messagebox.showerror("خطأ", f"حدث خطأ أثناء إنشاء التقرير:\n{str(state['error'])}")
+        
+        self.report_worker = threading.Thread(target=work, name="excel-report", daemon=True)
+        self.report_worker.start()
+        self.root.after(REPORT_POLL_MS, poll)
     
     def on_tree_double_click(self, event):
         """فتح الإيصال عند النقر المزدوج"""
@@ -1083,11 +1175,12 @@ class ExpenseTrackerApp:
         if not item:
             return
         
-        index = self.tree.index(item)
-        if index < 0 or index >= len(self.expenses):
+        # معرف السطر في الجدول هو معرف المصروف
+        expense = self.store.get_expense(self.current_user['username'], item)
+        if expense is None:
             return
         
-        receipt = self.expenses[index].get('receipt')
+        receipt = self.receipts.resolve(expense.get('receipt'))
         if receipt and os.path.exists(receipt):
             try:
                 webbrowser.open(f'file://{os.path.abspath(receipt)}')
@@ -1160,40 +1253,30 @@ class ExpenseTrackerApp:
         tk.Label(frame, text="وسيلة الدفع الافتراضية:", font=('Arial', 10),
                 bg='#16213e', fg='#cbd5e1').grid(row=row, column=0, sticky='e', padx=10, pady=8)
         pay_cb = ttk.Combobox(frame, font=('Arial', 10), width=32,
-                             values=['نقدي', 'فيزا', 'محفظة إلكترونية', 'إنستاباي', 'أخرى'],
+                             values=core.PAYMENT_METHODS,
                              state='readonly')
         pay_cb.grid(row=row, column=1, padx=10, pady=8)
         pay_cb.set(self.current_user.get('payment_method', 'نقدي'))
         
         def save_profile():
-            # التحقق من كلمة المرور
-            if pass_e.get().strip():
-                if len(pass_e.get().strip()) < 6:
-                    messagebox.showerror("خطأ", "كلمة المرور يجب أن تكون 6 أحرف على الأقل!")
-                    return
-                if pass_e.get() != pass_conf_e.get():
-                    messagebox.showerror("خطأ", "كلمة المرور الجديدة غير متطابقة!")
-                    return
-            
-            # التحقق من البريد الإلكتروني
-            email = entries['email'].get().strip()
-            if email and not self.validate_email(email):
-                messagebox.showerror("خطأ", "البريد الإلكتروني غير صحيح!")
+            # التحقق من التطابق هنا، والطول والبريد في الخدمة
+            if pass_e.get().strip() and pass_e.get() != pass_conf_e.get():
+                messagebox.showerror("خطأ", "كلمة المرور الجديدة غير متطابقة!")
                 return
             
             # تحديث البيانات
             uname = self.current_user['username']
-            self.users_data[uname]['name'] = entries['name'].get().strip()
-            self.users_data[uname]['employee_id'] = entries['employee_id'].get().strip()
-            self.users_data[uname]['company_name'] = entries['company_name'].get().strip()
-            self.users_data[uname]['department'] = entries['department'].get().strip()
-            self.users_data[uname]['email'] = email
-            self.users_data[uname]['payment_method'] = pay_cb.get()
-            
-            if pass_e.get().strip():
-                self.users_data[uname]['password'] = self.hash_password(pass_e.get().strip())
+            fields = {
+                'name': entries['name'].get().strip(),
+                'employee_id': entries['employee_id'].get().strip(),
+                'company_name': entries['company_name'].get().strip(),
+                'department': entries['department'].get().strip(),
+                'email': entries['email'].get().strip(),
+                'payment_method': pay_cb.get()
+            }
             
-            self.save_users()
+            if not self.persist(self.service.update_profile, uname, fields, pass_e.get().strip()):
+                return
             self.current_user = self.users_data[uname].copy()
             self.current_user['username'] = uname
             
@@ -1218,8 +1301,8 @@ class ExpenseTrackerApp:
         if messagebox.askyesno("تأكيد", "هل تريد تسجيل الخروج؟"):
             if self.current_user:
                 self.save_user_expenses()
+            self.flush_saves()
             self.current_user = None
-            self.expenses = []
             self.show_login_screen()
     
     def on_closing(self):
@@ -1227,17 +1310,52 @@ class ExpenseTrackerApp:
         if self.current_user:
             if messagebox.askyesno("تأكيد", "هل تريد حفظ التغييرات والخروج؟"):
                 self.save_user_expenses()
-                self.root.destroy()
-            else:
-                self.root.destroy()
-        else:
+        if self.save_users():
             self.root.destroy()
     
     def run(self):
         """تشغيل التطبيق"""
         self.root.mainloop()
+    
+    def report_startup(self, budget_file: str = STARTUP_BUDGET_FILE) -> int:
+        """طباعة أزمنة التشغيل ومقارنتها بالحدود؛ يعيد 1 إذا تجاوز أي زمن حده"""
+        try:
+            with open(budget_file, 'r', encoding='utf-8') as f:
+                budget = json.load(f)
+        except (OSError, ValueError):
+            budget = {}
+        
+        timings = dict(self.timings, total=sum(self.timings.values()))
+        over = False
+        for name, seconds in timings.items():
+            ms = seconds * 1000
+            limit = budget.get(f"{name}_ms")
+            if limit is None:
+                print(f"{name:12} {ms:8.1f} ms")
+                continue
+            status = "✓" if ms <= limit else "✗ تجاوز الحد"
+            over = over or ms > limit
+            print(f"{name:12} {ms:8.1f} ms  (الحد {limit} ms) {status}")
+        return 1 if over else 0
 
 
-if __name__ == "__main__":
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="نظام إدارة مصاريف المواصلات")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="قياس زمن الاستيراد وظهور شاشة الدخول وتحميل البيانات ثم الخروج")
+    parser.add_argument('--budget', default=STARTUP_BUDGET_FILE, help="ملف حدود زمن التشغيل")
+    args = parser.parse_args(argv)
+    
     app = ExpenseTrackerApp()
-    app.run()
\ No newline at end of file
+    if not args.startup_time:
+        app.run()
+        return 0
+    
+    status = app.report_startup(args.budget)
+    app.store.close()
+    app.root.destroy()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -0,0 +1,91 @@
+"""استعلامات المصاريف في الذاكرة: الفلترة والإجماليات والإحصائيات"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+PERIODS = ['الكل', 'اليوم', 'هذا الأسبوع', 'هذا الشهر', 'آخر 30 يوم']
+
+
+def period_range(period: str, today: Optional[datetime] = None) -> Tuple[Optional[str], Optional[str]]:
+    """تحويل اسم الفترة إلى حدود تاريخ (YYYY-MM-DD) شاملة، None تعني بلا حد"""
+    today = (today or datetime.now()).date()
+    if period == 'اليوم':
+        return today.isoformat(), today.isoformat()
+    if period == 'هذا الأسبوع':
+        return (today - timedelta(days=today.weekday())).isoformat(), None
+    if period == 'هذا الشهر':
+        next_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+        return today.replace(day=1).isoformat(), (next_month - timedelta(days=1)).isoformat()
+    if period == 'آخر 30 يوم':
+        return (today - timedelta(days=30)).isoformat(), None
+    return None, None
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(text: str) -> Optional[int]:
+    """رقم اليوم لتاريخ YYYY-MM-DD (يقبل بدون أصفار مثل 2025-1-5)، أو None إذا لم يكن صحيحاً"""
+    try:
+        return datetime.strptime(text, "%Y-%m-%d").toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def merge_ranges(*ranges) -> Tuple[Optional[str], Optional[str]]:
+    """تقاطع عدة مدى تاريخ (كل حد None يعني بلا حد)، والنتيجة بالشكل YYYY-MM-DD"""
+    starts = [date_ordinal(start) for start, _ in ranges if start]
+    ends = [date_ordinal(end) for _, end in ranges if end]
+    start = datetime.fromordinal(max(starts)).date().isoformat() if starts else None
+    end = datetime.fromordinal(min(ends)).date().isoformat() if ends else None
+    return start, end
+
+
+def searchable_text(expense: Dict) -> str:
+    """النص الذي يبحث فيه مربع البحث"""
+    return f"{expense.get('from', '')} {expense.get('to', '')} {expense.get('type', '')} {expense.get('notes', '')}".lower()
+
+
+def filter_expenses(expenses: List[Dict], search_text: str = '',
+                    start: Optional[str] = None, end: Optional[str] = None) -> List[Dict]:
+    """فلترة المصاريف حسب نص البحث وحدود التاريخ"""
+    search_text = search_text.lower()
+    low = date_ordinal(start) if start else None
+    high = date_ordinal(end) if end else None
+    result = []
+    for exp in expenses:
+        if search_text and search_text not in searchable_text(exp):
+            continue
+        if start or end:
+            day = date_ordinal(exp.get('date', ''))
+            if day is None or (low is not None and day < low) or (high is not None and day > high):
+                continue
+        result.append(exp)
+    return result
+
+
+def summarize(expenses: List[Dict]) -> Tuple[float, int]:
+    """الإجمالي وعدد المصاريف"""
+    return sum(exp.get('amount', 0) for exp in expenses), len(expenses)
+
+
+def statistics(expenses: List[Dict]) -> Dict:
+    """الإجمالي والمتوسط والأعلى والأقل والتوزيع حسب النوع ووسيلة الدفع"""
+    total, count = summarize(expenses)
+    amounts = [exp.get('amount', 0) for exp in expenses]
+
+    by_type = {}
+    by_payment = {}
+    for exp in expenses:
+        t = exp.get('type', 'أخرى')
+        p = exp.get('payment_method', 'نقدي')
+        by_type[t] = by_type.get(t, 0) + exp.get('amount', 0)
+        by_payment[p] = by_payment.get(p, 0) + exp.get('amount', 0)
+
+    return {
+        'total': total,
+        'count': count,
+        'average': total / count if count > 0 else 0,
+        'max': max(amounts) if amounts else 0,
+        'min': min(amounts) if amounts else 0,
+        'by_type': by_type,
+        'by_payment': by_payment,
+    }
@@ -0,0 +1,126 @@
+"""مخزن الإيصالات: نسخة من كل إيصال مسماة ببصمة SHA-256 لمحتواها
+
+المصروف يحفظ مرجع الإيصال (البصمة + الامتداد) بدلاً من مسار الملف الأصلي، فنقل
+الملف الأصلي أو حذفه لا يفقد الإيصال، ونفس الإيصال المرفق مرتين يخزن مرة واحدة.
+المصاريف القديمة التي تحمل مساراً كاملاً ما زالت تعمل (resolve يعيد المسار كما هو).
+
+    python receipt_store.py --gc --mode sqlite    حذف الإيصالات التي لم يعد أي مصروف يشير إليها
+"""
+import argparse
+import hashlib
+import os
+import re
+import sys
+import tempfile
+import time
+from typing import Iterable, List, Optional
+
+import storage
+
+# مجلد الإيصالات بجانب ملف البيانات
+RECEIPTS_DIR = 'receipts'
+CHUNK_SIZE = 1024 * 1024
+# لا تحذف عملية التنظيف الإيصالات الأحدث من هذا (نسخت ولم يحفظ مصروفها بعد)
+GC_GRACE_SECONDS = 3600
+
+REFERENCE = re.compile(r'^[0-9a-f]{64}(\.[A-Za-z0-9]+)?$')
+
+
+def is_reference(receipt: Optional[str]) -> bool:
+    """هل القيمة مرجع في المخزن (وليست مساراً قديماً)"""
+    return bool(receipt) and REFERENCE.match(receipt) is not None
+
+
+class ReceiptStore:
+    """ملفات الإيصالات في مجلدات فرعية بأول حرفين من البصمة"""
+
+    def __init__(self, directory: str = RECEIPTS_DIR):
+        self.directory = directory
+
+    def path(self, reference: str) -> str:
+        return os.path.join(self.directory, reference[:2], reference)
+
+    def resolve(self, receipt: Optional[str]) -> Optional[str]:
+        """مسار ملف الإيصال لمرجع في المخزن أو لمسار قديم"""
+        if not receipt:
+            return None
+        return self.path(receipt) if is_reference(receipt) else receipt
+
+    def put(self, source: str) -> str:
+        """نسخ ملف إلى المخزن وإرجاع مرجعه
+
+        البصمة تحسب أثناء النسخ على أجزاء (قراءة واحدة للملف مهما كان حجمه)؛ إذا
+        كان المحتوى موجوداً من قبل تحذف النسخة الجديدة ويحدث وقت تعديل الموجود، فلا
+        يحذفه التنظيف (المعتمد على وقت التعديل) قبل أن يحفظ المصروف الجديد مرجعه.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with open(source, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+                for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    dst.write(chunk)
+            reference = digest.hexdigest() + os.path.splitext(source)[1].lower()
+            target = self.path(reference)
+            if os.path.exists(target):
+                os.remove(temp)
+                os.utime(target)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(temp, target)
+            return reference
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def collect_garbage(self, referenced: Iterable[str], grace: float = GC_GRACE_SECONDS) -> int:
+        """حذف ملفات المخزن التي لا يشير إليها أي مصروف؛ يعيد عدد الملفات المحذوفة"""
+        keep = {receipt for receipt in referenced if is_reference(receipt)}
+        cutoff = time.time() - grace
+        removed = 0
+        if not os.path.isdir(self.directory):
+            return 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name in keep:
+                    continue
+                path = os.path.join(root, name)
+                if (is_reference(name) or name.endswith('.tmp')) and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+        return removed
+
+
+def referenced_receipts(store) -> List[Optional[str]]:
+    """إيصالات كل المصاريف في المخزن المعطى (بنفس نوع التخزين الذي يستخدمه التطبيق)"""
+    users = store.load()
+    return [expense.get('receipt') for username in users for expense in store.user_expenses(username)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="مخزن الإيصالات")
+    parser.add_argument('--gc', action='store_true', help="حذف الإيصالات غير المستخدمة")
+    parser.add_argument('--data', default='users_data.json', help="ملف البيانات")
+    parser.add_argument('--dir', default=RECEIPTS_DIR, help="مجلد الإيصالات")
+    # نوع تخزين خاطئ يقرأ ملفات قديمة فيحذف إيصالات ما زالت مستخدمة
+    parser.add_argument('--mode', default=storage.default_mode(), choices=storage.MODES,
+                        help="نوع التخزين الذي يستخدمه التطبيق")
+    args = parser.parse_args(argv)
+    if not args.gc:
+        parser.print_help()
+        return 0
+
+    store = storage.open_store(args.data, mode=args.mode)
+    try:
+        referenced = referenced_receipts(store)
+    finally:
+        store.close()
+    removed = ReceiptStore(args.dir).collect_garbage(referenced)
+    print(f"تم حذف {removed} إيصال غير مستخدم")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
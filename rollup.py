@@ -0,0 +1,112 @@
+"""تجميع شهري محفوظ: (الشهر, النوع, وسيلة الدفع) -> المجموع والعدد لكل مستخدم
+
+يحدث مع كل إضافة وتعديل وحذف في O(1)، ويحفظ في ملف بجانب ملف البيانات مع بصمة
+نقطة الحفظ التي يطابقها؛ إذا لم تتطابق البصمة يعاد بناؤه من المصاريف.
+"""
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import queries
+
+# الشهر الفارغ للمصاريف ذات التاريخ غير الصحيح (تدخل في الإجمالي فقط)
+NO_MONTH = ''
+
+
+@lru_cache(maxsize=4096)
+def month_of(date_text: str) -> str:
+    """YYYY-MM لتاريخ المصروف"""
+    ordinal = queries.date_ordinal(date_text)
+    if ordinal is None:
+        return NO_MONTH
+    return date.fromordinal(ordinal).strftime('%Y-%m')
+
+
+class MonthlyRollup:
+    """خلايا التجميع الشهري لمستخدم واحد"""
+
+    def __init__(self, expenses: Iterable[Dict] = ()):
+        self.cells: Dict[Tuple[str, str, str], List] = {}
+        for expense in expenses:
+            self.add(expense)
+
+    @staticmethod
+    def key(expense: Dict) -> Tuple[str, str, str]:
+        return (month_of(expense.get('date', '')),
+                expense.get('type', 'أخرى'),
+                expense.get('payment_method', 'نقدي'))
+
+    def bump(self, expense: Dict, step: int):
+        key = self.key(expense)
+        cell = self.cells.setdefault(key, [0.0, 0])
+        cell[0] += expense.get('amount', 0) * step
+        cell[1] += step
+        if not cell[1]:
+            del self.cells[key]
+
+    def add(self, expense: Dict):
+        self.bump(expense, 1)
+
+    def remove(self, expense: Dict):
+        self.bump(expense, -1)
+
+    def apply(self, record: Dict, old: Optional[Dict] = None):
+        """تحديث التجميع بعملية تخزين قبل تطبيقها (old: المصروف الحالي في التعديل والحذف)"""
+        op = record['op']
+        if op == 'add':
+            self.add(record['expense'])
+        elif op == 'update':
+            self.remove(old)
+            self.add(record['expense'])
+        elif op == 'delete':
+            self.remove(old)
+
+    # ==================== القراءة ====================
+
+    def months(self) -> List[str]:
+        """الشهور التي بها مصاريف (الأحدث أولاً)"""
+        return sorted({month for month, _, _ in self.cells if month != NO_MONTH}, reverse=True)
+
+    def summary(self, month: Optional[str] = None) -> Dict:
+        """الإجمالي والعدد والتوزيع حسب النوع ووسيلة الدفع لشهر (أو لكل الشهور)"""
+        total, count = 0.0, 0
+        by_type: Dict[str, float] = {}
+        by_payment: Dict[str, float] = {}
+        for (cell_month, expense_type, payment), (amount, cell_count) in self.cells.items():
+            if month is not None and cell_month != month:
+                continue
+            total += amount
+            count += cell_count
+            by_type[expense_type] = by_type.get(expense_type, 0) + amount
+            by_payment[payment] = by_payment.get(payment, 0) + amount
+        return {
+            'total': total,
+            'count': count,
+            'average': total / count if count > 0 else 0,
+            'by_type': by_type,
+            'by_payment': by_payment,
+        }
+
+    def trend(self) -> List[Tuple[str, float, int]]:
+        """(الشهر, الإجمالي, العدد) لكل شهر بالترتيب الزمني"""
+        months: Dict[str, List] = {}
+        for (month, _, _), (amount, count) in self.cells.items():
+            if month == NO_MONTH:
+                continue
+            entry = months.setdefault(month, [0.0, 0])
+            entry[0] += amount
+            entry[1] += count
+        return [(month, amount, count) for month, (amount, count) in sorted(months.items())]
+
+    # ==================== الحفظ ====================
+
+    def to_json(self) -> List:
+        return [[month, expense_type, payment, amount, count]
+                for (month, expense_type, payment), (amount, count) in self.cells.items()]
+
+    @classmethod
+    def from_json(cls, rows: List) -> 'MonthlyRollup':
+        rollup = cls()
+        for month, expense_type, payment, amount, count in rows:
+            rollup.cells[(month, expense_type, payment)] = [amount, count]
+        return rollup
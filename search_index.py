@@ -0,0 +1,120 @@
+"""فهرس بحث في الذاكرة لمصاريف المستخدم: كلمات + مقاطع ثلاثية للبحث داخل الكلمات
+
+النص الذي يبحث فيه هو queries.searchable_text (من/إلى/النوع/الملاحظات).
+- كل كلمة (مفصولة بمسافة) تشير إلى المصاريف التي تحتويها.
+- كل مقطع من 3 أحرف يشير إلى الكلمات التي تحتويه.
+بحث بدون مسافات يقع داخل كلمة واحدة، فيكفي إيجاد الكلمات المطابقة عبر المقاطع ثم
+جمع مصاريفها. البحث بمسافات يقاطع نتائج أجزائه ثم يتحقق من النص الكامل للمرشحين فقط.
+"""
+from typing import Dict, Iterable, List, Optional, Set
+
+import queries
+
+GRAM = 3
+
+
+def grams(token: str) -> Set[str]:
+    return {token[i:i + GRAM] for i in range(len(token) - GRAM + 1)}
+
+
+class SearchIndex:
+    """فهرس مقلوب لمصاريف مستخدم واحد، يحدث مع كل إضافة وتعديل وحذف"""
+
+    def __init__(self, expenses: Iterable[Dict] = ()):
+        self.records: Dict[int, Dict] = {}
+        self.order: Dict[int, int] = {}
+        self.texts: Dict[int, str] = {}
+        self.tokens: Dict[str, Set[int]] = {}
+        self.token_grams: Dict[str, Set[str]] = {}
+        self.next_order = 0
+        for expense in expenses:
+            self.add(expense)
+
+    # ==================== التحديث ====================
+
+    def add(self, expense: Dict, position: int = None):
+        key = id(expense)
+        text = queries.searchable_text(expense)
+        self.records[key] = expense
+        self.texts[key] = text
+        if position is None:
+            position = self.next_order
+            self.next_order += 1
+        self.order[key] = position
+        for token in set(text.split()):
+            if token not in self.tokens:
+                self.tokens[token] = set()
+                for gram in grams(token):
+                    self.token_grams.setdefault(gram, set()).add(token)
+            self.tokens[token].add(key)
+
+    def remove(self, expense: Dict) -> int:
+        """حذف مصروف وإرجاع ترتيبه (لإعادة استخدامه عند التعديل)"""
+        key = id(expense)
+        for token in set(self.texts.pop(key).split()):
+            keys = self.tokens[token]
+            keys.discard(key)
+            if not keys:
+                del self.tokens[token]
+                for gram in grams(token):
+                    self.token_grams[gram].discard(token)
+                    if not self.token_grams[gram]:
+                        del self.token_grams[gram]
+        del self.records[key]
+        return self.order.pop(key)
+
+    def replace(self, old: Dict, new: Dict):
+        self.add(new, self.remove(old))
+
+    def apply(self, record: Dict, old: Optional[Dict] = None):
+        """تحديث الفهرس بعملية تخزين قبل تطبيقها (old: المصروف الحالي في التعديل والحذف)"""
+        op = record['op']
+        if op == 'add':
+            self.add(record['expense'])
+        elif op == 'update':
+            self.replace(old, record['expense'])
+        elif op == 'delete':
+            self.remove(old)
+
+    # ==================== البحث ====================
+
+    def matching_tokens(self, part: str) -> Iterable[str]:
+        """الكلمات التي تحتوي الجزء المطلوب"""
+        if len(part) < GRAM:
+            return [token for token in self.tokens if part in token]
+        candidates = None
+        for gram in grams(part):
+            found = self.token_grams.get(gram)
+            if not found:
+                return []
+            candidates = set(found) if candidates is None else candidates & found
+        return [token for token in candidates if part in token]
+
+    def candidates(self, part: str) -> Set[int]:
+        keys: Set[int] = set()
+        for token in self.matching_tokens(part):
+            keys |= self.tokens[token]
+        return keys
+
+    def search(self, search_text: str) -> List[Dict]:
+        """المصاريف التي يحتوي نصها على نص البحث، بترتيب إضافتها للفهرس (ترتيب القائمة عند بنائه)"""
+        search_text = search_text.lower()
+        parts = search_text.split()
+        if not parts:
+            return [self.records[key] for key in sorted(self.records, key=self.order.get)]
+
+        keys = None
+        for part in sorted(parts, key=len, reverse=True):
+            found = self.candidates(part)
+            keys = found if keys is None else keys & found
+            if not keys:
+                return []
+        if len(parts) > 1 or parts[0] != search_text:
+            keys = {key for key in keys if search_text in self.texts[key]}
+        return [self.records[key] for key in sorted(keys, key=self.order.get)]
+
+    def refine(self, expenses: Iterable[Dict], search_text: str) -> List[Dict]:
+        """تضييق نتائج بحث سابق عندما يحتوي النص الجديد على النص السابق"""
+        search_text = search_text.lower()
+        texts = self.texts
+        return [expense for expense in expenses if search_text in texts[id(expense)]]
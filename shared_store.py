@@ -0,0 +1,113 @@
+"""مخزن واحد تتشاركه كل جلسات Streamlit في عملية الخادم
+
+البيانات تقرأ من القرص مرة واحدة بدلاً من نسخة كاملة لكل جلسة، والكتابة من أي جلسة
+تظهر للجلسات الأخرى فوراً. التغيير على القرص من عملية أخرى (تطبيق سطح المكتب مثلاً)
+يكتشف بوقت التعديل والحجم لملفات البيانات، ويعاد تحميل ملف المستخدم المتغير فقط
+عندما يكون لكل مستخدم ملف منفصل.
+"""
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import core
+import storage
+
+
+def file_signature(paths: List[str]) -> Tuple:
+    """(وقت التعديل, الحجم) لكل ملف، أو None إذا لم يكن موجوداً"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class SharedStore:
+    """واجهة آمنة بين الخيوط لطبقة التخزين؛ الجلسات تقرأ مصاريف مستخدمها فقط"""
+
+    def __init__(self, users_file: str, mode: Optional[str] = None):
+        self.store = storage.open_store(users_file, mode=mode)
+        self.service = core.ExpenseService(self.store)
+        self.lock = threading.RLock()
+        # None: ملفات كل البيانات، username: ملفات مصاريف المستخدم
+        self.signatures: Dict[Optional[str], Tuple] = {}
+        self.reload()
+
+    def reload(self):
+        with self.lock:
+            self.store.load()
+            self.signatures = {None: file_signature(self.store.watched_files())}
+
+    def remember(self, username: Optional[str] = None):
+        """تسجيل حالة الملفات بعد كتابتنا حتى لا تعتبر تغييراً خارجياً"""
+        self.signatures[None] = file_signature(self.store.watched_files())
+        if username is not None:
+            self.signatures[username] = file_signature(self.store.watched_files(username))
+
+    def refresh(self, username: Optional[str] = None):
+        """إعادة تحميل ما تغير على القرص منذ آخر قراءة (كل البيانات أو ملف المستخدم فقط)"""
+        with self.lock:
+            if file_signature(self.store.watched_files()) != self.signatures[None]:
+                self.reload()
+            if username is None:
+                return
+            paths = self.store.watched_files(username)
+            if not paths:
+                return
+            signature = file_signature(paths)
+            if username not in self.signatures:
+                self.signatures[username] = signature
+            elif signature != self.signatures[username]:
+                self.store.reload_user(username)
+                self.signatures[username] = signature
+
+    # ==================== القراءة ====================
+
+    def user_expenses(self, username: str) -> List[Dict]:
+        """نسخة من قائمة مصاريف المستخدم (المصاريف نفسها للقراءة فقط)"""
+        with self.lock:
+            return list(self.store.user_expenses(username))
+
+    def data_version(self, username: str) -> Tuple:
+        """تتغير مع كل كتابة أو إعادة تحميل لبيانات المستخدم (مفتاح للذاكرة المؤقتة)"""
+        with self.lock:
+            return self.store.data_version(username)
+
+    # ==================== الكتابة ====================
+    # التحقق وشكل البيانات من core؛ core.ValidationError تعرض رسالتها للمستخدم
+
+    def authenticate(self, username: str, password: str) -> Dict:
+        """بيانات المستخدم إذا تطابقت كلمة المرور (قد تشفر كلمة مرور قديمة غير مشفرة)"""
+        with self.lock:
+            self.refresh()
+            user = self.service.authenticate(username, password)
+            self.remember()
+            return user
+
+    def add_user(self, username: str, password: str):
+        with self.lock:
+            self.refresh()
+            self.service.register(username, password)
+            self.remember()
+
+    def add_expense(self, username: str, fields: Dict) -> str:
+        """fields بحقول نموذج core.build_expense؛ من/إلى غير مطلوبين في اللوحة"""
+        with self.lock:
+            self.refresh(username)
+            expense_id = self.service.add_expense(username, fields, require_route=False)
+            self.remember(username)
+            return expense_id
+
+    def clear_expenses(self, username: str):
+        """حذف كل مصاريف المستخدم بحفظ واحد"""
+        with self.lock:
+            self.refresh(username)
+            # فهرس المعرفات يعطي معرفات للمصاريف القديمة قبل الحذف بها
+            self.store.id_index(username)
+            # من الآخر للأول حتى يكون كل حذف من نهاية القائمة
+            ids = [expense['id'] for expense in reversed(self.store.user_expenses(username))]
+            self.store.delete_expenses(username, ids)
+            self.remember(username)
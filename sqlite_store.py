@@ -0,0 +1,427 @@
+"""تخزين SQLite: جدول للمستخدمين وجدول مفهرس للمصاريف"""
+import os
+import sys
+import json
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import storage
+import queries
+from id_index import new_expense_id
+from rollup import MonthlyRollup
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password TEXT NOT NULL DEFAULT '',
+    profile TEXT NOT NULL DEFAULT '{}'
+);
+
+CREATE TABLE IF NOT EXISTS expenses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL REFERENCES users(username) ON DELETE CASCADE,
+    date TEXT NOT NULL DEFAULT '',
+    from_location TEXT,
+    to_location TEXT,
+    type TEXT,
+    payment_method TEXT,
+    amount REAL NOT NULL DEFAULT 0,
+    notes TEXT,
+    receipt TEXT,
+    added_at TEXT,
+    updated_at TEXT,
+    extra TEXT,
+    day INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_expenses_user_type ON expenses(username, type);
+CREATE INDEX IF NOT EXISTS idx_expenses_user_payment ON expenses(username, payment_method);
+"""
+
+# أعمدة جدول المصاريف مقابل مفاتيح قاموس المصروف
+EXPENSE_COLUMNS = [
+    ('date', 'date'),
+    ('from_location', 'from'),
+    ('to_location', 'to'),
+    ('type', 'type'),
+    ('payment_method', 'payment_method'),
+    ('amount', 'amount'),
+    ('notes', 'notes'),
+    ('receipt', 'receipt'),
+    ('added_at', 'added_at'),
+    ('updated_at', 'updated_at'),
+]
+EXPENSE_KEYS = {key for _, key in EXPENSE_COLUMNS}
+
+INSERT_EXPENSE = ("INSERT INTO expenses (username, date, from_location, to_location, type, payment_method, "
+                  "amount, notes, receipt, added_at, updated_at, extra, day) "
+                  "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+UPDATE_EXPENSE = ("UPDATE expenses SET date = ?, from_location = ?, to_location = ?, type = ?, payment_method = ?, "
+                  "amount = ?, notes = ?, receipt = ?, added_at = ?, updated_at = ?, extra = ?, day = ? WHERE id = ?")
+
+# نفس النص الذي يبحث فيه queries.searchable_text
+SEARCHABLE_SQL = ("lower(coalesce(from_location, '') || ' ' || coalesce(to_location, '') || ' ' || "
+                  "coalesce(type, '') || ' ' || coalesce(notes, ''))")
+
+
+def extra_json(expense: Dict) -> Optional[str]:
+    """المفاتيح التي ليس لها عمود كـ JSON"""
+    extra = {k: v for k, v in expense.items() if k not in EXPENSE_KEYS}
+    return json.dumps(extra, ensure_ascii=False) if extra else None
+
+
+def expense_to_row(expense: Dict) -> Tuple:
+    """تحويل قاموس المصروف إلى قيم الأعمدة (بترتيب INSERT_EXPENSE بعد username)
+
+    التاريخ يحفظ كما أدخل (قد يكون 2025-1-5 في البيانات القديمة)، وحدود التاريخ
+    تقارن برقم اليوم في عمود day مثل باقي أنواع التخزين.
+    """
+    values = [expense.get(key) for _, key in EXPENSE_COLUMNS]
+    values[0] = values[0] or ''
+    values[5] = float(values[5] or 0)
+    values.append(extra_json(expense))
+    values.append(queries.date_ordinal(values[0]))
+    return tuple(values)
+
+
+def row_to_expense(row: sqlite3.Row) -> Dict:
+    """تحويل سطر من جدول المصاريف إلى قاموس بنفس شكل ملف JSON"""
+    expense = {}
+    for column, key in EXPENSE_COLUMNS:
+        if row[column] is not None or key == 'receipt':
+            expense[key] = row[column]
+    if row['extra']:
+        expense.update(json.loads(row['extra']))
+    return expense
+
+
+def split_user(record: Dict) -> Tuple[str, str]:
+    """فصل كلمة المرور عن بقية بيانات البروفايل"""
+    profile = {k: v for k, v in record.items() if k not in ('password', 'expenses', 'username')}
+    return record.get('password', ''), json.dumps(profile, ensure_ascii=False)
+
+
+class SqliteStore(storage.JsonStore):
+    """تخزين في قاعدة SQLite: كل عملية تعديل سطر واحد، والاستعلامات تستخدم الفهارس"""
+
+    def __init__(self, users_file: str, backup_file: Optional[str] = None, db_file: Optional[str] = None):
+        super().__init__(users_file, backup_file)
+        self.db_file = db_file or f"{os.path.splitext(users_file)[0]}.db"
+        self.conn = None
+        # أرقام أسطر المصاريف المحملة لكل مستخدم بنفس ترتيب القائمة في الذاكرة
+        self.expense_ids: Dict[str, List[int]] = {}
+        self.expense_by_id: Dict[str, Dict[int, Dict]] = {}
+        # PRAGMA data_version عند آخر تحميل (يتغير مع كتابة أي اتصال آخر للقاعدة)
+        self.seen_version = None
+
+    def connect(self) -> sqlite3.Connection:
+        if self.conn is None:
+            # لوحة Streamlit تستخدم نفس المخزن من خيوط مختلفة (كل إعادة تشغيل في خيط)؛
+            # كل عملية تمسك self.lock فلا يستخدم خيطان الاتصال وأرقام الأسطر في نفس الوقت
+            self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+            self.conn.row_factory = sqlite3.Row
+            self.conn.execute("PRAGMA foreign_keys = ON")
+            self.conn.execute("PRAGMA journal_mode = WAL")
+            self.conn.executescript(SCHEMA)
+            self.migrate_day_column()
+        return self.conn
+
+    def migrate_day_column(self):
+        """قواعد أقدم بدون عمود day: إضافته وحسابه من التاريخ مرة واحدة"""
+        conn = self.conn
+        columns = {row['name'] for row in conn.execute("PRAGMA table_info(expenses)")}
+        with conn:
+            if 'day' not in columns:
+                conn.execute("ALTER TABLE expenses ADD COLUMN day INTEGER")
+                conn.executemany("UPDATE expenses SET day = ? WHERE id = ?",
+                                 [(queries.date_ordinal(row['date']), row['id'])
+                                  for row in conn.execute("SELECT id, date FROM expenses").fetchall()])
+            conn.execute("DROP INDEX IF EXISTS idx_expenses_user_date")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_day ON expenses(username, day)")
+
+    def load(self) -> Dict:
+        """تحميل المستخدمين فقط؛ المصاريف تحمل عند طلبها لكل مستخدم"""
+        conn = self.connect()
+        if conn.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0:
+            # أول تشغيل: استيراد ملف JSON الحالي (مع سجل التغييرات إن وجد)
+            legacy = storage.JournalStore(self.users_file, self.backup_file)
+            with conn:
+                import_users(conn, legacy.load())
+            self.restored_from_backup = legacy.restored_from_backup
+
+        # قبل القراءة: كتابة أخرى أثناء التحميل تعيده عند الطلب التالي
+        self.seen_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        self.users_data = {}
+        self.expense_ids = {}
+        self.expense_by_id = {}
+        self.reset_indexes()
+        for row in conn.execute("SELECT username, password, profile FROM users"):
+            user = json.loads(row['profile'])
+            user['password'] = row['password']
+            self.users_data[row['username']] = user
+        return self.users_data
+
+    def sync(self, records: List[Dict] = ()) -> List[Dict]:
+        """إذا كتبت عملية أخرى في القاعدة منذ آخر تحميل: إعادة تحميل المستخدمين والمصاريف
+
+        أرقام الأسطر في expense_ids تتغير مع الحذف والإضافة من الخارج، فتعاد قراءتها قبل
+        أي قراءة أو كتابة بدلاً من ملف النسخة وقفل الملفات في باقي الأنواع (SQLite يقفل بنفسه).
+        """
+        with self.lock:
+            if self.connect().execute("PRAGMA data_version").fetchone()[0] != self.seen_version:
+                self.load()
+                if self.on_change is not None:
+                    self.on_change()
+            return list(records)
+
+    def watched_files(self, username: Optional[str] = None) -> List[str]:
+        return [self.db_file, self.db_file + '-wal'] if username is None else []
+
+    def start_write_behind(self, on_error=None, delay: float = 0.3):
+        """لا حاجة للحفظ المؤجل: كل عملية سطر واحد، والاستعلامات تقرأ من القاعدة مباشرة"""
+
+    # ==================== عمليات المستخدمين والمصاريف ====================
+
+    def user_expenses(self, username: str) -> List[Dict]:
+        """تحميل مصاريف المستخدم من القاعدة مرة واحدة"""
+        with self.lock:
+            if username not in self.expense_ids:
+                rows = self.connect().execute(
+                    "SELECT * FROM expenses WHERE username = ? ORDER BY id", (username,)).fetchall()
+                expenses = [row_to_expense(row) for row in rows]
+                self.expense_ids[username] = [row['id'] for row in rows]
+                self.expense_by_id[username] = dict(zip(self.expense_ids[username], expenses))
+                self.users_data[username]['expenses'] = expenses
+            return self.users_data[username]['expenses']
+
+    def add_user(self, username: str, record: Dict):
+        with self.lock:
+            self.sync()
+            password, profile = split_user(record)
+            with self.connect() as conn:
+                conn.execute("INSERT INTO users (username, password, profile) VALUES (?, ?, ?)",
+                             (username, password, profile))
+            self.users_data[username] = dict(record, expenses=[])
+            self.expense_ids[username] = []
+            self.expense_by_id[username] = {}
+
+    def update_user(self, username: str, fields: Dict):
+        with self.lock:
+            self.sync()
+            user = self.users_data[username]
+            user.update(fields)
+            password, profile = split_user(user)
+            with self.connect() as conn:
+                conn.execute("UPDATE users SET password = ?, profile = ? WHERE username = ?",
+                             (password, profile, username))
+
+    def add_expense(self, username: str, expense: Dict) -> str:
+        with self.lock:
+            self.sync()
+            expenses = self.user_expenses(username)
+            expense.setdefault('id', new_expense_id())
+            with self.connect() as conn:
+                cursor = conn.execute(INSERT_EXPENSE, (username,) + expense_to_row(expense))
+            self.update_indexes({'op': 'add', 'user': username, 'expense': expense})
+            expenses.append(expense)
+            self.expense_ids[username].append(cursor.lastrowid)
+            self.expense_by_id[username][cursor.lastrowid] = expense
+            return expense['id']
+
+    def add_expenses(self, username: str, expenses: List[Dict]) -> List[str]:
+        """إضافة مجموعة مصاريف في معاملة واحدة"""
+        with self.lock:
+            self.sync()
+            user_expenses = self.user_expenses(username)
+            for expense in expenses:
+                expense.setdefault('id', new_expense_id())
+            with self.connect() as conn:
+                row_ids = [conn.execute(INSERT_EXPENSE, (username,) + expense_to_row(expense)).lastrowid
+                           for expense in expenses]
+            for expense, row_id in zip(expenses, row_ids):
+                self.update_indexes({'op': 'add', 'user': username, 'expense': expense})
+                user_expenses.append(expense)
+                self.expense_ids[username].append(row_id)
+                self.expense_by_id[username][row_id] = expense
+            return [expense['id'] for expense in expenses]
+
+    def update_expense(self, username: str, expense_id: str, expense: Dict):
+        with self.lock:
+            self.sync()
+            expenses = self.user_expenses(username)
+            index = self.id_index(username).position(expense_id)
+            row_id = self.expense_ids[username][index]
+            expense['id'] = expense_id
+            with self.connect() as conn:
+                conn.execute(UPDATE_EXPENSE, expense_to_row(expense) + (row_id,))
+            self.update_indexes({'op': 'update', 'user': username, 'id': expense_id, 'expense': expense})
+            expenses[index] = expense
+            self.expense_by_id[username][row_id] = expense
+
+    def delete_expense(self, username: str, expense_id: str):
+        with self.lock:
+            self.sync()
+            expenses = self.user_expenses(username)
+            index = self.id_index(username).position(expense_id)
+            row_id = self.expense_ids[username][index]
+            with self.connect() as conn:
+                conn.execute("DELETE FROM expenses WHERE id = ?", (row_id,))
+            self.update_indexes({'op': 'delete', 'user': username, 'id': expense_id})
+            # نفس الحذف في apply_operation: آخر مصروف ينقل لمكان المحذوف
+            for items in (expenses, self.expense_ids[username]):
+                last = items.pop()
+                if index < len(items):
+                    items[index] = last
+            del self.expense_by_id[username][row_id]
+
+    def delete_expenses(self, username: str, expense_ids: List[str]):
+        with self.lock:
+            for expense_id in expense_ids:
+                self.delete_expense(username, expense_id)
+
+    def ids_assigned(self, username: str):
+        """حفظ المعرفات الجديدة للمصاريف القديمة (تحفظ مع المفاتيح الإضافية في عمود extra)"""
+        rows = [(extra_json(expense), row_id)
+                for expense, row_id in zip(self.user_expenses(username), self.expense_ids[username])]
+        with self.connect() as conn:
+            conn.executemany("UPDATE expenses SET extra = ? WHERE id = ?", rows)
+
+    # ==================== الاستعلامات ====================
+
+    def build_indexes(self, username: str):
+        """فهرس المعرفات والبحث النصي والإجماليات؛ حدود التاريخ يخدمها فهرس (username, day) في القاعدة"""
+        with self.lock:
+            self.sync()
+            self.id_index(username)
+            self.search_index(username)
+            self.user_aggregates(username)
+            self.user_rollup(username)
+
+    def get_expense(self, username: str, expense_id: str) -> Optional[Dict]:
+        with self.lock:
+            self.sync()
+            return super().get_expense(username, expense_id)
+
+    def user_rollup(self, username: str) -> MonthlyRollup:
+        with self.lock:
+            self.sync()
+            return super().user_rollup(username)
+
+    def data_version(self, username: str) -> Tuple[int, int]:
+        with self.lock:
+            self.sync()
+            return super().data_version(username)
+
+    def where_clause(self, username: str, search_text: str = '',
+                     start: Optional[str] = None, end: Optional[str] = None) -> Tuple[str, List]:
+        """شرط WHERE للبحث وحدود التاريخ (يستخدم فهرس username, day)"""
+        clauses = ["username = ?"]
+        params: List = [username]
+        if start:
+            clauses.append("day >= ?")
+            params.append(queries.date_ordinal(start))
+        if end:
+            clauses.append("day <= ?")
+            params.append(queries.date_ordinal(end))
+        if search_text:
+            clauses.append(f"instr({SEARCHABLE_SQL}, ?) > 0")
+            params.append(search_text.lower())
+        return " AND ".join(clauses), params
+
+    def query_expenses(self, username: str, search_text: str = '',
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       within: Optional[List[Dict]] = None) -> List[Dict]:
+        with self.lock:
+            generation = self.generation
+            self.sync()
+            if self.generation != generation:
+                # النتائج السابقة من بيانات قبل إعادة التحميل
+                within = None
+            if search_text and within is not None:
+                return self.search_index(username).refine(within, search_text)
+            if search_text:
+                # البحث النصي من فهرس الذاكرة، ثم حدود التاريخ على المرشحين فقط
+                return queries.filter_expenses(self.search_index(username).search(search_text), '', start, end)
+            self.user_expenses(username)
+            by_id = self.expense_by_id[username]
+            where, params = self.where_clause(username, search_text, start, end)
+            rows = self.connect().execute(f"SELECT id FROM expenses WHERE {where} ORDER BY id", params)
+            return [by_id[row[0]] for row in rows]
+
+    def totals(self, username: str, search_text: str = '',
+               start: Optional[str] = None, end: Optional[str] = None) -> Tuple[float, int]:
+        with self.lock:
+            self.sync()
+            if not (search_text or start or end) and username in self.aggregates:
+                return self.aggregates[username].totals()
+            if search_text:
+                return queries.summarize(self.query_expenses(username, search_text, start, end))
+            where, params = self.where_clause(username, search_text, start, end)
+            total, count = self.connect().execute(
+                f"SELECT COALESCE(SUM(amount), 0), COUNT(*) FROM expenses WHERE {where}", params).fetchone()
+            return total, count
+
+    def statistics(self, username: str) -> Dict:
+        with self.lock:
+            self.sync()
+            if username in self.aggregates:
+                return self.aggregates[username].statistics()
+            conn = self.connect()
+            total, count, max_expense, min_expense = conn.execute(
+                "SELECT COALESCE(SUM(amount), 0), COUNT(*), COALESCE(MAX(amount), 0), COALESCE(MIN(amount), 0) "
+                "FROM expenses WHERE username = ?", (username,)).fetchone()
+            by_type = dict(conn.execute(
+                "SELECT COALESCE(type, 'أخرى'), SUM(amount) FROM expenses WHERE username = ? GROUP BY type",
+                (username,)).fetchall())
+            by_payment = dict(conn.execute(
+                "SELECT COALESCE(payment_method, 'نقدي'), SUM(amount) FROM expenses "
+                "WHERE username = ? GROUP BY payment_method", (username,)).fetchall())
+            return {
+                'total': total,
+                'count': count,
+                'average': total / count if count > 0 else 0,
+                'max': max_expense,
+                'min': min_expense,
+                'by_type': by_type,
+                'by_payment': by_payment,
+            }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+def import_users(conn: sqlite3.Connection, users_data: Dict):
+    """استبدال بيانات المستخدمين الموجودين في القاموس بمحتواه (داخل المعاملة الحالية)
+
+    سطر المستخدم يحدث في مكانه (ON CONFLICT DO UPDATE) فلا يحذف ولا تحذف مصاريفه معه؛
+    المصاريف تستبدل فقط إذا حمل القاموس قائمة مصاريف للمستخدم.
+    """
+    for username, record in users_data.items():
+        password, profile = split_user(record)
+        conn.execute("INSERT INTO users (username, password, profile) VALUES (?, ?, ?) "
+                     "ON CONFLICT(username) DO UPDATE SET password = excluded.password, profile = excluded.profile",
+                     (username, password, profile))
+        if 'expenses' in record:
+            conn.execute("DELETE FROM expenses WHERE username = ?", (username,))
+            conn.executemany(INSERT_EXPENSE, [(username,) + expense_to_row(exp) for exp in record['expenses']])
+
+
+def import_json(json_file: str, db_file: Optional[str] = None) -> int:
+    """استيراد ملف users_data.json إلى قاعدة SQLite مرة واحدة، ويرجع عدد المصاريف"""
+    store = SqliteStore(json_file, db_file=db_file)
+    users_data = storage.JournalStore(json_file).load()
+    with store.connect() as conn:
+        import_users(conn, users_data)
+    store.close()
+    return sum(len(user.get('expenses', [])) for user in users_data.values())
+
+
+if __name__ == "__main__":
+    # الاستخدام: python sqlite_store.py users_data.json [users_data.db]
+    if len(sys.argv) < 2:
+        print("الاستخدام: python sqlite_store.py users_data.json [users_data.db]")
+        sys.exit(1)
+    count = import_json(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    print(f"تم استيراد {count} مصروف")
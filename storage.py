@@ -0,0 +1,909 @@
+"""طبقة تخزين بيانات المستخدمين والمصاريف (بدون أي اعتماد على الواجهة)"""
+import os
+import json
+import hashlib
+import struct
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import queries
+import columnar
+from file_lock import FileLock
+from search_index import SearchIndex
+from date_index import DateIndex
+from id_index import IdIndex, assign_ids, new_expense_id
+from aggregates import Aggregates
+from rollup import MonthlyRollup
+
+
+def checksum(raw: bytes) -> str:
+    """بصمة محتوى ملف الحفظ لربط السجل به"""
+    return hashlib.sha256(raw).hexdigest()
+
+
+def dump_users(users_data: Dict) -> bytes:
+    """تحويل بيانات المستخدمين إلى JSON بنفس الشكل المعتاد"""
+    return json.dumps(users_data, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+def encode_users(users_data: Dict, fmt: str = 'json') -> bytes:
+    """تحويل بيانات المستخدمين إلى صيغة الحفظ المطلوبة (json أو columnar)"""
+    if fmt == 'columnar':
+        return columnar.encode(users_data)
+    return dump_users(users_data)
+
+
+def decode_users(raw: bytes) -> Dict:
+    """قراءة ملف حفظ بأي صيغة (يتم التعرف على صيغة الأعمدة من بدايتها)"""
+    if columnar.is_columnar(raw):
+        return columnar.decode(raw)
+    return json.loads(raw)
+
+
+def write_atomic(path: str, raw: bytes):
+    """كتابة ملف كامل عبر ملف مؤقت ثم إعادة تسمية"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_version(path: str) -> int:
+    """رقم نسخة البيانات على القرص (يزيد مع كل كتابة من أي عملية)"""
+    try:
+        with open(path, 'rb') as f:
+            return int(f.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def apply_operation(users_data: Dict, record: Dict, position: Optional[int] = None):
+    """تطبيق عملية واحدة على البيانات (تستخدم للتنفيذ المباشر ولإعادة تشغيل السجل)
+
+    عمليات التعديل والحذف تحدد المصروف بمعرفه، وposition موضعه في القائمة من فهرس
+    المعرفات. السجلات القديمة (قبل المعرفات) تحمل الموضع نفسه في 'index'.
+    """
+    op = record['op']
+    user = record['user']
+    if position is None:
+        position = record.get('index')
+    if op == 'user':
+        users_data.setdefault(user, {'expenses': []}).update(record['fields'])
+    elif op == 'add':
+        users_data[user].setdefault('expenses', []).append(record['expense'])
+    elif op == 'update':
+        users_data[user]['expenses'][position] = record['expense']
+    elif op == 'delete':
+        expenses = users_data[user]['expenses']
+        if 'id' in record:
+            # آخر مصروف ينقل لمكان المحذوف (O(1))؛ IdIndex يحدث موضعه بنفس الطريقة
+            last = expenses.pop()
+            if position < len(expenses):
+                expenses[position] = last
+        else:
+            # السجلات القديمة تحمل مواضع كتبت على أساس إزاحة القائمة بعد كل حذف
+            expenses.pop(position)
+    else:
+        raise ValueError(f"عملية غير معروفة: {op}")
+
+
+class JsonStore:
+    """التخزين التقليدي: ملف JSON واحد يعاد كتابته بالكامل مع كل تغيير"""
+
+    def __init__(self, users_file: str, backup_file: Optional[str] = None):
+        self.users_file = users_file
+        self.backup_file = backup_file or f"{os.path.splitext(users_file)[0]}_backup.json"
+        self.users_data: Dict = {}
+        self.restored_from_backup = False
+        self.snapshot_format = 'json'
+        # فهارس البحث للمستخدمين الذين سجلوا الدخول
+        self.search_indexes: Dict[str, SearchIndex] = {}
+        self.date_indexes: Dict[str, DateIndex] = {}
+        self.id_indexes: Dict[str, IdIndex] = {}
+        self.aggregates: Dict[str, Aggregates] = {}
+        # التجميع الشهري يحفظ بجانب ملف البيانات مع بصمة نقطة الحفظ التي يطابقها
+        self.rollups: Dict[str, MonthlyRollup] = {}
+        self.rollup_file = f"{os.path.splitext(users_file)[0]}.rollup.json"
+        self.rollups_base: Optional[str] = None
+        # نسخة بيانات كل مستخدم (تزيد مع كل تعديل) لإعادة بناء ما يحسب من المصاريف عند تغيرها فقط
+        self.versions: Dict[str, int] = {}
+        self.generation = 0
+        # القفل يحمي البيانات في الذاكرة عند تفعيل الحفظ المؤجل
+        self.lock = threading.RLock()
+        self.saver = None
+        # بين العمليات: قفل ملف حول كل كتابة، ورقم النسخة على القرص عند آخر قراءة أو كتابة لنا
+        self.lock_file = f"{os.path.splitext(users_file)[0]}.lock"
+        self.version_file = f"{os.path.splitext(users_file)[0]}.version"
+        self.disk_version = 0
+        # يستدعى (من خيط الحفظ أحياناً) بعد دمج تغييرات عملية أخرى في الذاكرة
+        self.on_change = None
+
+    def read_checkpoint(self) -> Tuple[bytes, Dict]:
+        """قراءة ملف الحفظ، مع الرجوع للنسخة الاحتياطية إذا كان تالفاً أو مفقوداً
+
+        إذا وجد ملف ولم يمكن قراءته هو ولا النسخة الاحتياطية يرفع الخطأ، ولا يعيد
+        بيانات فارغة تحل محل الملف عند أول كتابة.
+        """
+        self.restored_from_backup = False
+        error = None
+        for path in (self.users_file, self.backup_file):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                raw = f.read()
+            try:
+                users_data = decode_users(raw)
+            except (ValueError, KeyError, IndexError, TypeError, struct.error) as e:
+                error = e
+                continue
+            self.restored_from_backup = path == self.backup_file
+            return raw, users_data
+        if error is not None:
+            raise ValueError(f"تعذرت قراءة ملف البيانات {self.users_file}: {error}") from error
+        return b'', {}
+
+    def load(self) -> Dict:
+        """تحميل كل المستخدمين"""
+        # الرقم قبل البيانات: إذا كتبت عملية أخرى بينهما فأسوأ ما يحدث دمج زائد لاحقاً
+        self.disk_version = read_version(self.version_file)
+        raw, self.users_data = self.read_checkpoint()
+        self.reset_indexes()
+        self.rollups_base = checksum(raw)
+        return self.users_data
+
+    def watched_files(self, username: Optional[str] = None) -> List[str]:
+        """الملفات التي يعني تغيرها على القرص أن البيانات المحملة قديمة
+
+        بدون username: ملفات كل البيانات، ومع username: ملفات هذا المستخدم فقط (إن كانت منفصلة).
+        """
+        return [self.users_file] if username is None else []
+
+    def reload_user(self, username: str):
+        """إعادة قراءة بيانات مستخدم تغيرت على القرص (هنا: كل الملف)"""
+        self.load()
+
+    def checkpoint(self) -> bytes:
+        """كتابة كل البيانات مع الاحتفاظ بالملف السابق كنسخة احتياطية"""
+        with self.lock:
+            raw = encode_users(self.users_data, self.snapshot_format)
+            rollups = {username: rollup.to_json() for username, rollup in self.rollups.items()}
+        self.write_checkpoint(raw)
+        self.rollups_base = checksum(raw)
+        if rollups:
+            # بعد ملف البيانات: إذا انقطعت الكتابة بينهما لا تتطابق البصمة ويعاد البناء
+            write_atomic(self.rollup_file, json.dumps(
+                {'base': self.rollups_base, 'users': rollups}, ensure_ascii=False).encode('utf-8'))
+        return raw
+
+    def write_checkpoint(self, raw: bytes) -> bytes:
+        """استبدال ملف الحفظ بمحتوى جديد ونقل السابق إلى النسخة الاحتياطية"""
+        tmp_path = f"{self.users_file}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(self.users_file):
+            os.replace(self.users_file, self.backup_file)
+        os.replace(tmp_path, self.users_file)
+        return raw
+
+    def commit(self, record: Dict):
+        """تنفيذ عملية في الذاكرة ثم حفظها (فوراً، أو لاحقاً عبر الحفظ المؤجل)"""
+        self.commit_all([record])
+
+    def commit_all(self, records: List[Dict]):
+        """تنفيذ عدة عمليات في الذاكرة ثم حفظها معاً بكتابة واحدة"""
+        if self.saver is not None:
+            self.saver.submit(records)
+            return
+        with self.lock:
+            for record in records:
+                self.apply(record)
+        self.write(records)
+
+    # ==================== الكتابة المتزامنة بين العمليات ====================
+
+    def write(self, records: List[Dict]):
+        """حفظ عمليات طبقت في الذاكرة، تحت قفل الملفات ومع دمج ما كتبته عملية أخرى قبلنا"""
+        with FileLock(self.lock_file):
+            records = self.sync(records)
+            if records:
+                self.persist(records)
+            self.bump_version()
+
+    def sync(self, records: List[Dict] = ()) -> List[Dict]:
+        """(تحت قفل الملفات) إذا تغيرت النسخة على القرص منذ قراءتنا: إعادة التحميل ثم تطبيق عملياتنا فقط
+
+        يعيد عملياتنا التي ما زالت صالحة (تعديل أو حذف مصروف حذفته العملية الأخرى يسقط).
+        """
+        if read_version(self.version_file) == self.disk_version:
+            return list(records)
+        with self.lock:
+            kept = self.rebase(records)
+            if self.saver is not None:
+                # العمليات المعلقة في خيط الحفظ طبقت في الذاكرة القديمة أيضاً
+                self.saver.pending[:] = self.rebase_pending(self.saver.pending)
+        if self.on_change is not None:
+            self.on_change()
+        return kept
+
+    def rebase(self, records: List[Dict]) -> List[Dict]:
+        self.load()
+        return self.rebase_pending(records)
+
+    def rebase_pending(self, records: List[Dict]) -> List[Dict]:
+        kept = []
+        for record in records:
+            try:
+                self.apply(record)
+            except (KeyError, IndexError):
+                continue
+            kept.append(record)
+        return kept
+
+    def bump_version(self):
+        self.disk_version = read_version(self.version_file) + 1
+        write_atomic(self.version_file, str(self.disk_version).encode('utf-8'))
+
+    def apply(self, record: Dict):
+        """تطبيق عملية على البيانات في الذاكرة"""
+        position = self.locate(record)
+        self.update_indexes(record)
+        apply_operation(self.users_data, record, position)
+
+    def persist(self, records: List[Dict]):
+        """كتابة مجموعة عمليات على القرص (هنا: إعادة كتابة الملف كاملاً مرة واحدة)"""
+        self.checkpoint()
+
+    # ==================== الحفظ المؤجل ====================
+
+    def start_write_behind(self, on_error=None, delay: float = 0.3):
+        """تشغيل خيط الحفظ المؤجل؛ on_error يستدعى من خيط الحفظ عند الفشل"""
+        if self.saver is None:
+            self.saver = BackgroundSaver(self, on_error, delay)
+
+    def flush(self):
+        """انتظار كتابة كل التغييرات المعلقة"""
+        if self.saver is not None:
+            self.saver.flush()
+
+    def stop_write_behind(self):
+        """كتابة المعلق وإيقاف خيط الحفظ"""
+        if self.saver is not None:
+            self.saver.stop()
+            self.saver = None
+
+    # ==================== عمليات المستخدمين والمصاريف ====================
+
+    def user_expenses(self, username: str) -> List[Dict]:
+        """قائمة مصاريف مستخدم (نفس القائمة المحفوظة في الذاكرة)"""
+        with self.lock:
+            return self.users_data[username].setdefault('expenses', [])
+
+    def add_user(self, username: str, record: Dict):
+        fields = dict(record)
+        fields.setdefault('expenses', [])
+        self.commit({'op': 'user', 'user': username, 'fields': fields})
+
+    def update_user(self, username: str, fields: Dict):
+        self.commit({'op': 'user', 'user': username, 'fields': fields})
+
+    def add_expense(self, username: str, expense: Dict) -> str:
+        """إضافة مصروف وإرجاع معرفه"""
+        expense.setdefault('id', new_expense_id())
+        self.commit({'op': 'add', 'user': username, 'expense': expense})
+        return expense['id']
+
+    def delete_expenses(self, username: str, expense_ids: List[str]):
+        """حذف مجموعة مصاريف بحفظ واحد"""
+        for expense_id in expense_ids:
+            self.id_index(username).position(expense_id)
+        self.commit_all([{'op': 'delete', 'user': username, 'id': expense_id} for expense_id in expense_ids])
+
+    def add_expenses(self, username: str, expenses: List[Dict]) -> List[str]:
+        """إضافة مجموعة مصاريف (استيراد) بحفظ واحد وإرجاع معرفاتها"""
+        for expense in expenses:
+            expense.setdefault('id', new_expense_id())
+        self.commit_all([{'op': 'add', 'user': username, 'expense': expense} for expense in expenses])
+        return [expense['id'] for expense in expenses]
+
+    def update_expense(self, username: str, expense_id: str, expense: Dict):
+        self.id_index(username).position(expense_id)
+        expense['id'] = expense_id
+        self.commit({'op': 'update', 'user': username, 'id': expense_id, 'expense': expense})
+
+    def delete_expense(self, username: str, expense_id: str):
+        self.id_index(username).position(expense_id)
+        self.commit({'op': 'delete', 'user': username, 'id': expense_id})
+
+    def get_expense(self, username: str, expense_id: str) -> Optional[Dict]:
+        """المصروف بمعرفه، أو None إذا لم يعد موجوداً"""
+        with self.lock:
+            return self.id_index(username).get(expense_id)
+
+    # ==================== الفهارس والاستعلامات ====================
+    # كل القراءات تمسك self.lock: دمج تغييرات عملية أخرى (sync) يعيد تحميل البيانات
+    # والفهارس من خيط الحفظ، فلا يرى خيط الواجهة بيانات أو فهارس نصف مبنية
+
+    def build_indexes(self, username: str):
+        """بناء فهارس الاستعلام لمستخدم مرة واحدة (عند تسجيل الدخول)"""
+        with self.lock:
+            self.id_index(username)
+            self.search_index(username)
+            self.date_index(username)
+            self.user_aggregates(username)
+            self.user_rollup(username)
+
+    def reset_indexes(self):
+        """إسقاط الفهارس بعد إعادة تحميل البيانات (تبنى من جديد عند الحاجة)"""
+        self.search_indexes = {}
+        self.date_indexes = {}
+        self.id_indexes = {}
+        self.aggregates = {}
+        self.rollups = {}
+        self.generation += 1
+
+    def id_index(self, username: str) -> IdIndex:
+        """فهرس المعرفات، مع إعطاء معرفات للمصاريف القديمة عند أول بناء"""
+        with self.lock:
+            if username not in self.id_indexes:
+                expenses = self.user_expenses(username)
+                if assign_ids(expenses):
+                    self.ids_assigned(username)
+                self.id_indexes[username] = IdIndex(expenses)
+            return self.id_indexes[username]
+
+    def ids_assigned(self, username: str):
+        """معرفات جديدة أعطيت لمصاريف قديمة (هنا تحفظ مع أول كتابة كاملة)"""
+
+    def locate(self, record: Dict) -> Optional[int]:
+        """موضع المصروف الذي تستهدفه عملية تعديل أو حذف"""
+        if record['op'] in ('update', 'delete'):
+            return self.id_index(record['user']).position(record['id'])
+        return None
+
+    def search_index(self, username: str) -> SearchIndex:
+        with self.lock:
+            if username not in self.search_indexes:
+                self.search_indexes[username] = SearchIndex(self.user_expenses(username))
+            return self.search_indexes[username]
+
+    def date_index(self, username: str) -> DateIndex:
+        with self.lock:
+            if username not in self.date_indexes:
+                self.date_indexes[username] = DateIndex(self.user_expenses(username))
+            return self.date_indexes[username]
+
+    def user_aggregates(self, username: str) -> Aggregates:
+        with self.lock:
+            if username not in self.aggregates:
+                self.aggregates[username] = Aggregates(self.user_expenses(username))
+            return self.aggregates[username]
+
+    def user_rollup(self, username: str) -> MonthlyRollup:
+        """التجميع الشهري: من الملف المحفوظ إذا طابق البيانات المحملة، وإلا يبنى من المصاريف"""
+        with self.lock:
+            if username not in self.rollups:
+                rollup = self.read_rollup(username)
+                if rollup is None:
+                    rollup = MonthlyRollup(self.user_expenses(username))
+                self.rollups[username] = rollup
+            return self.rollups[username]
+
+    def read_rollup(self, username: str) -> Optional[MonthlyRollup]:
+        if self.rollups_base is None or not os.path.exists(self.rollup_file):
+            return None
+        try:
+            with open(self.rollup_file, 'rb') as f:
+                saved = json.loads(f.read())
+            if saved.get('base') != self.rollups_base or username not in saved['users']:
+                return None
+            return MonthlyRollup.from_json(saved['users'][username])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def data_version(self, username: str) -> Tuple[int, int]:
+        """تتغير مع أي تعديل على مصاريف المستخدم أو إعادة تحميل البيانات"""
+        with self.lock:
+            return self.generation, self.versions.get(username, 0)
+
+    def update_indexes(self, record: Dict):
+        """تحديث الفهارس المبنية بعملية قبل تطبيقها على البيانات"""
+        if record['op'] == 'user':
+            return
+        username = record['user']
+        self.versions[username] = self.versions.get(username, 0) + 1
+        old = self.id_index(username).get(record['id']) if record['op'] != 'add' else None
+        # التجميع الشهري المحفوظ يجب أن يبقى مطابقاً للبيانات، فيبنى قبل أول تعديل
+        self.user_rollup(username)
+        for indexes in (self.search_indexes, self.date_indexes, self.aggregates, self.rollups):
+            index = indexes.get(username)
+            if index is not None:
+                index.apply(record, old)
+        ids = self.id_indexes.get(username)
+        if ids is not None:
+            ids.apply(record)
+
+    def query_expenses(self, username: str, search_text: str = '',
+                       start: Optional[str] = None, end: Optional[str] = None,
+                       within: Optional[List[Dict]] = None) -> List[Dict]:
+        """مصاريف المستخدم المطابقة للبحث وحدود التاريخ
+
+        within: نتائج استعلام سابق بنفس حدود التاريخ ونص بحث أقصر يحتويه النص الجديد،
+        فتضيق بدلاً من البحث في كل المصاريف.
+        """
+        with self.lock:
+            if search_text and within is not None:
+                return self.search_index(username).refine(within, search_text)
+            if search_text:
+                expenses = self.search_index(username).search(search_text)
+                if start or end:
+                    expenses = self.date_index(username).filter(expenses, start, end)
+                return expenses
+            if start or end:
+                return self.date_index(username).range(start, end)
+            return list(self.user_expenses(username))
+
+    def totals(self, username: str, search_text: str = '',
+               start: Optional[str] = None, end: Optional[str] = None) -> Tuple[float, int]:
+        """الإجمالي والعدد لنفس الاستعلام (بدون فلتر: من الإجماليات المحدثة مباشرة)"""
+        with self.lock:
+            if not (search_text or start or end):
+                return self.user_aggregates(username).totals()
+            return queries.summarize(self.query_expenses(username, search_text, start, end))
+
+    def statistics(self, username: str) -> Dict:
+        """إحصائيات كل مصاريف المستخدم"""
+        with self.lock:
+            return self.user_aggregates(username).statistics()
+
+    def close(self):
+        """كتابة التغييرات المعلقة"""
+        self.stop_write_behind()
+
+
+class JournalStore(JsonStore):
+    """تخزين بسجل إلحاقي: كل تغيير سطر صغير، ونقطة حفظ كاملة كل فترة
+
+    أول سطر في ملف السجل يحمل بصمة ملف الحفظ الذي بني عليه، فإذا تغير ملف
+    الحفظ (بعد الضغط أو من تطبيق آخر) يعتبر السجل القديم مدمجاً ويتم تجاهله.
+    """
+
+    def __init__(self, users_file: str, backup_file: Optional[str] = None,
+                 journal_file: Optional[str] = None, checkpoint_every: int = 1000):
+        super().__init__(users_file, backup_file)
+        self.journal_file = journal_file or f"{os.path.splitext(users_file)[0]}.journal"
+        self.checkpoint_every = checkpoint_every
+        self.journal_records = 0
+        self.journal_offset = None
+        self.base_checksum = checksum(b'')
+        self.journal = None
+        # معرفات أعطيت لمصاريف قديمة: يجب كتابة نقطة حفظ قبل أي سطر يشير إليها
+        self.needs_checkpoint = False
+
+    def load(self) -> Dict:
+        """تحميل آخر نقطة حفظ ثم إعادة تشغيل السجل فوقها (بدون الكتابة على أي ملف)"""
+        # ملف السجل المفتوح قد يكون استبدل على القرص (ضغط من عملية أخرى)
+        self.discard()
+        self.disk_version = read_version(self.version_file)
+        raw, self.users_data = self.read_checkpoint()
+        self.reset_indexes()
+        self.base_checksum = checksum(raw)
+        self.journal_records = 0
+        self.journal_offset = self.replay_journal()
+        # التجميع المحفوظ يطابق نقطة الحفظ فقط، وليس ما أضافه السجل فوقها
+        self.rollups_base = self.base_checksum if not self.journal_records else None
+        return self.users_data
+
+    def replay_journal(self) -> Optional[int]:
+        """إعادة تشغيل السجل وإرجاع طول الجزء السليم منه، أو None إذا لم يكن تابعاً لنقطة الحفظ الحالية"""
+        if not os.path.exists(self.journal_file):
+            return None
+        with open(self.journal_file, 'rb') as f:
+            header = f.readline()
+            try:
+                if json.loads(header).get('base') != self.base_checksum:
+                    return None
+            except (ValueError, AttributeError):
+                return None
+
+            good_offset = len(header)
+            ids: Dict[str, IdIndex] = {}
+            for line in f:
+                # سطر ناقص بسبب انقطاع أثناء الكتابة: نتوقف عنده ويقص عند أول كتابة
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    record = json.loads(line)
+                    position = None
+                    if record['op'] != 'user':
+                        username = record['user']
+                        # ملف مصاريف مستخدم جديد: السجل يسبق أول نقطة حفظ فيها المستخدم
+                        self.users_data.setdefault(username, {'expenses': []})
+                        if 'id' in record and username not in ids:
+                            ids[username] = IdIndex(self.user_expenses(username))
+                        if username in ids:
+                            if 'id' in record:
+                                position = ids[username].position(record['id'])
+                            ids[username].apply(record)
+                    apply_operation(self.users_data, record, position)
+                except (ValueError, KeyError, IndexError, TypeError):
+                    break
+                self.journal_records += 1
+                good_offset += len(line)
+        return good_offset
+
+    def start_journal(self):
+        """بدء سجل جديد فارغ مرتبط بنقطة الحفظ الحالية"""
+        if self.journal:
+            self.journal.close()
+        header = json.dumps({'base': self.base_checksum}) + '\n'
+        write_atomic(self.journal_file, header.encode('utf-8'))
+        self.journal_records = 0
+        self.journal_offset = len(header.encode('utf-8'))
+        self.journal = open(self.journal_file, 'ab')
+
+    def open_journal(self):
+        """فتح السجل للإلحاق، أو بدء سجل جديد إذا لم يكن صالحاً"""
+        if self.journal_offset is None:
+            self.start_journal()
+            return
+        self.journal = open(self.journal_file, 'ab')
+        if self.journal.tell() > self.journal_offset:
+            self.journal.truncate(self.journal_offset)
+
+    def checkpoint(self) -> bytes:
+        """ضغط السجل في نقطة حفظ كاملة"""
+        self.needs_checkpoint = False
+        raw = super().checkpoint()
+        self.base_checksum = checksum(raw)
+        self.start_journal()
+        return raw
+
+    def ids_assigned(self, username: str):
+        self.needs_checkpoint = True
+
+    def persist(self, records: List[Dict]):
+        """إلحاق العمليات بالسجل بكتابة واحدة (تكلفة ثابتة مهما كبر حجم البيانات)"""
+        if self.needs_checkpoint:
+            # نقطة الحفظ تحتوي العمليات نفسها (طبقت في الذاكرة) مع المعرفات الجديدة
+            self.checkpoint()
+            return
+        if self.journal is None:
+            self.open_journal()
+        lines = ''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+        self.journal.write(lines.encode('utf-8'))
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+        self.journal_records += len(records)
+        if self.journal_records >= self.checkpoint_every:
+            self.checkpoint()
+
+    def watched_files(self, username: Optional[str] = None) -> List[str]:
+        return [self.users_file, self.journal_file] if username is None else []
+
+    def discard(self):
+        """إغلاق السجل بدون ضغطه (الملفات على القرص أحدث مما في الذاكرة)"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def compact(self):
+        """ضغط السجل في نقطة حفظ إذا كان فيه عمليات (المستدعي يمسك قفل الملفات)"""
+        if self.journal_records:
+            self.checkpoint()
+
+    def close(self):
+        """ضغط السجل المتبقي وإغلاق الملف (إذا فتح للكتابة فقط)"""
+        self.stop_write_behind()
+        if self.journal is None:
+            return
+        if self.journal_records:
+            # الضغط يستبدل ملفات الحفظ، فيتم تحت القفل وبعد دمج ما كتبته العمليات الأخرى
+            with FileLock(self.lock_file):
+                self.sync()
+                self.compact()
+                self.bump_version()
+        self.discard()
+
+
+class ShardedStore(JsonStore):
+    """دليل صغير للمستخدمين يحمل عند التشغيل، وملف مصاريف (بسجل إلحاقي) لكل مستخدم يحمل بعد الدخول
+
+    الشكل على القرص:
+        users_data/users.json            بيانات الدخول والبروفايل فقط
+        users_data/expenses/<hash>.json  مصاريف مستخدم واحد (+ سجل .journal)
+    عند أول تشغيل يتم ترحيل ملف users_data.json القديم تلقائياً.
+    ملفات المصاريف تحفظ بصيغة JSON أو بصيغة الأعمدة (EXPENSE_SNAPSHOT_FORMAT=columnar)،
+    والقراءة تتعرف على الصيغة تلقائياً.
+    """
+
+    def __init__(self, users_file: str, backup_file: Optional[str] = None, data_dir: Optional[str] = None):
+        super().__init__(users_file, backup_file)
+        self.snapshot_format = os.environ.get('EXPENSE_SNAPSHOT_FORMAT', 'json')
+        self.data_dir = data_dir or os.path.splitext(users_file)[0]
+        self.directory = JsonStore(os.path.join(self.data_dir, 'users.json'))
+        self.shards: Dict[str, JournalStore] = {}
+
+    def shard_file(self, username: str) -> str:
+        """اسم ملف مصاريف المستخدم (بصمة الاسم لتجنب الأحرف غير المسموحة)"""
+        name = hashlib.sha256(username.encode('utf-8')).hexdigest()[:16]
+        return os.path.join(self.data_dir, 'expenses', f"{name}.json")
+
+    def load(self) -> Dict:
+        """تحميل دليل المستخدمين فقط (بدون المصاريف)"""
+        if not os.path.exists(self.directory.users_file) and not os.path.exists(self.directory.backup_file):
+            self.migrate()
+        self.disk_version = read_version(self.version_file)
+        self.users_data = self.directory.load()
+        self.restored_from_backup = self.directory.restored_from_backup
+        for shard in self.shards.values():
+            shard.discard()
+        self.shards = {}
+        self.reset_indexes()
+        return self.users_data
+
+    def migrate(self):
+        """ترحيل ملف JSON الواحد (مع سجله) إلى الدليل وملفات المصاريف"""
+        legacy = JournalStore(self.users_file, self.backup_file)
+        users_data = legacy.load()
+        os.makedirs(os.path.join(self.data_dir, 'expenses'), exist_ok=True)
+        for username, record in users_data.items():
+            self.write_shard(username, record.get('expenses', []))
+        # الدليل يكتب أخيراً، فإذا انقطع الترحيل يعاد من البداية
+        self.directory.users_data = users_data
+        self.write_directory()
+
+    def write_directory(self):
+        """حفظ الدليل بدون قوائم المصاريف"""
+        os.makedirs(self.data_dir, exist_ok=True)
+        with self.lock:
+            profiles = {username: {k: v for k, v in record.items() if k != 'expenses'}
+                        for username, record in self.directory.users_data.items()}
+            raw = dump_users(profiles)
+        self.directory.write_checkpoint(raw)
+
+    def write_shard(self, username: str, expenses: List[Dict]):
+        """كتابة ملف مصاريف مستخدم كاملاً"""
+        shard = JournalStore(self.shard_file(username))
+        shard.snapshot_format = self.snapshot_format
+        shard.users_data = {username: {'expenses': expenses}}
+        shard.checkpoint()
+        shard.close()
+
+    def shard(self, username: str) -> JournalStore:
+        """ملف مصاريف المستخدم، يحمل عند أول طلب"""
+        with self.lock:
+            if username not in self.shards:
+                os.makedirs(os.path.join(self.data_dir, 'expenses'), exist_ok=True)
+                shard = JournalStore(self.shard_file(username))
+                shard.snapshot_format = self.snapshot_format
+                # نفس القفل حتى لا يقرأ خيط الحفظ ملف المستخدم أثناء تعديله
+                shard.lock = self.lock
+                shard.load()
+                shard.users_data.setdefault(username, {'expenses': []})
+                self.users_data[username]['expenses'] = shard.user_expenses(username)
+                self.shards[username] = shard
+            return self.shards[username]
+
+    def watched_files(self, username: Optional[str] = None) -> List[str]:
+        """الدليل لكل المستخدمين، وملف المصاريف وسجله لكل مستخدم"""
+        if username is None:
+            return [self.directory.users_file]
+        shard_file = self.shard_file(username)
+        return [shard_file, f"{os.path.splitext(shard_file)[0]}.journal"]
+
+    def reload_user(self, username: str):
+        """إسقاط ملف مصاريف المستخدم وفهارسه ليعاد تحميله من القرص عند الطلب"""
+        with self.lock:
+            shard = self.shards.pop(username, None)
+            if shard is not None:
+                shard.discard()
+            for indexes in (self.search_indexes, self.date_indexes, self.id_indexes,
+                            self.aggregates, self.rollups):
+                indexes.pop(username, None)
+            if username in self.users_data:
+                self.users_data[username].pop('expenses', None)
+            self.versions[username] = self.versions.get(username, 0) + 1
+
+    def convert_snapshots(self, fmt: str) -> int:
+        """إعادة كتابة ملفات مصاريف كل المستخدمين بالصيغة المطلوبة (مع دمج سجلاتها)"""
+        self.load()
+        self.snapshot_format = fmt
+        for username in self.users_data:
+            self.shard(username).checkpoint()
+        self.close()
+        return len(self.users_data)
+
+    def apply(self, record: Dict):
+        if record['op'] == 'user':
+            apply_operation(self.users_data, record)
+        else:
+            shard = self.shard(record['user'])
+            position = self.locate(record)
+            self.update_indexes(record)
+            apply_operation(shard.users_data, record, position)
+
+    def ids_assigned(self, username: str):
+        self.shard(username).needs_checkpoint = True
+
+    def user_rollup(self, username: str) -> MonthlyRollup:
+        """التجميع الشهري يحفظ بجانب ملف مصاريف المستخدم نفسه"""
+        with self.lock:
+            if username not in self.rollups:
+                self.rollups[username] = self.shard(username).user_rollup(username)
+            return self.rollups[username]
+
+    def persist(self, records: List[Dict]):
+        """بيانات المستخدم تحفظ في الدليل، والمصاريف في سجل ملف كل مستخدم فقط"""
+        by_user: Dict[str, List[Dict]] = {}
+        for record in records:
+            if record['op'] != 'user':
+                by_user.setdefault(record['user'], []).append(record)
+        if len(by_user) < len(records):
+            self.directory.users_data = self.users_data
+            self.write_directory()
+        for username, user_records in by_user.items():
+            self.shards[username].persist(user_records)
+
+    def user_expenses(self, username: str) -> List[Dict]:
+        return self.shard(username).user_expenses(username)
+
+    def close(self):
+        """كتابة المعلق ثم ضغط سجلات ملفات المصاريف المفتوحة"""
+        self.stop_write_behind()
+        if any(shard.journal_records for shard in self.shards.values()):
+            with FileLock(self.lock_file):
+                self.sync()
+                for shard in self.shards.values():
+                    shard.compact()
+                self.bump_version()
+        for shard in self.shards.values():
+            shard.discard()
+
+
+# إعادة المحاولة بعد فشل الحفظ المؤجل: تبدأ بعد RETRY_DELAY وتتضاعف حتى MAX_RETRY_DELAY
+RETRY_DELAY = 0.5
+MAX_RETRY_DELAY = 30.0
+
+
+class UnsavedChanges(Exception):
+    """فشلت كتابة تغييرات ما زالت في الذاكرة فقط (خيط الحفظ يستمر في إعادة المحاولة)"""
+
+    def __init__(self, count: int, error: Exception):
+        super().__init__(f"لم يتم حفظ {count} تغيير بعد: {error}")
+        self.count = count
+        self.error = error
+
+
+class BackgroundSaver:
+    """خيط حفظ مؤجل: التغيير يطبق في الذاكرة فوراً، والكتابة على القرص تجمع وتتم في الخلفية
+
+    التغييرات المتتالية تدمج في كتابة واحدة بعد هدوء الإدخال لمدة delay ثانية
+    (وبحد أقصى max_delay)، حتى لا تتجمد الواجهة أثناء الكتابة. إذا فشلت الكتابة تعاد
+    العمليات لأول المعلق وتعاد المحاولة بانتظار متزايد؛ on_error يستدعى عند أول فشل فقط.
+    """
+
+    def __init__(self, store: JsonStore, on_error=None, delay: float = 0.3, max_delay: float = 2.0):
+        self.store = store
+        self.on_error = on_error
+        self.delay = delay
+        self.max_delay = max_delay
+        self.condition = threading.Condition(store.lock)
+        self.pending: List[Dict] = []
+        self.last_submit = 0.0
+        self.writing = False
+        self.flush_requested = False
+        self.stopping = False
+        # الفشل المتتالي للكتابة وآخر خطأ، وعدد محاولات الكتابة المنتهية (لـ flush)
+        self.failures = 0
+        self.error: Optional[Exception] = None
+        self.failed_at = 0.0
+        self.attempts = 0
+        self.thread = threading.Thread(target=self.run, name="expense-saver", daemon=True)
+        self.thread.start()
+
+    def submit(self, records: List[Dict]):
+        """تطبيق العمليات في الذاكرة (في خيط الواجهة) وجدولة كتابتها"""
+        with self.condition:
+            for record in records:
+                self.store.apply(record)
+            self.pending.extend(records)
+            self.last_submit = time.monotonic()
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.stopping:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                if self.failures:
+                    # بعد الفشل: انتظار متزايد قبل إعادة المحاولة (flush يعيدها فوراً)
+                    retry_at = self.failed_at + min(RETRY_DELAY * 2 ** (self.failures - 1), MAX_RETRY_DELAY)
+                    while not self.flush_requested and not self.stopping:
+                        remaining = retry_at - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self.condition.wait(remaining)
+                # انتظار هدوء الإدخال لتجميع التغييرات المتتالية
+                deadline = time.monotonic() + self.max_delay
+                while not self.flush_requested and not self.stopping:
+                    remaining = min(self.last_submit + self.delay, deadline) - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                records, self.pending = self.pending, []
+                self.flush_requested = False
+                self.writing = True
+
+            try:
+                self.store.write(records)
+            except Exception as e:
+                with self.condition:
+                    # العمليات ما زالت مطبقة في الذاكرة: تعاد قبل ما أضيف بعدها لتكتب بنفس الترتيب
+                    self.pending[:0] = records
+                    self.failures += 1
+                    self.error = e
+                    self.failed_at = time.monotonic()
+                if self.on_error and self.failures == 1:
+                    self.on_error(e)
+            else:
+                with self.condition:
+                    self.failures = 0
+                    self.error = None
+            finally:
+                with self.condition:
+                    self.writing = False
+                    self.attempts += 1
+                    self.condition.notify_all()
+
+    def flush(self):
+        """انتظار انتهاء كتابة كل ما هو معلق
+
+        UnsavedChanges إذا فشلت محاولة كتابة أثناء الانتظار (المعلق يبقى ويعاد لاحقاً).
+        """
+        with self.condition:
+            attempts = self.attempts
+            while self.pending or self.writing:
+                if self.error is not None and self.attempts > attempts and not self.writing:
+                    raise UnsavedChanges(len(self.pending), self.error) from self.error
+                self.flush_requested = True
+                self.condition.notify_all()
+                self.condition.wait()
+
+    def stop(self):
+        """كتابة المعلق وإنهاء الخيط (UnsavedChanges إذا فشلت الكتابة ويبقى الخيط يعيد المحاولة)"""
+        self.flush()
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        self.thread.join()
+
+
+MODES = ['json', 'journal', 'sharded', 'sqlite']
+
+
+def default_mode() -> str:
+    """نوع التخزين من متغير البيئة EXPENSE_STORAGE (ملف لكل مستخدم افتراضياً)"""
+    return os.environ.get('EXPENSE_STORAGE', 'sharded')
+
+
+def open_store(users_file: str, backup_file: Optional[str] = None, mode: Optional[str] = None) -> JsonStore:
+    """إنشاء طبقة التخزين المطلوبة"""
+    mode = mode or default_mode()
+    if mode == 'json':
+        return JsonStore(users_file, backup_file)
+    if mode == 'journal':
+        return JournalStore(users_file, backup_file)
+    if mode == 'sharded':
+        return ShardedStore(users_file, backup_file)
+    if mode == 'sqlite':
+        # استيراد متأخر لأن sqlite_store يعتمد على هذه الوحدة
+        import sqlite_store
+        return sqlite_store.SqliteStore(users_file, backup_file)
+    raise ValueError(f"نوع تخزين غير معروف: {mode}")
@@ -1,31 +1,56 @@
 import streamlit as st
-import json
-from datetime import datetime
-import os
+from datetime import date, datetime
+import pandas as pd
+import analytics
+import core
+from shared_store import SharedStore
 
 # إعداد الصفحة
 st.set_page_config(page_title="Expense Tracker", page_icon="💰", layout="wide")
 
 # ملف البيانات
 DATA_FILE = 'users_data.json'
+CATEGORIES = ["طعام", "مواصلات", "ترفيه", "فواتير", "تسوق", "صحة", "تعليم", "أخرى"]
+# ترتيب الجدول: العنوان -> عمود analytics.TABLE_SORTS
+SORT_COLUMNS = {"التاريخ": 'date', "المبلغ": 'amount', "الفئة": 'category'}
+PAGE_SIZES = [25, 50, 100, 200]
 
 # دوال مساعدة
-def load_data():
-    if os.path.exists(DATA_FILE):
-        with open(DATA_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+@st.cache_resource
+def shared_store():
+    """مخزن واحد لكل عملية الخادم تتشاركه كل الجلسات (بدلاً من نسخة بيانات لكل جلسة)"""
+    return SharedStore(DATA_FILE)
 
-def save_data(data):
-    with open(DATA_FILE, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+@st.cache_data(max_entries=64)
+def expense_view(user, version, today, _store):
+    """الإحصائيات لمستخدم عند نسخة بيانات معينة
 
-def calculate_total(expenses):
-    return sum(float(exp.get('amount', 0)) for exp in expenses)
+    المفتاح هو (المستخدم, النسخة, اليوم)؛ _store لا يدخل في المفتاح، والمصاريف تنسخ منه عند الحاجة فقط.
+    analytics.StaleVersion إذا تغيرت البيانات بعد قراءة النسخة، فلا تحفظ نتيجة نسخة أحدث تحت مفتاح أقدم.
+    """
+    result = analytics.for_user(_store, user, version)
+    return {
+        'summary': result.summary(),
+        'recent_7': result.recent_spend(7),
+        'recent_30': result.recent_spend(30),
+        'by_type': result.by_column('type'),
+        'by_weekday': result.by_weekday()['sum'],
+        'rolling': pd.DataFrame({'7 أيام': result.rolling(7), '30 يوم': result.rolling(30)}),
+    }
+
+@st.cache_data(max_entries=64)
+def table_query(user, version, start, end, categories, text, sort, descending, _store):
+    """مواقع صفوف الجدول المطابقة للفلاتر بالترتيب، والإجمالي لكل النتيجة
+
+    تغيير الصفحة لا يعيد الفلترة ولا الترتيب؛ المتصفح يستلم صفوف الصفحة الحالية فقط.
+    المواقع صالحة لإطار نفس النسخة فقط (analytics.for_user مع version).
+    """
+    result = analytics.for_user(_store, user, version)
+    positions = result.query(start, end, list(categories), text, sort, descending)
+    return positions, result.totals(positions)
 
 # تحميل البيانات
-if 'users_data' not in st.session_state:
-    st.session_state.users_data = load_data()
+store = shared_store()
 if 'current_user' not in st.session_state:
     st.session_state.current_user = None
 
@@ -42,15 +67,14 @@ if st.session_state.current_user is None:
         login_password = st.text_input("كلمة المرور", type="password", key="login_pass")
         
         if st.button("دخول"):
-            if login_username in st.session_state.users_data:
-                if st.session_state.users_data[login_username]['password'] == login_password:
-                    st.session_state.current_user = login_username
-                    st.success("تم تسجيل الدخول بنجاح!")
-                    st.rerun()
-                else:
-                    st.error("كلمة مرور خاطئة")
+            try:
+                store.authenticate(login_username.strip(), login_password)
+            except core.ValidationError as e:
+                st.error(str(e))
             else:
-                st.error("اسم المستخدم غير موجود")
+                st.session_state.current_user = login_username.strip()
+                st.success("تم تسجيل الدخول بنجاح!")
+                st.rerun()
     
     with col2:
         st.subheader("إنشاء حساب جديد")
@@ -59,22 +83,19 @@ if st.session_state.current_user is None:
         
         if st.button("إنشاء حساب"):
             if new_username and new_password:
-                if new_username not in st.session_state.users_data:
-                    st.session_state.users_data[new_username] = {
-                        'password': new_password,
-                        'expenses': []
-                    }
-                    save_data(st.session_state.users_data)
+                try:
+                    store.add_user(new_username.strip(), new_password)
                     st.success("تم إنشاء الحساب بنجاح! يمكنك الآن تسجيل الدخول")
-                else:
-                    st.error("اسم المستخدم موجود بالفعل")
+                except core.ValidationError as e:
+                    st.error(str(e))
             else:
                 st.warning("من فضلك أدخل جميع البيانات")
 
 else:
     # واجهة المستخدم بعد تسجيل الدخول
     user = st.session_state.current_user
-    user_data = st.session_state.users_data[user]
+    # إعادة تحميل مصاريف المستخدم إذا تغيرت على القرص من عملية أخرى
+    store.refresh(user)
     
     # شريط علوي
     col1, col2, col3 = st.columns([3, 1, 1])
@@ -92,83 +113,130 @@ else:
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            category = st.selectbox(
-                "الفئة",
-                ["طعام", "مواصلات", "ترفيه", "فواتير", "تسوق", "صحة", "تعليم", "أخرى"]
-            )
+            category = st.selectbox("الفئة", CATEGORIES)
         
         with col2:
             amount = st.number_input("المبلغ (جنيه)", min_value=0.0, step=1.0)
         
         with col3:
-            date = st.date_input("التاريخ", datetime.now())
+            expense_date = st.date_input("التاريخ", datetime.now())
         
         description = st.text_input("الوصف (اختياري)")
         
         if st.button("➕ إضافة", type="primary"):
-            if amount > 0:
-                new_expense = {
-                    'category': category,
-                    'amount': amount,
-                    'date': date.strftime('%Y-%m-%d'),
-                    'description': description,
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-                user_data['expenses'].append(new_expense)
-                save_data(st.session_state.users_data)
+            # نفس شكل مصروف سطح المكتب: الفئة في type والوصف في notes
+            fields = {
+                'type': category,
+                'amount': amount,
+                'date': expense_date.strftime('%Y-%m-%d'),
+                'notes': description,
+            }
+            try:
+                store.add_expense(user, fields)
                 st.success(f"تم إضافة مصروف {amount} جنيه في فئة {category}")
                 st.rerun()
-            else:
-                st.warning("من فضلك أدخل مبلغ صحيح")
+            except core.ValidationError as e:
+                st.warning(str(e))
     
     st.markdown("---")
     
     # عرض الإحصائيات
-    if user_data['expenses']:
-        total = calculate_total(user_data['expenses'])
+    version = store.data_version(user)
+    try:
+        view = expense_view(user, version, date.today().isoformat(), store)
+    except analytics.StaleVersion:
+        # جلسة أخرى عدلت البيانات الآن: إعادة التشغيل بالنسخة الجديدة
+        st.rerun()
+    if view['summary']['count']:
+        summary = view['summary']
+        total = summary['total']
         
-        col1, col2, col3 = st.columns(3)
+        col1, col2, col3, col4 = st.columns(4)
         with col1:
             st.metric("إجمالي المصروفات", f"{total:.2f} جنيه")
         with col2:
-            st.metric("عدد المصروفات", len(user_data['expenses']))
+            st.metric("عدد المصروفات", summary['count'])
         with col3:
-            avg = total / len(user_data['expenses'])
-            st.metric("متوسط المصروف", f"{avg:.2f} جنيه")
+            st.metric("متوسط المصروف", f"{summary['average']:.2f} جنيه")
+        with col4:
+            st.metric("الوسيط", f"{summary['median']:.2f} جنيه")
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("إنفاق آخر 7 أيام", f"{view['recent_7']:.2f} جنيه")
+        with col2:
+            st.metric("إنفاق آخر 30 يوم", f"{view['recent_30']:.2f} جنيه")
         
         st.markdown("---")
         
-        # جدول المصروفات
-        st.subheader("📊 سجل المصروفات")
+        col1, col2 = st.columns(2)
         
-        # تجميع حسب الفئة
-        categories = {}
-        for exp in user_data['expenses']:
-            cat = exp['category']
-            categories[cat] = categories.get(cat, 0) + float(exp['amount'])
+        with col1:
+            st.write("**المصروفات حسب الفئة:**")
+            for cat, values in view['by_type'].iterrows():
+                percentage = (values['sum'] / total) * 100 if total > 0 else 0
+                st.write(f"• {cat}: {values['sum']:.2f} جنيه ({percentage:.1f}%)")
         
-        col1, col2 = st.columns([2, 3])
+        with col2:
+            st.write("**حسب يوم الأسبوع:**")
+            st.bar_chart(view['by_weekday'])
+        
+        # جدول المصروفات: الفلترة والترتيب والتقسيم لصفحات على الخادم
+        st.subheader("📊 سجل المصروفات")
         
+        col1, col2, col3 = st.columns([2, 2, 3])
         with col1:
-            st.write("**المصروفات حسب الفئة:**")
-            for cat, amount in sorted(categories.items(), key=lambda x: x[1], reverse=True):
-                percentage = (amount / total) * 100
-                st.write(f"• {cat}: {amount:.2f} جنيه ({percentage:.1f}%)")
+            period = st.date_input("الفترة", value=(), key="table_period")
+        with col2:
+            categories = st.multiselect("الفئات", CATEGORIES, key="table_categories")
+        with col3:
+            text = st.text_input("بحث في الوصف", key="table_text").strip()
         
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            sort_label = st.selectbox("ترتيب حسب", list(SORT_COLUMNS), key="table_sort")
         with col2:
-            import pandas as pd
-            df = pd.DataFrame(user_data['expenses'])
-            st.dataframe(
-                df[['date', 'category', 'amount', 'description']].sort_values('date', ascending=False),
-                use_container_width=True,
-                hide_index=True
-            )
+            descending = st.toggle("تنازلي", value=True, key="table_descending")
+        with col3:
+            page_size = st.selectbox("صفوف في الصفحة", PAGE_SIZES, key="table_page_size")
+        
+        # مدى غير مكتمل (يوم البداية فقط) يعني من هذا اليوم بلا نهاية
+        start = period[0].isoformat() if len(period) > 0 else None
+        end = period[1].isoformat() if len(period) > 1 else None
+        try:
+            positions, totals = table_query(user, version, start, end, tuple(categories), text,
+                                            SORT_COLUMNS[sort_label], descending, store)
+        except analytics.StaleVersion:
+            st.rerun()
+        
+        pages = max(1, -(-totals['count'] // page_size))
+        # الفلتر الجديد قد يقلل عدد الصفحات عن الصفحة المعروضة
+        if st.session_state.get("table_page", 1) > pages:
+            st.session_state.table_page = pages
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            page = st.number_input("الصفحة", min_value=1, max_value=pages, value=1, step=1, key="table_page")
+        with col2:
+            st.write(f"**{totals['count']} مصروف بإجمالي {totals['total']:.2f} جنيه** — صفحة {page} من {pages}")
+        
+        try:
+            # نفس نسخة المواقع؛ حذف من جلسة أخرى بينهما يجعل المواقع تشير لصفوف أخرى
+            rows = analytics.for_user(store, user, version).page(positions, page, page_size)
+        except analytics.StaleVersion:
+            st.rerun()
+        st.dataframe(
+            rows,
+            use_container_width=True,
+            hide_index=True
+        )
+        
+        st.write("**الإنفاق المتحرك (7 و30 يوم):**")
+        st.line_chart(view['rolling'])
         
         # حذف المصروفات
         st.markdown("---")
         if st.button("🗑️ حذف جميع المصروفات", type="secondary"):
-            user_data['expenses'] = []
-            save_data(st.session_state.users_data)
+            store.clear_expenses(user)
             st.success("تم حذف جميع المصروفات")
             st.rerun()
     
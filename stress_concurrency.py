@@ -0,0 +1,92 @@
+"""اختبار ضغط للكتابة المتزامنة: عدة عمليات تضيف مصاريف لنفس المستخدم في نفس الوقت
+
+    python stress_concurrency.py --workers 8 --adds 200 --mode journal
+    python stress_concurrency.py --all-modes --write-behind
+
+في النهاية يقرأ الملفات من جديد ويتأكد أن كل مصروف أضافته كل عملية موجود مرة واحدة
+بالضبط. يعيد 0 إذا لم يضع أي مصروف، و1 غير ذلك. البيانات تكتب في مجلد مؤقت.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+import storage
+
+USERNAME = 'stress'
+MODES = storage.MODES
+
+
+def worker(users_file: str, mode: str, worker_id: int, adds: int, write_behind: bool) -> int:
+    """إضافة adds مصروفاً مع فترات انتظار عشوائية قصيرة لخلط الكتابات بين العمليات"""
+    store = storage.open_store(users_file, mode=mode)
+    store.load()
+    if write_behind:
+        store.start_write_behind(delay=0.01)
+    for i in range(adds):
+        store.add_expense(USERNAME, {
+            'date': '2026-01-01',
+            'from': f'worker-{worker_id}',
+            'to': 'stress',
+            'type': 'أخرى',
+            'payment_method': 'نقدي',
+            'amount': 1.0,
+            'notes': f'{worker_id}:{i}',
+        })
+        if random.random() < 0.2:
+            time.sleep(random.random() / 1000)
+    store.close()
+    return adds
+
+
+def run(mode: str, workers: int, adds: int, write_behind: bool) -> bool:
+    with tempfile.TemporaryDirectory() as directory:
+        users_file = os.path.join(directory, 'users_data.json')
+        store = storage.open_store(users_file, mode=mode)
+        store.load()
+        store.add_user(USERNAME, {'name': USERNAME})
+        store.close()
+
+        started = time.time()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker, users_file, mode, w, adds, write_behind) for w in range(workers)]
+            for future in futures:
+                future.result()
+        elapsed = time.time() - started
+
+        store = storage.open_store(users_file, mode=mode)
+        store.load()
+        notes = Counter(expense.get('notes') for expense in store.user_expenses(USERNAME))
+        store.close()
+
+    expected = {f'{w}:{i}' for w in range(workers) for i in range(adds)}
+    missing = expected - set(notes)
+    duplicated = [note for note, count in notes.items() if count > 1]
+    ok = not missing and not duplicated and len(notes) == len(expected)
+    print(f"{mode:8} write-behind={write_behind!s:5} {workers}x{adds}: "
+          f"{sum(notes.values())}/{len(expected)} مصروف، مفقود {len(missing)}، مكرر {len(duplicated)} "
+          f"({elapsed:.1f} ث) {'✓' if ok else '✗'}")
+    return ok
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="اختبار ضغط للكتابة المتزامنة من عدة عمليات")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--adds', type=int, default=200, help="عدد الإضافات لكل عملية")
+    parser.add_argument('--mode', default=storage.default_mode(), choices=MODES)
+    parser.add_argument('--all-modes', action='store_true')
+    parser.add_argument('--write-behind', action='store_true', help="تفعيل الحفظ المؤجل كما في التطبيق")
+    args = parser.parse_args(argv)
+
+    modes = MODES if args.all_modes else [args.mode]
+    results = [run(mode, args.workers, args.adds, args.write_behind) for mode in modes]
+    return 0 if all(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
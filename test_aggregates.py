@@ -0,0 +1,71 @@
+"""اختبارات الإجماليات المحدثة مع كل عملية: يجب أن تطابق إعادة الحساب من المصاريف (queries.statistics)"""
+import json
+
+import pytest
+
+import queries
+import storage
+from aggregates import Aggregates
+
+EXPENSES = [
+    {'id': 'e0', 'date': '2025-01-05', 'type': 'أوبر', 'payment_method': 'نقدي', 'amount': 10.0},
+    {'id': 'e1', 'date': '2025-01-20', 'type': 'أوبر', 'payment_method': 'فيزا', 'amount': 30.0},
+    {'id': 'e2', 'date': '2025-02-01', 'type': 'مترو', 'payment_method': 'نقدي', 'amount': 5.0},
+]
+
+
+def assert_matches(statistics, expenses):
+    expected = queries.statistics(expenses)
+    for key in ('total', 'count', 'average', 'max', 'min'):
+        assert statistics[key] == pytest.approx(expected[key])
+    for key in ('by_type', 'by_payment'):
+        assert statistics[key] == pytest.approx(expected[key])
+
+
+def test_initial_statistics():
+    aggregates = Aggregates(EXPENSES)
+    assert aggregates.totals() == (45.0, 3)
+    assert_matches(aggregates.statistics(), EXPENSES)
+
+
+def test_operations_match_recompute():
+    expenses = [dict(e) for e in EXPENSES]
+    aggregates = Aggregates(expenses)
+    added = {'id': 'e3', 'date': '2025-02-03', 'type': 'تاكسي', 'payment_method': 'فيزا', 'amount': 50.0}
+    aggregates.apply({'op': 'add', 'expense': added})
+    expenses.append(added)
+    changed = dict(expenses[0], amount=1.0)
+    aggregates.apply({'op': 'update', 'id': 'e0', 'expense': changed}, expenses[0])
+    expenses[0] = changed
+    aggregates.apply({'op': 'delete', 'id': 'e2'}, expenses[2])
+    del expenses[2]
+    assert_matches(aggregates.statistics(), expenses)
+    # آخر مصروف من النوع يحذف مفتاحه
+    assert 'مترو' not in aggregates.statistics()['by_type']
+
+
+def test_empty_after_deleting_everything():
+    aggregates = Aggregates(EXPENSES)
+    for expense in EXPENSES:
+        aggregates.apply({'op': 'delete', 'id': expense['id']}, expense)
+    statistics = aggregates.statistics()
+    assert statistics['total'] == 0.0 and statistics['count'] == 0
+    assert statistics['max'] == 0 and statistics['min'] == 0
+    assert statistics['by_type'] == {} and statistics['by_payment'] == {}
+
+
+@pytest.mark.parametrize('mode', storage.MODES)
+def test_store_statistics_follow_writes(tmp_path, mode):
+    path = tmp_path / 'users_data.json'
+    path.write_text(json.dumps({'ahmed': {'password': 'x', 'expenses': [dict(EXPENSES[0])]}}),
+                    encoding='utf-8')
+    store = storage.open_store(str(path), mode=mode)
+    store.load()
+    store.build_indexes('ahmed')
+    store.add_expense('ahmed', dict(EXPENSES[1]))
+    expense_id = store.add_expense('ahmed', dict(EXPENSES[2]))
+    store.update_expense('ahmed', 'e0', dict(EXPENSES[0], amount=2.0))
+    store.delete_expense('ahmed', expense_id)
+    assert store.totals('ahmed') == (pytest.approx(32.0), 2)
+    assert_matches(store.statistics('ahmed'), store.user_expenses('ahmed'))
+    store.close()
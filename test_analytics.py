@@ -0,0 +1,124 @@
+"""اختبارات التحليلات: الإحصائيات المتجهة والجدول والذاكرة المؤقتة لكل نسخة بيانات"""
+import gc
+import json
+import weakref
+
+import pytest
+
+pytest.importorskip('pandas')
+
+import analytics  # noqa: E402
+import storage  # noqa: E402
+
+EXPENSES = [
+    {'date': '2025-01-06', 'from': 'البيت', 'to': 'العمل', 'type': 'أوبر', 'amount': 40.0},
+    {'date': '2025-1-7', 'from': 'العمل', 'to': 'البيت', 'type': 'مترو', 'amount': 10.0},
+    {'date': '2025-01-13', 'from': 'البيت', 'to': 'العمل', 'type': 'أوبر', 'amount': 60.0, 'notes': 'مطار'},
+    {'date': 'bad', 'from': '', 'to': '', 'type': 'أخرى', 'amount': 5.0},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    users_file = tmp_path / 'users_data.json'
+    users = {'ahmed': {'password': 'x', 'expenses': [dict(exp) for exp in EXPENSES]},
+             'mona': {'password': 'y', 'expenses': []}}
+    users_file.write_text(json.dumps(users, ensure_ascii=False), encoding='utf-8')
+    store = storage.open_store(str(users_file), mode='json')
+    store.load()
+    yield store
+    store.close()
+
+
+def test_summary_and_groups():
+    result = analytics.Analytics(EXPENSES)
+    summary = result.summary()
+    assert (summary['total'], summary['count'], summary['median']) == (115.0, 4, 25.0)
+    assert result.by_column('type')['sum'].to_dict() == {'أوبر': 100.0, 'مترو': 10.0, 'أخرى': 5.0}
+    # 2025-01-06 و2025-01-13 يوما إثنين
+    assert result.by_weekday().loc['الإثنين', 'sum'] == 100.0
+    assert analytics.Analytics([]).summary()['count'] == 0
+
+
+def test_table_query_and_page():
+    result = analytics.Analytics(EXPENSES)
+    positions = result.query(start='2025-01-01', end='2025-01-10', sort='amount', descending=True)
+    assert positions.tolist() == [0, 1]
+    assert result.totals(positions) == {'total': 50.0, 'count': 2}
+    # التاريخ غير الصحيح في آخر الترتيب
+    assert result.query(sort='date', descending=False).tolist() == [0, 1, 2, 3]
+    assert result.query(text='مطار').tolist() == [2]
+    assert result.page(result.query(sort='amount'), 2, 2)['amount'].tolist() == [10.0, 5.0]
+
+
+def test_rebuilt_only_when_version_changes(store):
+    first = analytics.for_user(store, 'ahmed')
+    assert analytics.for_user(store, 'ahmed') is first
+    store.add_expense('ahmed', {'date': '2025-02-01', 'from': 'a', 'to': 'b', 'type': 'تاكسي', 'amount': 1.0})
+    second = analytics.for_user(store, 'ahmed')
+    assert second is not first
+    assert second.summary()['count'] == 5
+
+
+def test_stale_version_raises(store):
+    store.build_indexes('ahmed')
+    version = store.data_version('ahmed')
+    analytics.for_user(store, 'ahmed', version)
+    store.delete_expense('ahmed', store.user_expenses('ahmed')[0]['id'])
+    with pytest.raises(analytics.StaleVersion):
+        analytics.for_user(store, 'ahmed', version)
+
+
+def test_cache_bounded_and_dropped_with_store(store, monkeypatch):
+    monkeypatch.setattr(analytics, 'MAX_CACHED_USERS', 1)
+    analytics.for_user(store, 'ahmed')
+    analytics.for_user(store, 'mona')
+    assert list(analytics._cache[store]) == ['mona']
+
+    other = storage.open_store(store.users_file, mode='json')
+    other.load()
+    analytics.for_user(other, 'ahmed')
+    assert other in analytics._cache
+    # الذاكرة المؤقتة لا تبقي المخزن حياً، ومدخله يسقط معه
+    alive = weakref.ref(other)
+    del other
+    gc.collect()
+    assert alive() is None
+
+
+def test_matches_plain_statistics():
+    """نفس أرقام الإحصائيات المحسوبة بحلقة عادية (queries.statistics)"""
+    import random
+    import queries
+    rng = random.Random(4)
+    expenses = [{'date': f'2025-{rng.randrange(1, 13)}-{rng.randrange(1, 29)}', 'from': 'a', 'to': 'b',
+                 'type': rng.choice(['أوبر', 'مترو', 'تاكسي']), 'payment_method': rng.choice(['نقدي', 'فيزا']),
+                 'amount': round(rng.uniform(1, 500), 2)} for _ in range(500)]
+    expected = queries.statistics(expenses)
+    summary = analytics.Analytics(expenses).summary()
+    for key in ('total', 'count', 'average', 'max', 'min'):
+        assert summary[key] == pytest.approx(expected[key])
+    result = analytics.Analytics(expenses)
+    assert result.by_column('type')['sum'].to_dict() == pytest.approx(expected['by_type'])
+    assert result.by_column('payment_method')['sum'].to_dict() == pytest.approx(expected['by_payment'])
+
+
+def test_daily_and_rolling():
+    result = analytics.Analytics(EXPENSES)
+    daily = result.daily()
+    # من أول يوم لآخر يوم، والأيام بدون مصاريف = 0 (التاريخ غير الصحيح لا يدخل)
+    assert len(daily) == 8
+    assert daily.sum() == 110.0
+    rolling = result.rolling(7)
+    # نافذة 7 أيام تنتهي في 13 يناير تشمل 7 يناير
+    assert rolling.iloc[-1] == 70.0
+    assert rolling.loc['2025-01-07'] == 50.0
+    assert analytics.Analytics([]).recent_spend(7) == 0.0
+
+
+def test_routes_and_percentiles():
+    result = analytics.Analytics(EXPENSES)
+    routes = result.by_route()
+    assert routes.loc['البيت ← العمل', 'sum'] == 100.0
+    assert '' not in routes.index
+    assert result.summary()['percentiles'][0.5] == 25.0
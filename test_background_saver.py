@@ -0,0 +1,102 @@
+"""اختبارات الحفظ المؤجل: تجميع الكتابات وعدم فقد التغييرات عند فشل الكتابة"""
+import json
+import time
+
+import pytest
+
+import storage
+
+EXPENSE = {'date': '2025-01-05', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': 10.0}
+
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = tmp_path / 'users_data.json'
+    path.write_text(json.dumps({'ahmed': {'password': 'x', 'expenses': []}}), encoding='utf-8')
+    return str(path)
+
+
+def open_store(users_file, mode):
+    store = storage.open_store(users_file, mode=mode)
+    store.load()
+    return store
+
+
+def amounts(users_file, mode):
+    store = open_store(users_file, mode)
+    try:
+        return [expense['amount'] for expense in store.user_expenses('ahmed')]
+    finally:
+        store.close()
+
+
+def failing_writes(store, count):
+    """أول count كتابات تفشل كما يفشل قفل الملفات أو القرص مؤقتاً"""
+    write = store.write
+    calls = []
+
+    def flaky(records):
+        calls.append(len(records))
+        if len(calls) <= count:
+            raise OSError("القرص مشغول")
+        write(records)
+
+    store.write = flaky
+    return calls
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sharded'])
+def test_changes_written_on_close(users_file, mode):
+    store = open_store(users_file, mode)
+    store.start_write_behind(delay=10)
+    for amount in (1.0, 2.0, 3.0):
+        store.add_expense('ahmed', dict(EXPENSE, amount=amount))
+    # الكتابة لم تتم بعد، لكن الذاكرة محدثة
+    assert [expense['amount'] for expense in store.user_expenses('ahmed')] == [1.0, 2.0, 3.0]
+    store.close()
+    assert amounts(users_file, mode) == [1.0, 2.0, 3.0]
+
+
+def test_burst_written_once(users_file):
+    store = open_store(users_file, 'journal')
+    calls = failing_writes(store, 0)
+    store.start_write_behind(delay=10)
+    for amount in (1.0, 2.0, 3.0):
+        store.add_expense('ahmed', dict(EXPENSE, amount=amount))
+    store.flush()
+    assert calls == [3]
+    store.close()
+
+
+def test_failed_write_retried(users_file, monkeypatch):
+    monkeypatch.setattr(storage, 'RETRY_DELAY', 0.01)
+    store = open_store(users_file, 'journal')
+    calls = failing_writes(store, 2)
+    errors = []
+    store.start_write_behind(on_error=errors.append, delay=0)
+    store.add_expense('ahmed', dict(EXPENSE, amount=1.0))
+    store.add_expense('ahmed', dict(EXPENSE, amount=2.0))
+
+    # خيط الحفظ يعيد المحاولة بنفسه بدون flush
+    deadline = time.monotonic() + 5
+    while len(calls) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    store.close()
+    assert len(calls) >= 3
+    # رسالة واحدة للمستخدم لكل سلسلة فشل
+    assert len(errors) == 1
+    assert amounts(users_file, 'journal') == [1.0, 2.0]
+
+
+def test_flush_reports_unsaved(users_file):
+    store = open_store(users_file, 'journal')
+    failing_writes(store, 1)
+    store.start_write_behind(delay=10)
+    store.add_expense('ahmed', dict(EXPENSE, amount=1.0))
+
+    with pytest.raises(storage.UnsavedChanges) as error:
+        store.close()
+    assert error.value.count == 1
+    # المعلق باق، والمحاولة التالية (flush يعيدها فوراً) تنجح
+    store.close()
+    assert amounts(users_file, 'journal') == [1.0]
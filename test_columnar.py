@@ -0,0 +1,74 @@
+"""اختبارات صيغة الأعمدة: كل ما يكتب يقرأ كما هو، بما في ذلك المصاريف في overflow"""
+import os
+
+import pytest
+
+import columnar
+import storage
+
+EXPENSE = {
+    'date': '2025-01-05', 'from': 'البيت', 'to': 'العمل', 'type': 'أوبر',
+    'payment_method': 'نقدي', 'amount': 85.5, 'notes': '', 'receipt': None,
+    'added_at': '2025-01-05 09:30:00',
+}
+
+
+def round_trip(users_data):
+    return columnar.decode(columnar.encode(users_data))
+
+
+def test_round_trip_columns():
+    users = {'ahmed': {'name': 'Ahmed', 'expenses': [
+        EXPENSE,
+        dict(EXPENSE, id='0' * 31 + '1', updated_at='2025-01-06 10:00:00', receipt='r.png'),
+    ]}}
+    assert round_trip(users) == users
+
+
+def test_round_trip_overflow_rows():
+    # بدون added_at وتاريخ بدون أصفار ومبلغ صحيح: لا يمثل بالأعمدة
+    odd = {'date': '2025-1-5', 'from': 'a', 'to': 'b', 'amount': 10, 'notes': 'x'}
+    users = {'mona': {'expenses': [EXPENSE, odd, dict(EXPENSE, extra=1)]}}
+    assert round_trip(users) == users
+
+
+def test_round_trip_all_overflow_user():
+    # كل المصاريف overflow: القواميس فارغة
+    users = {'marwan': {'password': 'x', 'expenses': [
+        {'date': '2025-01-01', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': 5.0},
+        {'date': '2025-01-02', 'from': 'c', 'to': 'd', 'type': 'مترو', 'amount': 7.0},
+    ]}}
+    assert round_trip(users) == users
+
+
+def test_round_trip_empty_and_without_expenses():
+    users = {'a': {'expenses': []}, 'b': {'name': 'B'}}
+    assert round_trip(users) == users
+
+
+def test_sharded_columnar_all_overflow(tmp_path, monkeypatch):
+    monkeypatch.setenv('EXPENSE_SNAPSHOT_FORMAT', 'columnar')
+    users_file = str(tmp_path / 'users_data.json')
+    expenses = [{'date': '2025-01-01', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': 5.0}]
+    with open(users_file, 'wb') as f:
+        f.write(storage.dump_users({'marwan': {'password': 'x', 'expenses': expenses}}))
+
+    store = storage.ShardedStore(users_file)
+    store.load()
+    assert len(store.user_expenses('marwan')) == 1
+    store.close()
+
+    store = storage.ShardedStore(users_file)
+    store.load()
+    assert [e['amount'] for e in store.user_expenses('marwan')] == [5.0]
+    store.close()
+
+
+def test_unreadable_checkpoint_raises(tmp_path):
+    users_file = str(tmp_path / 'users_data.json')
+    with open(users_file, 'wb') as f:
+        f.write(columnar.MAGIC + b'\xff\xff')
+    store = storage.JsonStore(users_file, str(tmp_path / 'backup.json'))
+    with pytest.raises(ValueError):
+        store.load()
+    assert os.path.getsize(users_file) == len(columnar.MAGIC) + 2
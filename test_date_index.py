@@ -0,0 +1,52 @@
+"""اختبارات فهرس التاريخ: مدى التاريخ بنفس نتائج الفلترة الكاملة، مع التواريخ القديمة غير المكتملة"""
+import random
+
+import queries
+from date_index import DateIndex
+
+RANGES = [(None, None), ('2025-01-01', None), (None, '2025-1-31'), ('2025-02-01', '2025-02-28'),
+          ('2025-03-10', '2025-03-10'), ('2026-01-01', '2026-12-31'), ('bad', '2025-02-01')]
+
+
+def expense(rng, n):
+    day = rng.randrange(1, 90)
+    month, day = 1 + day // 30, day % 30 + 1
+    # بعض التواريخ القديمة بدون أصفار وبعضها غير صحيح
+    date = rng.choice([f'2025-{month:02d}-{day:02d}', f'2025-{month}-{day}', 'bad', ''])
+    return {'date': date, 'amount': float(n)}
+
+
+def same_results(index, expenses):
+    for start, end in RANGES:
+        expected = queries.filter_expenses(expenses, '', start, end) if start or end else [
+            exp for exp in expenses if queries.date_ordinal(exp['date']) is not None]
+        assert index.range(start, end) == expected, (start, end)
+        assert index.filter(expenses, start, end) == expected, (start, end)
+
+
+def test_matches_full_scan():
+    rng = random.Random(1)
+    expenses = [expense(rng, n) for n in range(300)]
+    same_results(DateIndex(expenses), expenses)
+
+
+def test_updates_keep_results():
+    rng = random.Random(2)
+    expenses = [expense(rng, n) for n in range(100)]
+    index = DateIndex(expenses)
+    for n in range(100, 250):
+        choice = rng.random()
+        if choice < 0.4:
+            new = expense(rng, n)
+            index.apply({'op': 'add', 'expense': new})
+            expenses.append(new)
+        elif choice < 0.7:
+            position = rng.randrange(len(expenses))
+            new = expense(rng, n)
+            index.apply({'op': 'update', 'expense': new}, expenses[position])
+            expenses[position] = new
+        else:
+            old = expenses.pop(rng.randrange(len(expenses)))
+            index.apply({'op': 'delete'}, old)
+    same_results(index, expenses)
+    assert index.entries == sorted(index.entries)
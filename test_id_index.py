@@ -0,0 +1,93 @@
+"""اختبارات فهرس المعرفات: مواضع صحيحة بعد الحذف والإضافة، ونفس الترتيب بعد إعادة الفتح"""
+import json
+import random
+
+import pytest
+
+import storage
+from id_index import IdIndex, assign_ids
+
+
+def expense(n):
+    return {'id': f'e{n}', 'date': '2025-01-05', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': float(n)}
+
+
+def check(index, expenses):
+    for position, item in enumerate(expenses):
+        assert index.position(item['id']) == position
+        assert index.get(item['id']) is item
+    assert len(index.positions) == len(expenses)
+
+
+def test_assign_ids_fills_missing_and_duplicates():
+    expenses = [{'amount': 1}, {'id': 'x', 'amount': 2}, {'id': 'x', 'amount': 3}]
+    assert assign_ids(expenses) == 2
+    assert expenses[1]['id'] == 'x'
+    assert len({item['id'] for item in expenses}) == 3
+
+
+def test_delete_moves_only_last():
+    users = {'ahmed': {'expenses': [expense(n) for n in range(5)]}}
+    expenses = users['ahmed']['expenses']
+    index = IdIndex(expenses)
+    record = {'op': 'delete', 'user': 'ahmed', 'id': 'e1'}
+    position = index.position('e1')
+    index.apply(record)
+    storage.apply_operation(users, record, position)
+    assert [item['id'] for item in expenses] == ['e0', 'e4', 'e2', 'e3']
+    check(index, expenses)
+    with pytest.raises(KeyError):
+        index.position('e1')
+
+
+def test_random_operations():
+    rng = random.Random(7)
+    users = {'ahmed': {'expenses': [expense(n) for n in range(50)]}}
+    expenses = users['ahmed']['expenses']
+    index = IdIndex(expenses)
+    next_id = 50
+    for _ in range(300):
+        choice = rng.random()
+        if choice < 0.4 and expenses:
+            record = {'op': 'delete', 'user': 'ahmed', 'id': rng.choice(expenses)['id']}
+        elif choice < 0.6 and expenses:
+            target = rng.choice(expenses)['id']
+            record = {'op': 'update', 'user': 'ahmed', 'id': target,
+                      'expense': dict(expense(0), id=target, amount=rng.random())}
+        else:
+            record = {'op': 'add', 'user': 'ahmed', 'expense': expense(next_id)}
+            next_id += 1
+        position = index.position(record['id']) if record['op'] != 'add' else None
+        index.apply(record)
+        storage.apply_operation(users, record, position)
+        check(index, expenses)
+
+
+def test_legacy_positional_delete_shifts():
+    """سجلات قديمة بدون معرف تحمل مواضع بعد الإزاحة"""
+    users = {'ahmed': {'expenses': [expense(n) for n in range(4)]}}
+    storage.apply_operation(users, {'op': 'delete', 'user': 'ahmed', 'index': 1})
+    storage.apply_operation(users, {'op': 'delete', 'user': 'ahmed', 'index': 1})
+    assert [item['id'] for item in users['ahmed']['expenses']] == ['e0', 'e3']
+
+
+@pytest.mark.parametrize('mode', ['json', 'journal', 'sharded'])
+def test_order_survives_reopen(tmp_path, mode):
+    users_file = tmp_path / 'users_data.json'
+    users_file.write_text(json.dumps({'ahmed': {'password': 'x', 'expenses': [expense(n) for n in range(6)]}}),
+                          encoding='utf-8')
+    store = storage.open_store(str(users_file), mode=mode)
+    store.load()
+    store.delete_expense('ahmed', 'e1')
+    store.delete_expense('ahmed', 'e3')
+    store.add_expense('ahmed', expense(9))
+    store.delete_expense('ahmed', 'e0')
+    in_memory = [item['id'] for item in store.user_expenses('ahmed')]
+    # بدون close: إعادة التشغيل من السجل كما بعد انقطاع
+    store.flush()
+    reopened = storage.open_store(str(users_file), mode=mode)
+    reopened.load()
+    assert [item['id'] for item in reopened.user_expenses('ahmed')] == in_memory
+    assert reopened.get_expense('ahmed', 'e9')['amount'] == 9.0
+    reopened.close()
+    store.close()
@@ -0,0 +1,39 @@
+"""اختبارات الاستيراد: نفس قواعد التحقق في نموذج إضافة مصروف (core)"""
+import pytest
+
+pd = pytest.importorskip('pandas')
+
+import importer  # noqa: E402
+
+
+def test_validate_uses_core_rules():
+    frame = pd.DataFrame({
+        'date': ['2025-1-5', '2025-01-20 00:00:00', '2025-13-01', '2025-02-01'],
+        'from': ['البيت', 'a', 'b', ''],
+        'to': ['العمل', 'c', 'd', 'e'],
+        'type': ['مترو', 'تاكسي', 'أوبر', 'طائرة'],
+        'amount': [' 8 ', '50.5', '10', '0'],
+    })
+    accepted, rejected = importer.validate(frame)
+
+    assert [(e['date'], e['amount'], e['payment_method']) for e in accepted] == [
+        ('2025-01-05', 8.0, 'نقدي'), ('2025-01-20', 50.5, 'نقدي')]
+    assert [line for line, _ in rejected] == [4, 5]
+    assert "YYYY-MM-DD" in rejected[0][1]
+    assert "من/إلى مطلوبان" in rejected[1][1]
+    assert "أكبر من صفر" in rejected[1][1]
+    assert "نوع مواصلة غير معروف" in rejected[1][1]
+
+
+def test_non_finite_amounts_rejected():
+    frame = pd.DataFrame({
+        'date': ['2025-01-05'] * 4,
+        'from': ['a'] * 4,
+        'to': ['b'] * 4,
+        'type': ['أوبر'] * 4,
+        'amount': ['nan', 'inf', '-Infinity', '12'],
+    })
+    accepted, rejected = importer.validate(frame)
+    assert [expense['amount'] for expense in accepted] == [12.0]
+    assert [line for line, _ in rejected] == [2, 3, 4]
+    assert all("رقماً" in reasons for _, reasons in rejected)
@@ -0,0 +1,99 @@
+"""اختبارات التخزين بالسجل الإلحاقي: كل تغيير سطر في السجل بدلاً من إعادة كتابة ملف البيانات"""
+import json
+
+import pytest
+
+import storage
+
+EXPENSE = {'date': '2025-01-05', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': 10.0}
+
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = tmp_path / 'users_data.json'
+    users = {'ahmed': {'password': 'x', 'expenses': [dict(EXPENSE, id='e0')]}}
+    path.write_text(json.dumps(users), encoding='utf-8')
+    return path
+
+
+def open_store(users_file, **options):
+    store = storage.JournalStore(str(users_file), **options)
+    store.load()
+    return store
+
+
+def journal_lines(store):
+    with open(store.journal_file, 'rb') as f:
+        return f.read().splitlines()
+
+
+def amounts(store):
+    return [expense['amount'] for expense in store.user_expenses('ahmed')]
+
+
+def test_change_appends_one_line(users_file):
+    before = users_file.read_bytes()
+    store = open_store(users_file)
+    store.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    store.update_user('ahmed', {'name': 'Ahmed'})
+
+    assert users_file.read_bytes() == before
+    header, *records = journal_lines(store)
+    assert [json.loads(line)['op'] for line in records] == ['add', 'user']
+    store.discard()
+
+
+def test_replay_after_crash(users_file):
+    store = open_store(users_file)
+    store.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    store.delete_expense('ahmed', 'e0')
+    # بدون close: كما لو انقطع التطبيق
+    store.discard()
+
+    reopened = open_store(users_file)
+    assert amounts(reopened) == [20.0]
+    reopened.close()
+
+
+def test_torn_line_ignored_and_truncated(users_file):
+    store = open_store(users_file)
+    store.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    store.discard()
+    with open(store.journal_file, 'ab') as f:
+        f.write(b'{"op": "add", "user": "ah')
+
+    reopened = open_store(users_file)
+    assert amounts(reopened) == [10.0, 20.0]
+    reopened.add_expense('ahmed', dict(EXPENSE, amount=30.0))
+    assert all(line.endswith(b'}') for line in journal_lines(reopened))
+    reopened.discard()
+    assert amounts(open_store(users_file)) == [10.0, 20.0, 30.0]
+
+
+def test_checkpoint_every(users_file):
+    store = open_store(users_file, checkpoint_every=3)
+    for amount in (1.0, 2.0, 3.0):
+        store.add_expense('ahmed', dict(EXPENSE, amount=amount))
+    # الضغط بعد ثالث عملية: السجل عاد للسطر الأول فقط والملف يحتوي الكل
+    assert len(journal_lines(store)) == 1
+    saved = json.loads(users_file.read_text(encoding='utf-8'))
+    assert [expense['amount'] for expense in saved['ahmed']['expenses']] == [10.0, 1.0, 2.0, 3.0]
+    store.close()
+
+
+def test_close_compacts(users_file):
+    store = open_store(users_file)
+    store.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    store.close()
+    assert len(journal_lines(store)) == 1
+    saved = json.loads(users_file.read_text(encoding='utf-8'))
+    assert [expense['amount'] for expense in saved['ahmed']['expenses']] == [10.0, 20.0]
+
+
+def test_journal_of_other_checkpoint_ignored(users_file):
+    store = open_store(users_file)
+    store.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    store.discard()
+    # ملف البيانات استبدل (نسخة قديمة من التطبيق مثلاً): السجل لا ينتمي له
+    users_file.write_text(json.dumps({'ahmed': {'password': 'x', 'expenses': []}}), encoding='utf-8')
+    assert amounts(open_store(users_file)) == []
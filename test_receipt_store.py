@@ -0,0 +1,54 @@
+"""اختبارات مخزن الإيصالات: إزالة التكرار وعملية التنظيف"""
+import json
+import os
+import time
+
+import storage
+from receipt_store import ReceiptStore, main
+
+
+def test_same_content_stored_once(tmp_path):
+    receipts = ReceiptStore(str(tmp_path / 'receipts'))
+    first = tmp_path / 'a.png'
+    second = tmp_path / 'b.PNG'
+    first.write_bytes(b'receipt')
+    second.write_bytes(b'receipt')
+    assert receipts.put(str(first)) == receipts.put(str(second))
+
+
+def test_put_existing_refreshes_mtime(tmp_path):
+    """إيصال قديم أرفق من جديد لا يحذفه التنظيف قبل حفظ مصروفه"""
+    receipts = ReceiptStore(str(tmp_path / 'receipts'))
+    source = tmp_path / 'receipt.jpg'
+    source.write_bytes(b'receipt')
+    reference = receipts.put(str(source))
+    old = time.time() - 2 * 3600
+    os.utime(receipts.path(reference), (old, old))
+
+    assert receipts.put(str(source)) == reference
+    assert receipts.collect_garbage([]) == 0
+    assert os.path.exists(receipts.path(reference))
+
+
+def test_gc_reads_requested_mode(tmp_path, monkeypatch):
+    """المراجع تقرأ من نوع التخزين المعطى وليس من متغير البيئة"""
+    monkeypatch.chdir(tmp_path)
+    receipts = ReceiptStore()
+    source = tmp_path / 'receipt.jpg'
+    source.write_bytes(b'receipt')
+    reference = receipts.put(str(source))
+    old = time.time() - 2 * 3600
+    os.utime(receipts.path(reference), (old, old))
+
+    # ملف JSON القديم بدون إيصال؛ المرجع محفوظ في قاعدة SQLite فقط
+    users = {'ahmed': {'password': 'x', 'expenses': []}}
+    (tmp_path / 'users_data.json').write_text(json.dumps(users), encoding='utf-8')
+    store = storage.open_store('users_data.json', mode='sqlite')
+    store.load()
+    store.add_expense('ahmed', {'date': '2025-01-05', 'from': 'a', 'to': 'b', 'type': 'أوبر',
+                                'amount': 10.0, 'receipt': reference})
+    store.close()
+
+    monkeypatch.setenv('EXPENSE_STORAGE', 'json')
+    assert main(['--gc', '--mode', 'sqlite']) == 0
+    assert os.path.exists(receipts.path(reference))
@@ -0,0 +1,129 @@
+"""اختبارات التجميع الشهري: التحديث مع كل عملية وحفظه بجانب ملف البيانات وإعادة بنائه عند عدم التطابق"""
+import json
+
+import pytest
+
+import storage
+from rollup import NO_MONTH, MonthlyRollup
+
+EXPENSES = [
+    {'id': 'e0', 'date': '2025-01-05', 'type': 'أوبر', 'payment_method': 'نقدي', 'amount': 10.0},
+    {'id': 'e1', 'date': '2025-01-20', 'type': 'أوبر', 'payment_method': 'فيزا', 'amount': 30.0},
+    {'id': 'e2', 'date': '2025-02-01', 'type': 'مترو', 'payment_method': 'نقدي', 'amount': 5.0},
+    {'id': 'e3', 'date': 'bad', 'type': 'تاكسي', 'payment_method': 'نقدي', 'amount': 7.0},
+]
+
+
+def cells(rollup):
+    return {key: (pytest.approx(amount), count) for key, (amount, count) in rollup.cells.items()}
+
+
+def test_summary_and_trend():
+    rollup = MonthlyRollup(EXPENSES)
+    assert rollup.months() == ['2025-02', '2025-01']
+    january = rollup.summary('2025-01')
+    assert january['total'] == 40.0 and january['count'] == 2
+    assert january['by_payment'] == {'نقدي': 10.0, 'فيزا': 30.0}
+    # التاريخ غير الصحيح يدخل في الإجمالي فقط
+    assert rollup.summary()['total'] == 52.0
+    assert rollup.trend() == [('2025-01', 40.0, 2), ('2025-02', 5.0, 1)]
+    assert (NO_MONTH, 'تاكسي', 'نقدي') in rollup.cells
+
+
+def test_incremental_matches_rebuild():
+    expenses = [dict(e) for e in EXPENSES]
+    rollup = MonthlyRollup(expenses)
+    changed = dict(expenses[1], date='2025-03-02', amount=12.5)
+    rollup.apply({'op': 'update', 'id': 'e1', 'expense': changed}, expenses[1])
+    expenses[1] = changed
+    rollup.apply({'op': 'delete', 'id': 'e2'}, expenses[2])
+    del expenses[2]
+    added = {'id': 'e4', 'date': '2025-01-09', 'type': 'أوبر', 'payment_method': 'نقدي', 'amount': 4.0}
+    rollup.apply({'op': 'add', 'expense': added})
+    expenses.append(added)
+    assert cells(rollup) == cells(MonthlyRollup(expenses))
+    # الخلية الفارغة تحذف ولا تبقى بعدد صفر
+    assert ('2025-02', 'مترو', 'نقدي') not in rollup.cells
+
+
+def test_json_round_trip():
+    rollup = MonthlyRollup(EXPENSES)
+    restored = MonthlyRollup.from_json(json.loads(json.dumps(rollup.to_json())))
+    assert restored.cells == rollup.cells
+
+
+# ==================== الحفظ بجانب ملف البيانات ====================
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = tmp_path / 'users_data.json'
+    users = {'ahmed': {'password': 'x', 'expenses': [dict(e) for e in EXPENSES[:2]]}}
+    path.write_text(json.dumps(users), encoding='utf-8')
+    return path
+
+
+def saved_rollup(store, total):
+    """ملف التجميع بنفس البصمة وخلية مختلفة عن البيانات، ليظهر إن قرئ من الملف أو بني من المصاريف"""
+    with open(store.rollup_file, encoding='utf-8') as f:
+        saved = json.load(f)
+    saved['users']['ahmed'] = [['2025-01', 'أوبر', 'نقدي', total, 1]]
+    with open(store.rollup_file, 'w', encoding='utf-8') as f:
+        json.dump(saved, f)
+
+
+def test_checkpoint_saves_rollup(users_file):
+    store = storage.open_store(str(users_file), mode='json')
+    store.load()
+    store.build_indexes('ahmed')
+    store.add_expense('ahmed', dict(EXPENSES[2]))
+    with open(store.rollup_file, encoding='utf-8') as f:
+        saved = json.load(f)
+    restored = MonthlyRollup.from_json(saved['users']['ahmed'])
+    assert cells(restored) == cells(MonthlyRollup(store.user_expenses('ahmed')))
+
+
+def test_reopen_reuses_saved_rollup(users_file):
+    store = storage.open_store(str(users_file), mode='json')
+    store.load()
+    store.build_indexes('ahmed')
+    store.add_expense('ahmed', dict(EXPENSES[2]))
+    saved_rollup(store, 999.0)
+
+    reopened = storage.open_store(str(users_file), mode='json')
+    reopened.load()
+    assert reopened.user_rollup('ahmed').summary()['total'] == 999.0
+
+
+def test_rebuilt_when_data_file_changed(users_file):
+    store = storage.open_store(str(users_file), mode='json')
+    store.load()
+    store.build_indexes('ahmed')
+    store.add_expense('ahmed', dict(EXPENSES[2]))
+    saved_rollup(store, 999.0)
+    # عملية أخرى (أو انقطاع بعد ملف البيانات) غيرت البيانات بدون ملف التجميع
+    users = json.loads(users_file.read_text(encoding='utf-8'))
+    users['ahmed']['expenses'].append(dict(EXPENSES[3]))
+    users_file.write_text(json.dumps(users), encoding='utf-8')
+
+    reopened = storage.open_store(str(users_file), mode='json')
+    reopened.load()
+    assert reopened.user_rollup('ahmed').summary()['total'] == 52.0
+
+
+def test_journal_records_force_rebuild(users_file):
+    store = storage.open_store(str(users_file), mode='journal')
+    store.load()
+    store.build_indexes('ahmed')
+    store.add_expense('ahmed', dict(EXPENSES[2]))
+    store.close()
+    saved_rollup(store, 999.0)
+
+    # الملف يطابق نقطة الحفظ، لكن السجل فوقها فيه عمليات لا يحتويها
+    store = storage.open_store(str(users_file), mode='journal')
+    store.load()
+    store.add_expense('ahmed', dict(EXPENSES[3]))
+    reopened = storage.open_store(str(users_file), mode='journal')
+    reopened.load()
+    assert reopened.journal_records == 1
+    assert reopened.user_rollup('ahmed').summary()['total'] == 52.0
+    store.close()
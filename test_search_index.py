@@ -0,0 +1,56 @@
+"""اختبارات فهرس البحث: نفس نتائج الفلترة الكاملة (queries.filter_expenses) بعد أي تعديل"""
+import random
+
+import queries
+from search_index import SearchIndex
+
+PLACES = ['البيت', 'العمل', 'مطار القاهرة', 'Cairo Airport', 'مدينة نصر', 'الجامعة']
+TYPES = ['أوبر', 'كريم', 'مترو', 'تاكسي']
+NOTES = ['', 'اجتماع عميل', 'Meeting with client', 'سفر']
+QUERIES = ['', 'ال', 'مطار', 'airport', 'cairo air', 'ort', 'عميل', 'اجتماع عم', 'xyz', 'أوبر', 'نصر']
+
+
+def expense(rng, n):
+    return {'date': '2025-01-05', 'from': rng.choice(PLACES), 'to': rng.choice(PLACES),
+            'type': rng.choice(TYPES), 'notes': rng.choice(NOTES), 'amount': float(n)}
+
+
+def same_results(index, expenses):
+    for text in QUERIES:
+        assert index.search(text) == queries.filter_expenses(expenses, text), text
+
+
+def test_matches_full_scan():
+    rng = random.Random(3)
+    expenses = [expense(rng, n) for n in range(200)]
+    same_results(SearchIndex(expenses), expenses)
+
+
+def test_updates_keep_results():
+    rng = random.Random(5)
+    expenses = [expense(rng, n) for n in range(100)]
+    index = SearchIndex(expenses)
+    for n in range(100, 200):
+        if rng.random() < 0.5:
+            new = expense(rng, n)
+            index.apply({'op': 'add', 'expense': new})
+            expenses.append(new)
+        elif rng.random() < 0.5:
+            position = rng.randrange(len(expenses))
+            new = expense(rng, n)
+            index.apply({'op': 'update', 'expense': new}, expenses[position])
+            expenses[position] = new
+        else:
+            old = expenses.pop(rng.randrange(len(expenses)))
+            index.apply({'op': 'delete'}, old)
+    same_results(index, expenses)
+    # لا تبقى كلمات أو مقاطع لمصاريف محذوفة
+    assert set(index.tokens) == {token for text in index.texts.values() for token in text.split()}
+
+
+def test_refine_narrows_previous_results():
+    rng = random.Random(9)
+    expenses = [expense(rng, n) for n in range(100)]
+    index = SearchIndex(expenses)
+    previous = index.search('مط')
+    assert index.refine(previous, 'مطار') == index.search('مطار')
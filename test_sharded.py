@@ -0,0 +1,71 @@
+"""اختبارات التحميل الكسول: دليل صغير للمستخدمين وملف مصاريف لكل مستخدم"""
+import json
+import os
+
+import pytest
+
+import storage
+
+EXPENSE = {'date': '2025-01-05', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': 10.0}
+
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = tmp_path / 'users_data.json'
+    users = {'ahmed': {'name': 'Ahmed', 'password': 'x', 'expenses': [dict(EXPENSE)]},
+             'mona': {'name': 'Mona', 'password': 'y', 'expenses': [dict(EXPENSE, amount=5.0)]}}
+    path.write_text(json.dumps(users), encoding='utf-8')
+    return str(path)
+
+
+def open_store(users_file):
+    store = storage.ShardedStore(users_file)
+    store.load()
+    return store
+
+
+def test_migration_splits_directory_and_shards(users_file):
+    store = open_store(users_file)
+    with open(store.directory.users_file, encoding='utf-8') as f:
+        directory = json.load(f)
+    assert directory == {'ahmed': {'name': 'Ahmed', 'password': 'x'}, 'mona': {'name': 'Mona', 'password': 'y'}}
+    assert os.path.exists(store.shard_file('ahmed')) and os.path.exists(store.shard_file('mona'))
+    store.close()
+
+
+def test_load_reads_no_expenses(users_file):
+    open_store(users_file).close()
+    # ملف مستخدم آخر تالف لا يمنع التشغيل ولا دخول غيره
+    store = storage.ShardedStore(users_file)
+    with open(store.shard_file('mona'), 'w', encoding='utf-8') as f:
+        f.write('{')
+    store.load()
+    assert store.shards == {}
+    assert 'expenses' not in store.users_data['ahmed']
+    assert [expense['amount'] for expense in store.user_expenses('ahmed')] == [10.0]
+    assert list(store.shards) == ['ahmed']
+    store.close()
+
+
+def test_change_touches_only_own_shard(users_file):
+    store = open_store(users_file)
+    other = store.shard_file('mona')
+    with open(other, 'rb') as f:
+        before = f.read()
+    store.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    store.close()
+    with open(other, 'rb') as f:
+        assert f.read() == before
+    assert [expense['amount'] for expense in open_store(users_file).user_expenses('ahmed')] == [10.0, 20.0]
+
+
+def test_reload_user(users_file):
+    store = open_store(users_file)
+    assert len(store.user_expenses('ahmed')) == 1
+    other = open_store(users_file)
+    other.add_expense('ahmed', dict(EXPENSE, amount=20.0))
+    other.close()
+
+    store.reload_user('ahmed')
+    assert [expense['amount'] for expense in store.user_expenses('ahmed')] == [10.0, 20.0]
+    store.close()
@@ -0,0 +1,81 @@
+"""اختبارات المخزن المشترك بين جلسات Streamlit"""
+import json
+import threading
+
+import pytest
+
+import storage
+from shared_store import SharedStore
+
+USERS = {
+    'ahmed': {'name': 'Ahmed', 'password': 'x', 'expenses': [
+        {'date': '2025-01-05', 'from': '', 'to': '', 'type': 'أوبر', 'amount': 10.0},
+    ]},
+}
+FIELDS = {'date': '2025-02-01', 'type': 'مترو', 'amount': 7, 'notes': 'غداء'}
+
+
+@pytest.fixture
+def users_file(tmp_path):
+    path = tmp_path / 'users_data.json'
+    path.write_text(json.dumps(USERS, ensure_ascii=False), encoding='utf-8')
+    return str(path)
+
+
+def in_thread(function, *args):
+    """تشغيل الاستدعاء في خيط آخر كما تفعل كل إعادة تشغيل لسكربت Streamlit"""
+    result = {}
+
+    def run():
+        try:
+            result['value'] = function(*args)
+        except Exception as e:
+            result['error'] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result.get('value')
+
+
+@pytest.mark.parametrize('mode', storage.MODES)
+def test_used_from_other_threads(users_file, mode):
+    shared = SharedStore(users_file, mode=mode)
+    in_thread(shared.add_expense, 'ahmed', FIELDS)
+    amounts = [expense['amount'] for expense in in_thread(shared.user_expenses, 'ahmed')]
+    assert amounts == [10.0, 7.0]
+    shared.store.close()
+
+
+@pytest.mark.parametrize('mode', ['json', 'sharded'])
+def test_sees_writes_from_other_process(users_file, mode):
+    shared = SharedStore(users_file, mode=mode)
+    # كل إعادة تشغيل للوحة تبدأ بـ refresh لمستخدم الجلسة
+    shared.refresh('ahmed')
+    version = shared.data_version('ahmed')
+    assert len(shared.user_expenses('ahmed')) == 1
+
+    # تطبيق سطح المكتب يكتب نفس الملفات من عملية أخرى
+    other = storage.open_store(users_file, mode=mode)
+    other.load()
+    other.add_expense('ahmed', {'date': '2025-03-01', 'from': 'a', 'to': 'b', 'type': 'تاكسي',
+                                'amount': 20.0})
+    other.close()
+
+    shared.refresh('ahmed')
+    assert [expense['amount'] for expense in shared.user_expenses('ahmed')] == [10.0, 20.0]
+    assert shared.data_version('ahmed') != version
+    shared.store.close()
+
+
+def test_clear_expenses(users_file):
+    shared = SharedStore(users_file, mode='sharded')
+    shared.add_expense('ahmed', FIELDS)
+    shared.clear_expenses('ahmed')
+    assert shared.user_expenses('ahmed') == []
+    shared.store.close()
+    reopened = storage.open_store(users_file, mode='sharded')
+    reopened.load()
+    assert reopened.user_expenses('ahmed') == []
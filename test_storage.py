@@ -0,0 +1,163 @@
+"""اختبارات طبقة التخزين: نفس النتائج في كل أنواع التخزين بعد الحفظ وإعادة الفتح"""
+import json
+import sqlite3
+import threading
+
+import pytest
+
+import sqlite_store
+import storage
+
+MODES = storage.MODES
+
+LEGACY = {
+    'ahmed': {
+        'name': 'Ahmed',
+        'password': 'x',
+        'expenses': [
+            {'date': '2024-12-31', 'from': 'a', 'to': 'b', 'type': 'أوبر', 'amount': 10.0},
+            # تاريخ قديم بدون أصفار
+            {'date': '2025-1-5', 'from': 'البيت', 'to': 'العمل', 'type': 'مترو', 'amount': 8.0},
+            {'date': '2025-01-20', 'from': 'c', 'to': 'd', 'type': 'تاكسي', 'amount': 50.0, 'notes': 'مطار'},
+            {'date': '2025-02-01', 'from': 'e', 'to': 'f', 'type': 'أوبر', 'amount': 30.0},
+        ],
+    },
+    'mona': {'name': 'Mona', 'password': 'y', 'expenses': []},
+}
+
+
+@pytest.fixture(params=MODES)
+def open_store(request, tmp_path):
+    users_file = tmp_path / 'users_data.json'
+    users_file.write_text(json.dumps(LEGACY, ensure_ascii=False), encoding='utf-8')
+
+    opened = []
+
+    def factory():
+        store = storage.open_store(str(users_file), mode=request.param)
+        store.load()
+        opened.append(store)
+        return store
+
+    yield factory
+    for store in opened:
+        store.close()
+
+
+def dates(expenses):
+    return [expense['date'] for expense in expenses]
+
+
+def test_legacy_data_loads(open_store):
+    store = open_store()
+    assert set(store.users_data) == {'ahmed', 'mona'}
+    assert dates(store.user_expenses('ahmed')) == ['2024-12-31', '2025-1-5', '2025-01-20', '2025-02-01']
+    assert store.user_expenses('mona') == []
+
+
+def test_round_trip(open_store):
+    store = open_store()
+    new_id = store.add_expense('mona', {'date': '2025-03-01', 'from': 'x', 'to': 'y', 'type': 'أوبر',
+                                        'payment_method': 'نقدي', 'amount': 12.5, 'notes': '',
+                                        'receipt': None, 'added_at': '2025-03-01 08:00:00'})
+    store.id_index('ahmed')
+    first = store.user_expenses('ahmed')[0]
+    store.update_expense('ahmed', first['id'], dict(first, amount=11.0))
+    store.delete_expense('ahmed', store.user_expenses('ahmed')[-1]['id'])
+    store.update_user('ahmed', {'department': 'IT'})
+    store.close()
+
+    store = open_store()
+    assert store.users_data['ahmed']['department'] == 'IT'
+    assert [e['amount'] for e in store.user_expenses('ahmed')] == [11.0, 8.0, 50.0]
+    assert [e['id'] for e in store.user_expenses('mona')] == [new_id]
+    assert store.user_expenses('mona')[0]['amount'] == 12.5
+
+
+def test_date_range_query(open_store):
+    store = open_store()
+    january = store.query_expenses('ahmed', '', '2025-01-01', '2025-01-31')
+    assert dates(january) == ['2025-1-5', '2025-01-20']
+    assert store.totals('ahmed', '', '2025-01-01', '2025-01-31') == (58.0, 2)
+    assert dates(store.query_expenses('ahmed', '', '2025-01-06', None)) == ['2025-01-20', '2025-02-01']
+    assert dates(store.query_expenses('ahmed', 'مطار', '2025-01-01', '2025-01-31')) == ['2025-01-20']
+
+
+def test_sqlite_reimport_keeps_expenses(tmp_path):
+    db_file = str(tmp_path / 'users_data.db')
+    store = sqlite_store.SqliteStore(str(tmp_path / 'users_data.json'), db_file=db_file)
+    with store.connect() as conn:
+        sqlite_store.import_users(conn, LEGACY)
+        # تحديث بيانات المستخدم فقط (بدون قائمة مصاريف) لا يحذف مصاريفه
+        sqlite_store.import_users(conn, {'ahmed': {'name': 'Ahmed 2', 'password': 'x'}})
+    count = store.connect().execute("SELECT COUNT(*) FROM expenses WHERE username = 'ahmed'").fetchone()[0]
+    store.close()
+    assert count == 4
+
+
+def test_sqlite_migrates_day_column(tmp_path):
+    db_file = str(tmp_path / 'users_data.db')
+    conn = sqlite3.connect(db_file)
+    conn.executescript("""
+        CREATE TABLE users (username TEXT PRIMARY KEY, password TEXT NOT NULL DEFAULT '',
+                            profile TEXT NOT NULL DEFAULT '{}');
+        CREATE TABLE expenses (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT NOT NULL,
+            date TEXT NOT NULL DEFAULT '', from_location TEXT, to_location TEXT, type TEXT,
+            payment_method TEXT, amount REAL NOT NULL DEFAULT 0, notes TEXT, receipt TEXT,
+            added_at TEXT, updated_at TEXT, extra TEXT);
+        INSERT INTO users VALUES ('ahmed', 'x', '{}');
+        INSERT INTO expenses (username, date, amount) VALUES ('ahmed', '2025-1-5', 8), ('ahmed', '2025-02-01', 30);
+    """)
+    conn.close()
+    store = sqlite_store.SqliteStore(str(tmp_path / 'users_data.json'), db_file=db_file)
+    store.load()
+    assert dates(store.query_expenses('ahmed', '', '2025-01-01', '2025-01-31')) == ['2025-1-5']
+    store.close()
+
+
+def test_readers_wait_for_rebase(open_store):
+    """خيط الحفظ يعيد التحميل تحت store.lock؛ القراءة من خيط الواجهة تنتظر انتهاءه"""
+    store = open_store()
+    store.build_indexes('ahmed')
+    results = {}
+
+    def read():
+        results['query'] = dates(store.query_expenses('ahmed', '', '2025-01-01', '2025-01-31'))
+        results['totals'] = store.totals('ahmed')
+
+    with store.lock:
+        store.load()
+        reader = threading.Thread(target=read)
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive()
+    reader.join(5)
+    assert results == {'query': ['2025-1-5', '2025-01-20'], 'totals': (98.0, 4)}
+
+
+def test_sqlite_sees_other_process_writes(tmp_path):
+    """أرقام الأسطر المحملة تعاد قراءتها بعد كتابة اتصال آخر للقاعدة"""
+    users_file = tmp_path / 'users_data.json'
+    users_file.write_text(json.dumps(LEGACY, ensure_ascii=False), encoding='utf-8')
+    desktop = storage.open_store(str(users_file), mode='sqlite')
+    desktop.load()
+    desktop.build_indexes('ahmed')
+    changes = []
+    desktop.on_change = lambda: changes.append(True)
+
+    batch = storage.open_store(str(users_file), mode='sqlite')
+    batch.load()
+    first, second = [expense['id'] for expense in batch.user_expenses('ahmed')[:2]]
+    batch.delete_expense('ahmed', first)
+    batch.close()
+
+    assert desktop.totals('ahmed') == (88.0, 3)
+    assert changes == [True]
+    assert desktop.get_expense('ahmed', first) is None
+    desktop.update_expense('ahmed', second, dict(desktop.get_expense('ahmed', second), amount=9.0))
+    desktop.close()
+
+    reopened = storage.open_store(str(users_file), mode='sqlite')
+    reopened.load()
+    assert [expense['amount'] for expense in reopened.user_expenses('ahmed')] == [9.0, 50.0, 30.0]
+    reopened.close()
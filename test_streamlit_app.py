@@ -0,0 +1,70 @@
+"""اختبارات لوحة Streamlit: جدول المصاريف يقسم لصفحات ويفلتر على الخادم"""
+import json
+from datetime import date, timedelta
+
+import pytest
+
+st = pytest.importorskip('streamlit')
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP = __file__.replace('test_streamlit_app.py', 'streamlit_app.py')
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # التاريخ يزيد مع المبلغ، فالترتيب الافتراضي (الأحدث أولاً) هو الأكبر مبلغاً أولاً
+    expenses = [{'date': (date(2025, 1, 1) + timedelta(days=day)).isoformat(), 'from': '', 'to': '', 'type': 'طعام',
+                 'amount': float(day), 'notes': 'غداء' if day % 10 == 0 else ''}
+                for day in range(1, 61)]
+    users = {'ahmed': {'password': 'x', 'expenses': expenses}}
+    (tmp_path / 'users_data.json').write_text(json.dumps(users, ensure_ascii=False), encoding='utf-8')
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('EXPENSE_STORAGE', 'sharded')
+    # المخزن المشترك والنتائج محفوظة على مستوى العملية بين الاختبارات
+    st.cache_resource.clear()
+    st.cache_data.clear()
+    test = AppTest.from_file(APP, default_timeout=30)
+    test.session_state['current_user'] = 'ahmed'
+    return test.run()
+
+
+def table(app):
+    return app.dataframe[0].value
+
+
+def test_first_page_only(app):
+    assert not app.exception
+    assert len(table(app)) == 25
+    assert table(app)['amount'].iloc[0] == 60.0
+    assert any("60 مصروف" in markdown.value for markdown in app.markdown)
+
+
+def test_page_and_filter(app):
+    app.number_input(key='table_page').set_value(3).run()
+    assert table(app)['amount'].tolist() == [float(n) for n in range(10, 0, -1)]
+
+    app.text_input(key='table_text').input('غداء').run()
+    assert table(app)['amount'].tolist() == [60.0, 50.0, 40.0, 30.0, 20.0, 10.0]
+    # الفلتر قلل عدد الصفحات، فترجع الصفحة للأخيرة المتاحة
+    assert app.number_input(key='table_page').value == 1
+
+
+def test_clear_expenses(app):
+    app.button[-1].click().run()
+    assert not app.exception
+    assert not app.dataframe
+
+
+def test_rows_follow_other_writer(app):
+    """حذف من عملية أخرى بين إعادتي تشغيل: الجدول يعرض البيانات الجديدة بمواقع صحيحة"""
+    import storage
+    other = storage.open_store('users_data.json')
+    other.load()
+    other.id_index('ahmed')
+    other.delete_expenses('ahmed', [expense['id'] for expense in other.user_expenses('ahmed')[30:]])
+    other.close()
+
+    app.run()
+    assert not app.exception
+    assert table(app)['amount'].iloc[0] == 30.0
+    assert any("30 مصروف" in markdown.value for markdown in app.markdown)
@@ -0,0 +1,57 @@
+"""اختبارات الصور المصغرة: التوازي والإيقاف أثناء التجهيز"""
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from thumbnails import ThumbnailCache  # noqa: E402
+
+
+@pytest.fixture
+def receipts(tmp_path):
+    paths = []
+    for index in range(3):
+        path = tmp_path / f'receipt_{index}.png'
+        Image.new('RGB', (400, 300), (index * 60, 0, 0)).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_parallel_thumbnails(tmp_path, receipts):
+    cache = ThumbnailCache(str(tmp_path / 'thumbs'))
+    thumbnails = cache.ensure(receipts, workers=2)
+    assert set(thumbnails) == set(receipts)
+    for thumbnail in thumbnails.values():
+        with Image.open(thumbnail) as img:
+            assert max(img.size) <= 150
+
+
+def test_cancelled_before_start(tmp_path, receipts):
+    cancel = threading.Event()
+    cancel.set()
+    for parallel in (True, False):
+        directory = tmp_path / f'thumbs_{parallel}'
+        cache = ThumbnailCache(str(directory), parallel=parallel)
+        assert cache.ensure(receipts, workers=2, cancel=cancel) == dict.fromkeys(receipts)
+        assert not directory.exists() or not any(directory.iterdir())
+
+
+def test_cancel_during_parallel_run(tmp_path, receipts, monkeypatch):
+    """بعد الإيقاف لا ترسل صور جديدة للعمليات"""
+    cancel = threading.Event()
+    submitted = []
+    original = ProcessPoolExecutor.submit
+
+    def submit(pool, fn, *args):
+        submitted.append(args[0])
+        cancel.set()
+        return original(pool, fn, *args)
+
+    monkeypatch.setattr(ProcessPoolExecutor, 'submit', submit)
+    cache = ThumbnailCache(str(tmp_path / 'thumbs'))
+    thumbnails = cache.ensure(receipts, workers=1, cancel=cancel)
+    assert len(submitted) == 1
+    # الصورة التي بدأت تنتهي، لكن النتيجة لا تنتظر بعد الإيقاف
+    assert thumbnails == dict.fromkeys(receipts)
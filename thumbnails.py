@@ -0,0 +1,125 @@
+"""ذاكرة مؤقتة على القرص لصور الإيصالات المصغرة المستخدمة في تقارير Excel
+
+المفتاح هو مسار الإيصال ووقت تعديله وحجمه، فإعادة تصدير مصاريف لم تتغير لا تفتح
+أي صورة أصلية (يكفي stat). الصور الناقصة تصغر بالتوازي في عمليات منفصلة.
+"""
+import hashlib
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterable, Optional
+
+from PIL import Image
+
+# مجلد الصور المصغرة بجانب ملف البيانات
+THUMBNAIL_DIR = 'receipt_thumbs'
+# أقصى بعد للصورة المصغرة (نفس حجم الإيصال داخل خلية التقرير)
+THUMBNAIL_SIZE = 150
+JPEG_QUALITY = 85
+# التصدير يعمل في خيط داخل عملية Tk؛ fork من عملية متعددة الخيوط قد ينسخ أقفالاً مقفولة
+SPAWN = multiprocessing.get_context('spawn')
+# كل كم ثانية يفحص طلب الإيقاف أثناء انتظار العمليات
+CANCEL_POLL = 0.1
+
+
+def make_thumbnail(source: str, target: str) -> bool:
+    """تصغير صورة واحدة (تعمل داخل عملية منفصلة)"""
+    try:
+        with Image.open(source) as img:
+            # JPEG: فك الترميز مباشرة بدقة أقل بدلاً من فك الصورة كاملة ثم تصغيرها
+            img.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            img.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            temp = target + '.tmp'
+            if target.endswith('.jpg'):
+                img.convert('RGB').save(temp, 'JPEG', quality=JPEG_QUALITY)
+            else:
+                img.save(temp, 'PNG')
+        os.replace(temp, target)
+        return True
+    except Exception:
+        return False
+
+
+class ThumbnailCache:
+    """مسار الإيصال -> مسار صورته المصغرة في المجلد"""
+
+    def __init__(self, directory: str = THUMBNAIL_DIR, parallel: bool = True):
+        self.directory = directory
+        # False داخل عمليات مجمع أخرى (التقارير الجماعية) لتجنب مجمع داخل مجمع
+        self.parallel = parallel
+
+    def path_for(self, source: str) -> Optional[str]:
+        """مسار الصورة المصغرة للإيصال بحالته الحالية (None إذا لم يكن الإيصال موجوداً)"""
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return None
+        key = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}"
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        ext = '.jpg' if source.lower().endswith(('.jpg', '.jpeg')) else '.png'
+        return os.path.join(self.directory, digest + ext)
+
+    def ensure(self, sources: Iterable[str], workers: Optional[int] = None,
+               cancel=None) -> Dict[str, Optional[str]]:
+        """الصور المصغرة لكل الإيصالات، مع إنشاء الناقص منها بالتوازي
+
+        القيمة None تعني أن الإيصال غير موجود أو أن الصورة لم تفتح (أو لم تنشأ قبل الإيقاف).
+        cancel: threading.Event؛ عند ضبطه تلغى الصور التي لم تبدأ ويعود فوراً.
+        """
+        thumbnails: Dict[str, Optional[str]] = {}
+        missing: Dict[str, str] = {}
+        for source in sources:
+            if source in thumbnails:
+                continue
+            target = self.path_for(source)
+            thumbnails[source] = target
+            if target is not None and not os.path.exists(target):
+                missing[source] = target
+
+        if missing:
+            os.makedirs(self.directory, exist_ok=True)
+            if len(missing) == 1 or not self.parallel:
+                made = {}
+                for source, target in missing.items():
+                    if cancel is not None and cancel.is_set():
+                        break
+                    made[source] = make_thumbnail(source, target)
+            else:
+                made = self.make_parallel(missing, workers, cancel)
+            for source in missing:
+                if not made.get(source):
+                    thumbnails[source] = None
+        return thumbnails
+
+    @staticmethod
+    def make_parallel(missing: Dict[str, str], workers: Optional[int], cancel) -> Dict[str, bool]:
+        """تصغير الصور في عمليات منفصلة مع فحص طلب الإيقاف قبل إرسال كل صورة
+
+        لا تُرسل للعمليات أكثر من صورة لكل عملية في نفس الوقت، فبعد الإيقاف لا يكتمل
+        إلا ما بدأ بالفعل.
+        """
+        def cancelled() -> bool:
+            return cancel is not None and cancel.is_set()
+
+        made: Dict[str, bool] = {}
+        if cancelled():
+            return made
+        limit = workers or os.cpu_count() or 1
+        queue = iter(missing.items())
+        pool = ProcessPoolExecutor(max_workers=limit, mp_context=SPAWN)
+        try:
+            futures = {}
+            while True:
+                while not cancelled() and len(futures) < limit:
+                    job = next(queue, None)
+                    if job is None:
+                        break
+                    futures[pool.submit(make_thumbnail, *job)] = job[0]
+                if not futures or cancelled():
+                    break
+                done, _ = wait(futures, timeout=CANCEL_POLL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    made[futures.pop(future)] = future.result()
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+        return made
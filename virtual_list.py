@@ -0,0 +1,142 @@
+"""عرض افتراضي لقائمة طويلة في ttk.Treeview: فقط الأسطر الظاهرة تنشأ فعلياً
+
+الشجرة لا تحتوي إلا نافذة صغيرة من الأسطر (الظاهر + احتياطي بسيط)، وشريط التمرير
+مربوط ببداية النافذة داخل القائمة بدلاً من تمرير الشجرة نفسها. لذلك تكلفة العرض
+والتمرير والفلترة ثابتة تقريباً مهما كان عدد المصاريف.
+"""
+from typing import Callable, Dict, Optional, Sequence
+
+# أسطر إضافية بعد الظاهر لملء السطر المقطوع في الأسفل
+OVERSCAN = 2
+# عدد الأسطر لكل حركة من عجلة الفأرة
+WHEEL_ROWS = 3
+
+
+class VirtualList:
+    """يربط Treeview وشريط تمرير بقائمة بيانات؛ معرف كل سطر (iid) هو row_key للعنصر"""
+
+    def __init__(self, tree, scrollbar, row_values: Callable, row_key: Callable,
+                 row_height: int = 30, heading_height: int = 25):
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.row_values = row_values
+        self.row_key = row_key
+        self.row_height = row_height
+        self.heading_height = heading_height
+        self.rows: Sequence = []
+        self.offset = 0
+        self.visible = max(1, int(tree.cget('height')))
+        self.selected: Optional[int] = None
+        # iid -> الموضع في القائمة للأسطر المعروضة حالياً
+        self.window: Dict[str, int] = {}
+
+        scrollbar.configure(command=self.on_scrollbar)
+        tree.bind('<Configure>', self.on_resize)
+        tree.bind('<<TreeviewSelect>>', self.on_select)
+        for sequence in ('<MouseWheel>', '<Button-4>', '<Button-5>'):
+            tree.bind(sequence, self.on_wheel)
+        tree.bind('<Up>', lambda e: self.move_selection(-1))
+        tree.bind('<Down>', lambda e: self.move_selection(1))
+        tree.bind('<Prior>', lambda e: self.move_selection(-self.visible))
+        tree.bind('<Next>', lambda e: self.move_selection(self.visible))
+        tree.bind('<Home>', lambda e: self.move_selection(-len(self.rows)))
+        tree.bind('<End>', lambda e: self.move_selection(len(self.rows)))
+
+    # ==================== البيانات ====================
+
+    def set_rows(self, rows: Sequence, keep_offset: bool = False):
+        """عرض قائمة جديدة (أو نفس القائمة بعد تعديلها مع الإبقاء على موضع التمرير)"""
+        self.rows = rows
+        self.selected = None
+        if not keep_offset:
+            self.offset = 0
+        self.offset = self.clamp(self.offset)
+        self.render()
+
+    def selected_key(self):
+        """مفتاح العنصر المحدد (حتى لو خرج من النافذة بالتمرير)"""
+        if self.selected is not None and self.selected < len(self.rows):
+            return self.row_key(self.rows[self.selected])
+        return None
+
+    # ==================== العرض ====================
+
+    def clamp(self, offset: int) -> int:
+        return max(0, min(offset, len(self.rows) - self.visible))
+
+    def render(self):
+        """إعادة إنشاء أسطر النافذة الحالية فقط"""
+        tree = self.tree
+        children = tree.get_children()
+        if children:
+            tree.delete(*children)
+        self.window = {}
+        end = min(len(self.rows), self.offset + self.visible + OVERSCAN)
+        for position in range(self.offset, end):
+            row = self.rows[position]
+            iid = tree.insert('', 'end', iid=self.row_key(row), values=self.row_values(row))
+            self.window[iid] = position
+        if self.selected is not None and self.offset <= self.selected < end:
+            iid = self.row_key(self.rows[self.selected])
+            tree.selection_set(iid)
+            tree.focus(iid)
+        tree.yview_moveto(0)
+        self.update_scrollbar()
+
+    def update_scrollbar(self):
+        total = len(self.rows)
+        if total <= self.visible:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.offset / total, (self.offset + self.visible) / total)
+
+    def scroll_to(self, offset: int):
+        offset = self.clamp(offset)
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    # ==================== الأحداث ====================
+
+    def on_scrollbar(self, *args):
+        """أوامر شريط التمرير: moveto نسبة، أو scroll عدد أسطر/صفحات"""
+        if args[0] == 'moveto':
+            self.scroll_to(round(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (self.visible if args[2] == 'pages' else 1)
+            self.scroll_to(self.offset + step)
+
+    def on_wheel(self, event):
+        if getattr(event, 'num', None) == 4 or getattr(event, 'delta', 0) > 0:
+            self.scroll_to(self.offset - WHEEL_ROWS)
+        else:
+            self.scroll_to(self.offset + WHEEL_ROWS)
+        return 'break'
+
+    def on_resize(self, event):
+        """حساب عدد الأسطر الظاهرة من ارتفاع الشجرة الفعلي"""
+        visible = max(1, (event.height - self.heading_height) // self.row_height)
+        if visible != self.visible:
+            self.visible = visible
+            self.offset = self.clamp(self.offset)
+            self.render()
+
+    def on_select(self, event=None):
+        # حذف الأسطر عند التمرير يفرغ التحديد في الشجرة، لكن التحديد في القائمة يبقى
+        selection = self.tree.selection()
+        if selection and selection[0] in self.window:
+            self.selected = self.window[selection[0]]
+
+    def move_selection(self, delta: int):
+        """التنقل بالأسهم مع تمرير النافذة عند الوصول لحافتها"""
+        if not self.rows:
+            return 'break'
+        current = self.selected if self.selected is not None else self.offset
+        position = max(0, min(len(self.rows) - 1, current + delta))
+        self.selected = position
+        if position < self.offset:
+            self.offset = position
+        elif position >= self.offset + self.visible:
+            self.offset = self.clamp(position - self.visible + 1)
+        self.render()
+        return 'break'